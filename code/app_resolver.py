@@ -0,0 +1,222 @@
+# App resolver
+# App-control commands need two things repeatedly: where an app's executable
+# is, and which running processes belong to it. Both used to be worked out
+# from scratch on every command, checking each hard-coded path and walking
+# every process on the machine.
+#
+# AppResolver finds each app's executable once and caches it. A cached path
+# is re-checked with a single stat, and dropped when a launch from it fails
+# or after ttl seconds, so a newly installed or moved app is picked up. PIDs
+# of apps we launched are tracked together with their creation times, so a
+# reused PID is never mistaken for the app. Close and focus look those up
+# directly. A full process scan only happens when no PID is known, for an
+# app that was started some other way, and the processes it finds are then
+# tracked too. A scan that finds nothing is remembered for scan_ttl seconds,
+# so repeated commands for an app that isn't running don't rescan.
+
+import os
+import shutil
+import threading
+import time
+from lazy_import import lazy_import
+
+ctypes = lazy_import("ctypes")
+psutil = lazy_import("psutil")
+
+# Executables on PATH, then common installation paths; process names are
+# matched case-insensitively
+KNOWN_APPS = {
+    "spotify": {
+        "commands": ["spotify"],
+        "paths": [
+            "~\\AppData\\Roaming\\Spotify\\Spotify.exe",
+            "C:\\Program Files\\Spotify\\Spotify.exe",
+            "C:\\Program Files (x86)\\Spotify\\Spotify.exe",
+        ],
+        "process_names": ["spotify.exe", "spotify"],
+    },
+    "brave": {
+        "commands": ["brave", "brave-browser"],
+        "paths": [
+            "C:\\Program Files\\BraveSoftware\\Brave-Browser\\Application\\brave.exe",
+            "~\\AppData\\Local\\BraveSoftware\\Brave-Browser\\Application\\brave.exe",
+            "C:\\Program Files (x86)\\BraveSoftware\\Brave-Browser\\Application\\brave.exe",
+        ],
+        "process_names": ["brave.exe", "brave", "brave-browser"],
+    },
+}
+
+
+class AppResolver:
+    def __init__(self, apps=None, ttl=600.0, scan_ttl=2.0):
+        self.apps = apps or KNOWN_APPS
+        self.ttl = ttl
+        self.scan_ttl = scan_ttl
+
+        self._lock = threading.Lock()
+        # app -> (executable or None, resolved at)
+        self._executables = {}
+        # app -> {pid: create_time}
+        self._pids = {}
+        # app -> when a scan last found none of its processes
+        self._not_running = {}
+        self.scans = 0
+
+    # Executables
+    def executable(self, app):
+        """Path of the app's executable, or None if it is not installed"""
+        with self._lock:
+            cached = self._executables.get(app)
+        if cached is not None:
+            path, resolved_at = cached
+            fresh = time.monotonic() - resolved_at < self.ttl
+            # Only the one cached path is checked again
+            if fresh and (path is None or os.path.exists(path)):
+                return path
+
+        path = self._find_executable(app)
+        with self._lock:
+            self._executables[app] = (path, time.monotonic())
+        return path
+
+    def _find_executable(self, app):
+        info = self.apps[app]
+        for command in info.get("commands", []):
+            path = shutil.which(command)
+            if path:
+                return path
+        for path in info.get("paths", []):
+            expanded = os.path.expandvars(os.path.expanduser(path))
+            if os.path.exists(expanded):
+                return expanded
+        return None
+
+    def invalidate(self, app=None):
+        """Forget cached executables (all apps if app is None)"""
+        with self._lock:
+            if app is None:
+                self._executables.clear()
+            else:
+                self._executables.pop(app, None)
+
+    # Processes
+    def track(self, app, pid):
+        """Remember a process that belongs to app"""
+        try:
+            created = psutil.Process(pid).create_time()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        with self._lock:
+            self._pids.setdefault(app, {})[pid] = created
+            self._not_running.pop(app, None)
+
+    def processes(self, app, scan=True):
+        """Running psutil.Process objects of app
+
+        Uses the tracked PIDs; scans the process list only when none of them
+        is alive and scan is True.
+        """
+        with self._lock:
+            known = dict(self._pids.get(app, {}))
+
+        alive = []
+        for pid, created in known.items():
+            try:
+                proc = psutil.Process(pid)
+                if proc.create_time() == created and proc.is_running():
+                    alive.append(proc)
+                    continue
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            self._forget(app, pid)
+
+        if alive or not scan:
+            return alive
+        with self._lock:
+            scanned_at = self._not_running.get(app)
+        if scanned_at is not None and time.monotonic() - scanned_at < self.scan_ttl:
+            return []
+        return self._scan(app)
+
+    def _scan(self, app):
+        """Walk the process list once and track what belongs to app"""
+        names = {name.lower() for name in self.apps[app].get("process_names", [])}
+        self.scans += 1
+        found = []
+        # Prefetching name and create_time reads each process once
+        for proc in psutil.process_iter(["name", "create_time"]):
+            name = (proc.info.get("name") or "").lower()
+            if name in names:
+                found.append(proc)
+                with self._lock:
+                    self._pids.setdefault(app, {})[proc.pid] = proc.info["create_time"]
+        with self._lock:
+            if found:
+                self._not_running.pop(app, None)
+            else:
+                self._not_running[app] = time.monotonic()
+        return found
+
+    def _forget(self, app, pid):
+        with self._lock:
+            self._pids.get(app, {}).pop(pid, None)
+
+    def is_running(self, app):
+        return bool(self.processes(app))
+
+    def close(self, app, timeout=3.0):
+        """Terminate the app's processes and their children; returns how many"""
+        procs = self.processes(app)
+        family = []
+        for proc in procs:
+            try:
+                family.extend(proc.children(recursive=True))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            family.append(proc)
+
+        for proc in family:
+            try:
+                proc.terminate()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        _, still_alive = psutil.wait_procs(family, timeout=timeout)
+        for proc in still_alive:
+            try:
+                proc.kill()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+
+        with self._lock:
+            self._pids.pop(app, None)
+        return len(procs)
+
+    def focus(self, app):
+        """Bring a window of a running app to the front (Windows); True if done"""
+        pids = {proc.pid for proc in self.processes(app)}
+        if not pids or os.name != "nt":
+            return False
+
+        user32 = ctypes.windll.user32
+        windows = []
+
+        @ctypes.WINFUNCTYPE(ctypes.c_bool, ctypes.c_void_p, ctypes.c_void_p)
+        def visit(hwnd, _):
+            pid = ctypes.c_ulong()
+            user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+            if pid.value in pids and user32.IsWindowVisible(hwnd) and user32.GetWindowTextLengthW(hwnd):
+                windows.append(hwnd)
+                return False
+            return True
+
+        user32.EnumWindows(visit, 0)
+        if not windows:
+            return False
+        user32.ShowWindow(windows[0], 9)  # SW_RESTORE
+        return bool(user32.SetForegroundWindow(windows[0]))
+
+    def status(self):
+        with self._lock:
+            tracked = sum(len(pids) for pids in self._pids.values())
+            resolved = sum(1 for path, _ in self._executables.values() if path)
+        return f"App resolver: {resolved} executables cached, {tracked} processes tracked, {self.scans} scans"
@@ -0,0 +1,227 @@
+# Segmented audio archive
+# Keeps the audio behind each note so it can be played back or transcribed
+# again later with a better engine. Clips are FLAC-encoded and appended to
+# large segment files (segment-000001.dat, ...) rather than written as one
+# small file each. index.bin holds one fixed-size record per clip
+# (segment number, offset, length), so a clip ID is simply its record
+# number. Clips are read back through a memory map of their segment.
+#
+#   python audio_archive.py transcribe 12 15 --engine vosk
+#   python audio_archive.py export 12 clip.wav
+
+import argparse
+import io
+import mmap
+import os
+import struct
+import threading
+import wave
+from lazy_import import lazy_import
+
+sr = lazy_import("speech_recognition")
+subprocess = lazy_import("subprocess")
+
+INDEX_RECORD = struct.Struct("<IQI")
+INDEX_NAME = "index.bin"
+SEGMENT_NAME = "segment-{:06d}.dat"
+
+
+def decode_flac(data):
+    """FLAC bytes -> WAV bytes, using the flac binary speech_recognition ships"""
+    startup_info = None
+    if os.name == "nt":
+        # Don't flash a console window
+        startup_info = subprocess.STARTUPINFO()
+        startup_info.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        startup_info.wShowWindow = subprocess.SW_HIDE
+    process = subprocess.run([sr.audio.get_flac_converter(), "--stdout", "--totally-silent", "--decode", "-"],
+                             input=data, stdout=subprocess.PIPE, startupinfo=startup_info)
+    if process.returncode != 0:
+        raise ValueError("archived clip could not be decoded")
+    return process.stdout
+
+
+class AudioArchive:
+    def __init__(self, directory="audio_archive", segment_size=256 * 1024 * 1024,
+                 sample_rate=16000, fsync=True):
+        self.directory = directory
+        self.segment_size = segment_size
+        # Clips recorded above this rate are downsampled before encoding
+        self.sample_rate = sample_rate
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._index = bytearray()
+        self._index_file = None
+        self._segment = 0
+        self._segment_file = None
+        self._segment_length = 0
+        # Read-only maps of segments, remapped when a segment has grown
+        self._maps = {}
+
+    @property
+    def count(self):
+        return len(self._index) // INDEX_RECORD.size
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, SEGMENT_NAME.format(segment))
+
+    def open(self):
+        """Open the archive, dropping anything a crash left half written"""
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = os.path.join(self.directory, INDEX_NAME)
+
+        with self._lock:
+            if os.path.exists(index_path):
+                with open(index_path, 'rb') as f:
+                    self._index = bytearray(f.read())
+            self._recover(index_path)
+
+            self._index_file = open(index_path, 'ab')
+            self._open_segment(self._segment)
+        return self
+
+    def _recover(self, index_path):
+        # A torn index record at the end
+        whole = len(self._index) - len(self._index) % INDEX_RECORD.size
+        # Index records whose audio never fully reached the segment
+        while whole:
+            segment, offset, length = INDEX_RECORD.unpack_from(self._index, whole - INDEX_RECORD.size)
+            path = self._segment_path(segment)
+            if os.path.exists(path) and os.path.getsize(path) >= offset + length:
+                break
+            whole -= INDEX_RECORD.size
+
+        if whole != len(self._index):
+            print(f"Audio archive: dropping {len(self._index) - whole} bytes of incomplete index")
+            del self._index[whole:]
+            with open(index_path, 'r+b') as f:
+                f.truncate(whole)
+
+        if self._index:
+            segment, offset, length = INDEX_RECORD.unpack_from(self._index, len(self._index) - INDEX_RECORD.size)
+            self._segment, end = segment, offset + length
+        else:
+            self._segment, end = 1, 0
+
+        # Audio appended after the last indexed clip was never acknowledged
+        path = self._segment_path(self._segment)
+        if os.path.exists(path) and os.path.getsize(path) > end:
+            with open(path, 'r+b') as f:
+                f.truncate(end)
+
+    def _open_segment(self, segment):
+        if self._segment_file is not None:
+            self._segment_file.close()
+        self._segment = segment
+        self._segment_file = open(self._segment_path(segment), 'ab')
+        self._segment_length = os.fstat(self._segment_file.fileno()).st_size
+
+    # Writing
+    def add(self, audio):
+        """Encode and append a clip; returns its clip ID"""
+        convert_rate = self.sample_rate if audio.sample_rate > self.sample_rate else None
+        data = audio.get_flac_data(convert_rate=convert_rate, convert_width=2)
+
+        with self._lock:
+            if self._segment_length and self._segment_length + len(data) > self.segment_size:
+                self._open_segment(self._segment + 1)
+
+            offset = self._segment_length
+            self._segment_file.write(data)
+            self._segment_file.flush()
+            if self.fsync:
+                os.fsync(self._segment_file.fileno())
+            self._segment_length += len(data)
+
+            # The index record goes last; it is what makes the clip exist
+            record = INDEX_RECORD.pack(self._segment, offset, len(data))
+            self._index_file.write(record)
+            self._index_file.flush()
+            if self.fsync:
+                os.fsync(self._index_file.fileno())
+            self._index += record
+            return self.count - 1
+
+    def close(self):
+        with self._lock:
+            for segment_map, f in self._maps.values():
+                segment_map.close()
+                f.close()
+            self._maps.clear()
+            for f in (self._segment_file, self._index_file):
+                if f is not None:
+                    f.close()
+            self._segment_file = self._index_file = None
+
+    # Reading
+    def read_flac(self, clip_id):
+        """The clip's FLAC bytes, sliced out of the segment's memory map"""
+        with self._lock:
+            if not 0 <= clip_id < self.count:
+                raise KeyError(f"no clip {clip_id} in the audio archive")
+            segment, offset, length = INDEX_RECORD.unpack_from(self._index, clip_id * INDEX_RECORD.size)
+
+            mapped = self._maps.get(segment)
+            if mapped is None or len(mapped[0]) < offset + length:
+                if mapped is not None:
+                    mapped[0].close()
+                    mapped[1].close()
+                f = open(self._segment_path(segment), 'rb')
+                mapped = self._maps[segment] = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), f)
+            return mapped[0][offset:offset + length]
+
+    def wav_data(self, clip_id):
+        return decode_flac(self.read_flac(clip_id))
+
+    def read(self, clip_id):
+        """The clip as sr.AudioData"""
+        with wave.open(io.BytesIO(self.wav_data(clip_id)), 'rb') as f:
+            return sr.AudioData(f.readframes(f.getnframes()), f.getframerate(), f.getsampwidth())
+
+
+def main(argv=None):
+    import settings as app_settings
+    from recognition_engines import get_engine
+
+    parser = argparse.ArgumentParser(description="Export or re-transcribe archived note audio")
+    parser.add_argument("--archive", help="archive directory (default: the configured one)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    transcribe = commands.add_parser("transcribe", help="recognize archived clips again")
+    transcribe.add_argument("clip_ids", nargs="*", type=int, help="clips to transcribe (default: all)")
+    transcribe.add_argument("--engine", help="recognition engine, overrides voice_memo_settings.json")
+    export = commands.add_parser("export", help="write a clip to a WAV file")
+    export.add_argument("clip_id", type=int)
+    export.add_argument("path")
+    args = parser.parse_args(argv)
+
+    settings = app_settings.load_settings()
+    archive = AudioArchive(args.archive or settings['audio_archive_directory']).open()
+    try:
+        if args.command == "export":
+            with open(args.path, 'wb') as f:
+                f.write(archive.wav_data(args.clip_id))
+            print(f"Wrote clip {args.clip_id} to {args.path}")
+            return 0
+
+        if args.engine:
+            settings['recognition_engine'] = args.engine
+        engine = get_engine(sr.Recognizer(), settings)
+        failures = 0
+        for clip_id in args.clip_ids or range(archive.count):
+            try:
+                text = engine.recognize(archive.read(clip_id))
+            except sr.UnknownValueError:
+                text = "[NO SPEECH]"
+            except Exception as e:
+                failures += 1
+                print(f"{clip_id}: failed: {e}")
+                continue
+            print(f"{clip_id}: {text}")
+        return 1 if failures else 0
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
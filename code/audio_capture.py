@@ -0,0 +1,171 @@
+# Always-open microphone capture
+# The microphone stream is opened once and a background thread keeps reading
+# it into a fixed-size ring of chunks. A recording attaches a RingSource to
+# the ring instead of reopening the device, so it starts immediately and
+# begins with the last pre-roll seconds of audio, catching the first
+# syllables said while the hotkey was still being pressed.
+#
+# Chunks are the immutable bytes objects returned by PyAudio, so handing one
+# to the recognizer is a reference, not a copy, and the ring overwriting a
+# slot never changes audio a reader already holds.
+
+import threading
+
+import speech_recognition as sr
+
+
+class AudioRing:
+    """Fixed number of chunk slots; chunk n lives in slot n % capacity"""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._slots = [None] * self.capacity
+        self._written = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    @property
+    def written(self):
+        """Number of chunks written so far (the next chunk's position)"""
+        return self._written
+
+    def write(self, chunk):
+        with self._cond:
+            self._slots[self._written % self.capacity] = chunk
+            self._written += 1
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def oldest(self):
+        return max(0, self._written - self.capacity)
+
+    def get(self, position, timeout=None):
+        """Return (chunk, next position), waiting for the chunk to be written
+
+        A reader that fell more than a ring behind skips ahead to the oldest
+        chunk still held. Returns (None, position) once the ring is closed or
+        the timeout expires.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._written > position or self._closed, timeout):
+                return None, position
+            if self._written <= position:
+                return None, position
+            position = max(position, self.oldest())
+            return self._slots[position % self.capacity], position + 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+
+
+class _RingReader:
+    """File-like reader over the ring, as Recognizer.listen expects"""
+
+    def __init__(self, ring, position, timeout):
+        self.ring = ring
+        self.position = position
+        self.timeout = timeout
+        self.closed = False
+
+    def read(self, size):
+        # The recognizer asks for CHUNK frames, which is what each slot holds
+        if self.closed:
+            return b""
+        chunk, self.position = self.ring.get(self.position, self.timeout)
+        if chunk is None:
+            raise OSError("Microphone stream stopped")
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+class RingSource(sr.AudioSource):
+    """AudioSource that reads from the always-open stream's ring"""
+
+    def __init__(self, capture, position):
+        self.SAMPLE_RATE = capture.SAMPLE_RATE
+        self.SAMPLE_WIDTH = capture.SAMPLE_WIDTH
+        self.CHUNK = capture.CHUNK
+        self.stream = _RingReader(capture.ring, position, capture.read_timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream.close()
+
+
+class MicrophoneCapture:
+    def __init__(self, microphone, buffer_seconds=10.0):
+        self.microphone = microphone
+        self.SAMPLE_RATE = microphone.SAMPLE_RATE
+        self.SAMPLE_WIDTH = microphone.SAMPLE_WIDTH
+        self.CHUNK = microphone.CHUNK
+        self.chunk_seconds = self.CHUNK / self.SAMPLE_RATE
+
+        self.ring = AudioRing(int(buffer_seconds / self.chunk_seconds) + 1)
+        # A read that waits this long means the device stopped delivering audio
+        self.read_timeout = max(2.0, self.chunk_seconds * 20)
+
+        self.error = None
+        self._thread = None
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Open the device and start filling the ring"""
+        with self._lock:
+            if self.running:
+                return
+            self.microphone.__enter__()
+            self.error = None
+            self._stopping = False
+            self.ring.reopen()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        try:
+            stream = self.microphone.stream
+            while not self._stopping:
+                self.ring.write(stream.read(self.CHUNK))
+        except Exception as e:
+            self.error = e
+            print(f"Microphone stream stopped: {e}")
+        finally:
+            self.ring.close()
+            try:
+                self.microphone.__exit__(None, None, None)
+            except Exception:
+                pass
+
+    def source(self, preroll=0.0):
+        """A new AudioSource starting preroll seconds in the past
+
+        Reopens the device first if the stream stopped (e.g. it was unplugged).
+        """
+        if not self.running:
+            self.start()
+        chunks = int(round(preroll / self.chunk_seconds))
+        position = max(self.ring.oldest(), self.ring.written - chunks)
+        return RingSource(self, position)
+
+    def stop(self):
+        self._stopping = True
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=1.0)
@@ -0,0 +1,146 @@
+# Audio preprocessing before recognition
+# Captured clips include the half second before speech and the pause that
+# ended it, at the microphone's native rate (often 44.1 or 48 kHz).
+# PreprocessingEngine wraps a recognition engine and, before each call,
+# trims the silence at both ends and resamples to the rate the engine wants
+# (16 kHz for Google, whose request body is this audio encoded as FLAC).
+#
+# Each clip is reported with the bytes saved and how its recognition time
+# compares with unprocessed clips. To keep that baseline current, every
+# baseline_every-th clip is sent unprocessed.
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from lazy_import import lazy_import
+
+sr = lazy_import("speech_recognition")
+
+
+def trim_silence(samples, sample_rate, threshold, frame_seconds=0.01, pad_seconds=0.2):
+    """Drop leading and trailing frames with RMS energy at or below threshold
+
+    Keeps pad_seconds around the speech. Samples with no frame above the
+    threshold are returned whole rather than trimmed to nothing.
+    """
+    frame = max(1, int(sample_rate * frame_seconds))
+    count = len(samples) // frame
+    if not count:
+        return samples
+
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float32)
+    energy = np.sqrt(np.einsum('ij,ij->i', frames, frames) / frame)
+    loud = np.flatnonzero(energy > threshold)
+    if not loud.size:
+        return samples
+
+    pad = int(sample_rate * pad_seconds)
+    start = max(0, loud[0] * frame - pad)
+    stop = min(len(samples), (loud[-1] + 1) * frame + pad)
+    return samples[start:stop]
+
+
+def preprocess(audio, sample_rate, threshold):
+    """Trimmed 16-bit AudioData at sample_rate (never upsampled)
+
+    sr.AudioData is always mono; Microphone and AudioFile downmix on read.
+    """
+    samples = np.frombuffer(audio.get_raw_data(convert_width=2), dtype=np.int16)
+    trimmed = trim_silence(samples, audio.sample_rate, threshold)
+    clip = sr.AudioData(trimmed.tobytes(), audio.sample_rate, 2)
+
+    if sample_rate and sample_rate < clip.sample_rate:
+        clip = sr.AudioData(clip.get_raw_data(convert_rate=sample_rate), sample_rate, 2)
+    return clip
+
+
+def clip_seconds(audio):
+    return len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+
+
+class PreprocessingEngine:
+    """Recognition engine wrapper that preprocesses each clip first"""
+
+    def __init__(self, engine, recognizer, sample_rate=16000, baseline_every=20, metrics=None):
+        self.engine = engine
+        self.recognizer = recognizer
+        # Offline engines name the rate they decode at
+        self.target_rate = engine.sample_rate or sample_rate
+        self.baseline_every = baseline_every
+        self.metrics = metrics
+
+        self._lock = threading.Lock()
+        self._clips = 0
+        # Recognition ms per second of audio, for recent unprocessed clips
+        self._baseline = deque(maxlen=20)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency_change_ms = 0.0
+        self.compared = 0
+
+    def __getattr__(self, attr):
+        # name, offline, warm_up, spot, ... come from the wrapped engine
+        return getattr(self.engine, attr)
+
+    def recognize(self, audio):
+        with self._lock:
+            self._clips += 1
+            baseline = self.baseline_every and self._clips % self.baseline_every == 0
+        seconds = clip_seconds(audio)
+
+        if baseline:
+            started = time.perf_counter()
+            text = self.engine.recognize(audio)
+            took = (time.perf_counter() - started) * 1000.0
+            if seconds:
+                with self._lock:
+                    self._baseline.append(took / seconds)
+            print(f"Unprocessed baseline clip: {seconds:.1f}s recognized in {took:.0f} ms")
+            return text
+
+        started = time.perf_counter()
+        clip = preprocess(audio, self.target_rate, self.recognizer.energy_threshold)
+        prepared = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.record("preprocess", prepared - started)
+
+        text = self.engine.recognize(clip)
+        took = (time.perf_counter() - started) * 1000.0
+        self._report(audio, clip, seconds, took)
+        return text
+
+    def _report(self, audio, clip, seconds, took):
+        size_in, size_out = len(audio.frame_data), len(clip.frame_data)
+        saved = 100.0 * (1 - size_out / size_in) if size_in else 0.0
+
+        with self._lock:
+            self.bytes_in += size_in
+            self.bytes_out += size_out
+            change = None
+            if self._baseline:
+                # What the clip would have taken unprocessed, at the recent rate
+                expected = sum(self._baseline) / len(self._baseline) * seconds
+                change = took - expected
+                self.latency_change_ms += change
+                self.compared += 1
+
+        line = (f"Preprocessed clip: {seconds:.1f}s -> {clip_seconds(clip):.1f}s, "
+                f"{size_in // 1024} KB -> {size_out // 1024} KB ({saved:.0f}% smaller), "
+                f"recognized in {took:.0f} ms")
+        if change is not None:
+            line += f" ({change:+.0f} ms vs unprocessed)"
+        print(line)
+
+    def status(self):
+        with self._lock:
+            if not self.bytes_in:
+                return "Preprocessing: no clips yet"
+            saved = 100.0 * (1 - self.bytes_out / self.bytes_in)
+            line = (f"Preprocessing: {(self.bytes_in - self.bytes_out) // 1024} KB saved "
+                    f"({saved:.0f}%) at {self.target_rate} Hz")
+            if self.compared:
+                line += f", {self.latency_change_ms / self.compared:+.0f} ms recognition per clip vs unprocessed"
+            return line
@@ -0,0 +1,140 @@
+# Headless batch transcription
+# Transcribes a directory or glob of WAV/AIFF/FLAC files across a process pool
+# and appends the results to the notes journal. Files that already have a
+# note are skipped, so an interrupted run can simply be started again.
+#
+#   python batch_transcribe.py recordings/
+#   python batch_transcribe.py "meetings/**/*.flac" --workers 8 --engine vosk
+
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import speech_recognition as sr
+
+import settings as app_settings
+from notes_store import NotesJournal, create_notes_store
+from recognition_engines import get_engine
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".aif", ".aiff")
+
+# Per-process recognizer and engine, created once by the pool initializer
+_recognizer = None
+_engine = None
+
+
+def find_audio_files(inputs):
+    """Expand directories and glob patterns into a sorted list of audio files"""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for dirpath, _, filenames in os.walk(item):
+                for filename in filenames:
+                    if filename.lower().endswith(AUDIO_EXTENSIONS):
+                        files.add(os.path.join(dirpath, filename))
+        else:
+            for path in glob.glob(item, recursive=True):
+                if path.lower().endswith(AUDIO_EXTENSIONS):
+                    files.add(path)
+    return sorted(os.path.abspath(path) for path in files)
+
+
+def _init_worker(settings):
+    global _recognizer, _engine
+    _recognizer = sr.Recognizer()
+    _engine = get_engine(_recognizer, settings)
+    try:
+        _engine.warm_up()
+    except Exception as e:
+        print(f"Recognition engine {_engine.name} warm-up failed: {e}")
+
+
+def transcribe_file(path, chunk_seconds):
+    """Transcribe one file in fixed-size chunks; returns (path, text, error)"""
+    texts = []
+    try:
+        with sr.AudioFile(path) as source:
+            while True:
+                audio = _recognizer.record(source, duration=chunk_seconds)
+                if not audio.frame_data:
+                    break
+                try:
+                    texts.append(_engine.recognize(audio))
+                except sr.UnknownValueError:
+                    continue
+    except Exception as e:
+        return path, None, str(e)
+
+    return path, " ".join(texts), None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe audio files into voice notes without the GUI")
+    parser.add_argument("inputs", nargs="+", help="directories or glob patterns of WAV/AIFF/FLAC files")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--engine", help="recognition engine, overrides voice_memo_settings.json")
+    parser.add_argument("--notes", help="notes journal to append to (default: the configured notes store)")
+    parser.add_argument("--chunk-seconds", type=float, default=30, help="audio sent per recognition request")
+    parser.add_argument("--no-resume", action="store_true", help="transcribe files that already have a note")
+    args = parser.parse_args(argv)
+
+    settings = app_settings.load_settings()
+    if args.engine:
+        settings['recognition_engine'] = args.engine
+
+    files = find_audio_files(args.inputs)
+    if args.notes:
+        store = NotesJournal(path=args.notes, fsync=settings['notes_fsync'],
+                             fsync_interval=settings['notes_fsync_interval'])
+    else:
+        store = create_notes_store(settings)
+    notes = store.load()
+
+    if not args.no_resume:
+        done = {note.get('source') for note in notes}
+        skipped = len(files)
+        files = [path for path in files if path not in done]
+        skipped -= len(files)
+        if skipped:
+            print(f"Skipping {skipped} files that were already transcribed")
+
+    if not files:
+        print("Nothing to transcribe")
+        store.close()
+        return 0
+
+    print(f"Transcribing {len(files)} files with {args.workers} workers")
+    started = time.monotonic()
+    failures = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(settings,)) as pool:
+            futures = [pool.submit(transcribe_file, path, args.chunk_seconds) for path in files]
+            for count, future in enumerate(as_completed(futures), 1):
+                path, text, error = future.result()
+                name = os.path.basename(path)
+                if error:
+                    failures += 1
+                    print(f"[{count}/{len(files)}] {name}: failed: {error}")
+                    continue
+
+                # Use the recording time, not the time of the batch run
+                timestamp = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d %H:%M:%S")
+                store.append({"timestamp": timestamp, "text": text or "[NO SPEECH]", "source": path})
+                print(f"[{count}/{len(files)}] {name}: {len(text.split())} words")
+    except KeyboardInterrupt:
+        print("Interrupted; run again to resume")
+        return 130
+    finally:
+        store.close()
+
+    print(f"Done in {time.monotonic() - started:.1f}s, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
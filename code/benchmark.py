@@ -0,0 +1,486 @@
+# Benchmark suite
+# Runs without a microphone, network or display: clips come from a WAV corpus
+# and are "recognized" by a stand-in engine that sleeps for a configurable
+# latency and returns the clip's sidecar transcript. The clips' audio goes
+# through the same path as a recording: preprocessing (if enabled and numpy
+# is installed), the engine and, with --archive, the audio archive. Results
+# are written to benchmark_results/ and compared with the previous run.
+#
+#   python benchmark.py
+#   python benchmark.py --quick
+#   python benchmark.py --corpus my_clips/ --latency-ms 400 --workers 4
+
+import argparse
+import asyncio
+import copy
+import glob
+import json
+import math
+import os
+import random
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from datetime import datetime
+
+from command_modules import COMMAND_MODULES
+from lazy_import import lazy_import
+from memo_core import VoiceMemoCore
+from metrics import LatencyHistogram
+from notes_store import NotesJournal
+from settings import DEFAULT_SETTINGS
+from voice_commands import VoiceCommandManager
+
+sr = lazy_import("speech_recognition")
+audio_preprocess = lazy_import("audio_preprocess")
+
+RESULTS_DIR = "benchmark_results"
+SAMPLE_RATE = 16000
+
+DICTATION = [
+    "remember to send the quarterly report to finance before friday",
+    "idea for the onboarding flow skip the tutorial for returning users",
+    "call the dentist about moving the appointment to next week",
+    "the build is failing on the windows runner only after the dependency bump",
+]
+
+
+def command_phrases():
+    phrases = {}
+    for module_name, module_info in COMMAND_MODULES.items():
+        for command_name, command_info in module_info["commands"].items():
+            for phrase in command_info["phrases"]:
+                phrases[phrase.lower()] = f"{module_name}_{command_name}"
+    return phrases
+
+
+# Corpus
+def make_corpus(directory, clips=24, seed=1):
+    """Write a synthetic corpus: tone bursts with a sidecar transcript each"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    phrases = list(command_phrases())
+
+    for i in range(clips):
+        # Alternate short command clips and longer dictation
+        if i % 2:
+            transcript, seconds = rng.choice(phrases), rng.uniform(0.8, 2.0)
+        else:
+            transcript, seconds = rng.choice(DICTATION), rng.uniform(4.0, 12.0)
+
+        path = os.path.join(directory, f"clip_{i:03d}.wav")
+        frequency = rng.uniform(120, 300)
+        with wave.open(path, 'wb') as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            samples = (int(8000 * math.sin(2 * math.pi * frequency * n / SAMPLE_RATE))
+                       for n in range(int(seconds * SAMPLE_RATE)))
+            f.writeframes(b"".join(struct.pack('<h', s) for s in samples))
+        with open(path[:-4] + ".txt", 'w') as f:
+            f.write(transcript)
+
+
+def load_corpus(directory):
+    """Return a list of clip dicts with raw frames, duration and transcript"""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        with wave.open(path, 'rb') as f:
+            if f.getnchannels() != 1:
+                print(f"Skipping {path}: only mono clips are supported")
+                continue
+            frames = f.readframes(f.getnframes())
+            duration = f.getnframes() / f.getframerate()
+            sample_rate, sample_width = f.getframerate(), f.getsampwidth()
+
+        sidecar = path[:-4] + ".txt"
+        transcript = os.path.basename(path)
+        if os.path.exists(sidecar):
+            with open(sidecar) as f:
+                transcript = f.read().strip()
+
+        corpus.append({"path": path, "frames": frames, "duration": duration, "transcript": transcript,
+                       "sample_rate": sample_rate, "sample_width": sample_width})
+    return corpus
+
+
+class StandInEngine:
+    """Offline recognizer replacement with a configurable response time
+
+    Returns the transcript of the corpus clip whose AudioData was passed to
+    recognize(). Behind preprocessing the audio that arrives is a processed
+    copy, so the outermost engine is transcripts() instead, which notes the
+    transcript for this thread before the clip is passed on.
+    """
+    name = "stand-in"
+    offline = True
+    sample_rate = None
+
+    def __init__(self, latency_ms=300, jitter_ms=100, per_second_ms=0, seed=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_second_ms = per_second_ms
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # id of a corpus clip's AudioData -> its transcript
+        self._transcripts = {}
+        self._current = threading.local()
+
+    def add_clip(self, audio, transcript):
+        self._transcripts[id(audio)] = transcript
+
+    def transcripts(self, engine):
+        """Wrap engine so the stand-in knows which clip it is recognizing"""
+        stand_in = self
+
+        class Transcripts:
+            def __getattr__(self, attr):
+                return getattr(engine, attr)
+
+            def recognize(self, audio):
+                stand_in._current.transcript = stand_in._transcripts.get(id(audio))
+                return engine.recognize(audio)
+
+        return Transcripts()
+
+    def recognize(self, audio):
+        transcript = self._transcripts.get(id(audio)) or getattr(self._current, "transcript", None)
+        if not transcript:
+            raise sr.UnknownValueError()
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        seconds = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        delay = max(0.0, self.latency_ms + jitter + self.per_second_ms * seconds)
+        time.sleep(delay / 1000.0)
+        return transcript
+
+
+# Benchmarks
+def bench_pipeline(corpus, engine, workers, repeat, notes_dir, archive=False):
+    """Clips through the headless core: preprocessing, queue, commands, archive and the journal"""
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings.update(transcription_workers=workers, transcription_queue_size=workers * 4,
+                    spool_directory=os.path.join(notes_dir, "spool"), audio_archive=archive,
+                    audio_archive_directory=os.path.join(notes_dir, "audio_archive"))
+    store = NotesJournal(path=os.path.join(notes_dir, "pipeline_notes.jsonl"),
+                         legacy_path=os.path.join(notes_dir, "none.json"))
+
+    # The core only builds the preprocessing stage around engines it creates
+    pipeline_engine = engine
+    preprocessed = False
+    if settings['preprocess_audio']:
+        try:
+            pipeline_engine = audio_preprocess.PreprocessingEngine(
+                engine, sr.Recognizer(), sample_rate=settings['upload_sample_rate'],
+                baseline_every=settings['preprocess_baseline_every'])
+            preprocessed = True
+        except ImportError as e:
+            print(f"  Audio preprocessing unavailable: {e}")
+
+    core = VoiceMemoCore(settings, notes_store=store, engine=engine.transcripts(pipeline_engine),
+                         command_manager=no_op_command_manager(), use_microphone=False)
+
+    latency = LatencyHistogram(window=len(corpus) * repeat)
+
+    # One AudioData per corpus clip, as a recording would produce
+    clips = []
+    for clip in corpus:
+        audio = sr.AudioData(clip["frames"], clip["sample_rate"], clip["sample_width"])
+        engine.add_clip(audio, clip["transcript"])
+        clips.append(audio)
+
+    def make_clip(audio):
+        return core.clip_from_audio(audio)
+
+    async def run():
+        await core.start()
+
+        async def track(note, submitted):
+            await note
+            latency.add((time.perf_counter() - submitted) * 1000.0)
+
+        started = time.perf_counter()
+        waiting = []
+        for _ in range(repeat):
+            for audio in clips:
+                submitted = time.perf_counter()
+                waiting.append(asyncio.ensure_future(track(await core.submit(make_clip(audio)), submitted)))
+        await asyncio.gather(*waiting)
+        elapsed = time.perf_counter() - started
+
+        await core.close()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    commands = sum(1 for note in core.notes if note["text"].startswith("[COMMAND"))
+
+    summary = latency.summary()
+    summary.update({
+        "clips": len(corpus) * repeat,
+        "commands": commands,
+        "audio_seconds": round(sum(clip["duration"] for clip in corpus) * repeat, 2),
+        "elapsed_s": round(elapsed, 3),
+        "clips_per_s": round(len(corpus) * repeat / elapsed, 2),
+        "workers": workers,
+        "engine_latency_ms": engine.latency_ms,
+        "preprocessed": preprocessed,
+        "archived": sum(1 for note in core.notes if "clip_id" in note),
+    })
+    return summary
+
+
+def no_op_command_manager():
+    """VoiceCommandManager whose handlers do nothing, so commands are safe to run"""
+    manager = VoiceCommandManager()
+    for handler_name in manager.dispatch:
+        manager.dispatch[handler_name] = lambda: True
+    return manager
+
+
+def bench_commands(iterations):
+    """execute_command lookups per second, with handlers replaced by no-ops"""
+    manager = no_op_command_manager()
+
+    texts = list(manager.command_map) + ["please skip song", "next songs"] + DICTATION
+    started = time.perf_counter()
+    for i in range(iterations):
+        manager.execute_command(texts[i % len(texts)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "iterations": iterations,
+        "lookups_per_s": round(iterations / elapsed),
+        "mean_us": round(elapsed / iterations * 1e6, 2),
+    }
+
+
+def _write_plugins(directory, count):
+    os.makedirs(directory, exist_ok=True)
+    for i in range(count):
+        with open(os.path.join(directory, f"plugin{i:04d}.py"), "w") as f:
+            f.write(f"COMMAND_MODULE = {{\"description\": \"Generated\", \"commands\": {{\n"
+                    + "".join(f"    \"c{j}\": {{\"phrases\": [\"plugin {i} command {j}\"]}},\n" for j in range(3))
+                    + "}}\n\n"
+                    + "".join(f"def c{j}():\n    return True\n\n" for j in range(3)))
+
+
+def bench_plugins(counts, scratch):
+    """Manager startup (manifest cache cold and warm) and dispatch with N plugins"""
+    results = {}
+    for count in counts:
+        directory = os.path.join(scratch, f"plugins_{count}")
+        _write_plugins(directory, count)
+
+        timings = {}
+        for run in ("cold", "warm"):
+            started = time.perf_counter()
+            manager = VoiceCommandManager(plugin_directory=directory)
+            timings[f"startup_{run}_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        # First call imports the plugin, later calls go straight to its function
+        match = manager.match_command(f"plugin {count - 1} command 2")
+        started = time.perf_counter()
+        manager.run_command(match)
+        timings["first_dispatch_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+        iterations = 10000
+        started = time.perf_counter()
+        for _ in range(iterations):
+            manager.run_command(match)
+        timings["dispatch_us"] = round((time.perf_counter() - started) / iterations * 1e6, 2)
+
+        results[str(count)] = dict(timings, handlers=len(manager.dispatch))
+        print(f"  {count} plugins: {results[str(count)]}")
+    return results
+
+
+def _make_notes(count):
+    return [{"timestamp": f"2024-01-01 00:00:{i % 60:02d}", "text": DICTATION[i % len(DICTATION)]}
+            for i in range(count)]
+
+
+def bench_notes(sizes, notes_dir):
+    """Journal load, single-note save and Notes pane render at each size"""
+    results = {}
+    root = None
+    try:
+        import tkinter as tk
+        from notes_view import NotesView
+        root = tk.Tk()
+        root.withdraw()
+    except Exception as e:
+        print(f"Render benchmark skipped (no display): {e}")
+
+    for size in sizes:
+        path = os.path.join(notes_dir, f"notes_{size}.jsonl")
+        store = NotesJournal(path=path, legacy_path=os.path.join(notes_dir, "none.json"))
+        notes = _make_notes(size)
+
+        started = time.perf_counter()
+        store._write_snapshot(path, notes)
+        write_all = time.perf_counter() - started
+
+        started = time.perf_counter()
+        loaded = store.load()
+        load = time.perf_counter() - started
+
+        save = LatencyHistogram()
+        for i in range(50):
+            note = {"timestamp": "2024-01-02 00:00:00", "text": f"new note {i}"}
+            started = time.perf_counter()
+            store.append(note)
+            # append() adds the note to loaded (the store's list) as well
+            save.add((time.perf_counter() - started) * 1000.0)
+        store.close()
+
+        result = {
+            "write_all_s": round(write_all, 4),
+            "load_s": round(load, 4),
+            "save_one_p50_ms": save.summary()["p50_ms"],
+            "save_one_p99_ms": save.summary()["p99_ms"],
+            "file_mb": round(os.path.getsize(path) / 1e6, 2),
+        }
+
+        if root is not None:
+            text = tk.Text(root)
+            view = NotesView(text)
+            started = time.perf_counter()
+            view.render(loaded)
+            root.update_idletasks()
+            result["render_s"] = round(time.perf_counter() - started, 4)
+
+            refresh = LatencyHistogram()
+            for i in range(50):
+                loaded.append({"timestamp": "2024-01-02 00:00:00", "text": f"rendered note {i}"})
+                started = time.perf_counter()
+                view.show_new()
+                root.update_idletasks()
+                refresh.add((time.perf_counter() - started) * 1000.0)
+            result["show_new_p50_ms"] = refresh.summary()["p50_ms"]
+            result["show_new_p99_ms"] = refresh.summary()["p99_ms"]
+            text.destroy()
+
+        results[str(size)] = result
+        os.remove(path)
+        print(f"  {size} notes: {result}")
+
+    if root is not None:
+        root.destroy()
+    return results
+
+
+# Results
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(previous, current):
+    """Print metrics that moved more than 10% since the previous run"""
+    before = _flatten(previous.get("results", {}))
+    after = _flatten(current["results"])
+    changes = []
+    for name, value in after.items():
+        old = before.get(name)
+        if old:
+            change = (value - old) / old * 100
+            if abs(change) >= 10:
+                changes.append(f"  {name}: {old} -> {value} ({change:+.0f}%)")
+
+    print(f"Compared with {previous.get('revision')} ({previous.get('started_at')}):")
+    print("\n".join(changes) if changes else "  no changes over 10%")
+
+
+def save_results(report, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    existing = sorted(glob.glob(os.path.join(directory, "*.json")))
+
+    name = f"{report['started_at'].replace(':', '').replace(' ', '_')}_{report['revision']}.json"
+    path = os.path.join(directory, name)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {path}")
+
+    if existing:
+        with open(existing[-1]) as f:
+            compare(json.load(f), report)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the transcription pipeline headlessly")
+    parser.add_argument("--corpus", help="directory of WAV clips with optional .txt transcripts "
+                                         "(default: a generated synthetic corpus)")
+    parser.add_argument("--latency-ms", type=float, default=300, help="stand-in recognizer latency")
+    parser.add_argument("--jitter-ms", type=float, default=100, help="random +/- latency jitter")
+    parser.add_argument("--per-second-ms", type=float, default=20, help="extra latency per second of audio")
+    parser.add_argument("--workers", type=int, default=2, help="transcription workers")
+    parser.add_argument("--repeat", type=int, default=2, help="passes over the corpus")
+    parser.add_argument("--archive", action="store_true", help="also write each clip to the audio archive")
+    parser.add_argument("--lookups", type=int, default=100000, help="execute_command iterations")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="comma-separated notes counts")
+    parser.add_argument("--plugins", default="10,100,500", help="comma-separated command plugin counts")
+    parser.add_argument("--quick", action="store_true", help="small sizes for a fast smoke run")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.sizes, args.lookups, args.repeat, args.plugins = "1000,10000", 10000, 1, "10,100"
+
+    report = {
+        "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "revision": git_revision(),
+        "args": vars(args),
+        "results": {},
+    }
+
+    with tempfile.TemporaryDirectory() as scratch:
+        corpus_dir = args.corpus
+        if corpus_dir is None:
+            corpus_dir = os.path.join(scratch, "corpus")
+            make_corpus(corpus_dir)
+        corpus = load_corpus(corpus_dir)
+        if not corpus:
+            parser.error(f"no WAV files in {corpus_dir}")
+
+        print(f"Pipeline: {len(corpus)} clips x {args.repeat}, {args.workers} workers")
+        engine = StandInEngine(args.latency_ms, args.jitter_ms, args.per_second_ms)
+        report["results"]["pipeline"] = bench_pipeline(corpus, engine, args.workers, args.repeat, scratch,
+                                                       archive=args.archive)
+        print(f"  {report['results']['pipeline']}")
+
+        print(f"Commands: {args.lookups} lookups")
+        report["results"]["commands"] = bench_commands(args.lookups)
+        print(f"  {report['results']['commands']}")
+
+        print("Command plugins:")
+        counts = [int(count) for count in args.plugins.split(",") if count]
+        report["results"]["plugins"] = bench_plugins(counts, scratch)
+
+        print("Notes store:")
+        sizes = [int(size) for size in args.sizes.split(",") if size]
+        report["results"]["notes"] = bench_notes(sizes, scratch)
+
+    save_results(report, args.results_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,233 @@
+# Command execution
+# Voice command handlers launch apps and send keys, and some of them used to
+# block for seconds. CommandExecutor runs each command on its own small
+# thread pool with a timeout, so the transcription pipeline only waits for a
+# command briefly and hears about slow ones when they finish.
+#
+# Threads cannot be killed, so timeouts and cancellation are cooperative: a
+# command that runs out of time is reported as timed out straight away and
+# its cancel flag is set. Handlers wait with sleep() and launch apps with
+# launch_first(), both of which give up once the flag is set.
+#
+# submit_batch() runs the commands of a compound utterance ("next song and
+# volume up") one after another in spoken order, each with its own timeout
+# counted from when it starts. A step that fails or times out does not stop
+# the ones after it.
+#
+# launch_first() takes launch strategies in order of preference, probes all
+# of them at once (is the executable there, is the URL protocol registered)
+# and launches with the first usable one. Only one strategy ever launches,
+# so an app is never opened twice.
+
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from lazy_import import lazy_import
+
+subprocess = lazy_import("subprocess")
+
+# probe() -> whether the strategy can work here; launch() starts the app
+LaunchStrategy = namedtuple("LaunchStrategy", "name probe launch")
+
+_local = threading.local()
+_probe_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="probe")
+
+
+class CommandRun:
+    """One command on its way through the executor"""
+
+    def __init__(self, match, timeout):
+        self.match = match
+        self.timeout = timeout
+        self.started = time.perf_counter()
+        self.cancelled = threading.Event()
+        # Resolved with the command result, by the handler or by the timeout
+        self.future = Future()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Ask the handler to give up; reported as failed if it had not finished"""
+        self._finish(False, cancelled=True)
+
+    def _finish(self, success, **extra):
+        with self._lock:
+            if self.future.done():
+                return False
+            if extra:
+                # Timed out or cancelled: tell the handler to stop
+                self.cancelled.set()
+            result = {"executed": True, "success": success,
+                      "phrase": self.match.phrase, "confidence": self.match.confidence}
+            result.update(extra)
+            self.future.set_result(result)
+            return True
+
+
+class CommandExecutor:
+    def __init__(self, manager, workers=2, timeout=5.0, timeouts=None):
+        self.manager = manager
+        self.timeout = timeout
+        # Per-handler overrides, e.g. {"spotify_open": 15.0}
+        self.timeouts = timeouts or {}
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="command")
+        self._lock = threading.Lock()
+        self._running = set()
+        self._closed = False
+
+    def submit(self, match):
+        """Start the command for a CommandMatch; returns its CommandRun"""
+        return self.submit_batch([match])[0]
+
+    def submit_batch(self, matches):
+        """Run commands one after another, in order; returns their CommandRuns"""
+        runs = [CommandRun(match, self.timeouts.get(match.handler, self.timeout)) for match in matches]
+        with self._lock:
+            self._running.update(runs)
+        for run in runs:
+            run.future.add_done_callback(lambda future, run=run: self._forget(run))
+        # Each step starts once the one before it has finished or timed out
+        for run, following in zip(runs, runs[1:]):
+            run.future.add_done_callback(lambda future, following=following: self._start(following))
+        self._start(runs[0])
+        return runs
+
+    def _start(self, run):
+        with self._lock:
+            closed = self._closed
+            if not closed and not run.future.done():
+                run.started = time.perf_counter()
+                timer = threading.Timer(run.timeout, self._expire, args=(run,))
+                timer.daemon = True
+                timer.start()
+                self._pool.submit(self._execute, run, timer)
+        if closed:
+            # Shutting down: report it as cancelled rather than never at all
+            # (outside the lock, the done callbacks take it)
+            run.cancel()
+
+    def _execute(self, run, timer):
+        if run.future.done():
+            # Cancelled or timed out while queued
+            return
+        _local.run = run
+        try:
+            result = self.manager.run_command(run.match)
+        except Exception as e:
+            print(f"Error executing command {run.match.handler}: {e}")
+            result = {"success": False}
+        finally:
+            _local.run = None
+            timer.cancel()
+        run._finish(bool(result.get("success", False)))
+
+    def _expire(self, run):
+        if run._finish(False, timed_out=True):
+            print(f"Command {run.match.handler} timed out after {run.timeout:g}s")
+
+    def _forget(self, run):
+        with self._lock:
+            self._running.discard(run)
+
+    def running(self):
+        with self._lock:
+            return len(self._running)
+
+    def shutdown(self):
+        """Cancel running commands and stop taking new ones"""
+        with self._lock:
+            self._closed = True
+            running = list(self._running)
+        for run in running:
+            run.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Helpers for handlers
+def cancelled():
+    """Whether the command running on this thread has been cancelled"""
+    run = getattr(_local, "run", None)
+    return run is not None and run.cancelled.is_set()
+
+
+def sleep(seconds):
+    """Sleep unless the current command is cancelled; False if it was"""
+    run = getattr(_local, "run", None)
+    if run is None:
+        time.sleep(seconds)
+        return True
+    return not run.cancelled.wait(seconds)
+
+
+def launch_first(strategies, probe_timeout=2.0):
+    """Probe strategies concurrently, launch with the first usable one in order
+
+    Returns the name of the strategy used, or None.
+    """
+    probes = [_probe_pool.submit(strategy.probe) for strategy in strategies]
+    deadline = time.perf_counter() + probe_timeout
+    try:
+        for strategy, probe in zip(strategies, probes):
+            if cancelled():
+                return None
+            try:
+                usable = probe.result(timeout=max(0.0, deadline - time.perf_counter()))
+            except Exception:
+                usable = False
+            if not usable:
+                continue
+            try:
+                strategy.launch()
+            except Exception as e:
+                print(f"Launch via {strategy.name} failed: {e}")
+                continue
+            return strategy.name
+        return None
+    finally:
+        for probe in probes:
+            probe.cancel()
+
+
+def spawn(path, *args):
+    """Start a program without waiting for it to exit"""
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS
+    return subprocess.Popen([path, *args], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL, **kwargs)
+
+
+def shell_start(target, timeout=5.0):
+    """Open a URL, protocol or registered app with the Windows start command"""
+    # start hands off to the shell and returns at once
+    subprocess.run(f'start "" "{target}"', shell=True, check=True, timeout=timeout)
+
+
+def protocol_registered(scheme):
+    """Whether a URL protocol such as spotify: has a handler (Windows)"""
+    try:
+        import winreg
+    except ImportError:
+        return False
+    try:
+        winreg.CloseKey(winreg.OpenKey(winreg.HKEY_CLASSES_ROOT, scheme))
+        return True
+    except OSError:
+        return False
+
+
+def app_registered(executable):
+    """Whether start can find executable through App Paths (Windows)"""
+    try:
+        import winreg
+    except ImportError:
+        return False
+    key = f"SOFTWARE\\Microsoft\\Windows\\CurrentVersion\\App Paths\\{executable}"
+    for root in (winreg.HKEY_CURRENT_USER, winreg.HKEY_LOCAL_MACHINE):
+        try:
+            winreg.CloseKey(winreg.OpenKey(root, key))
+            return True
+        except OSError:
+            continue
+    return False
@@ -0,0 +1,283 @@
+# Voice command matching
+# Phrases are indexed once into a token trie (exact phrases, also found inside
+# a longer transcript such as "please skip song") and a character trigram
+# index, bucketed by phrase length, that narrows fuzzy edit-distance matching
+# ("next songs") down to a handful of candidate phrases.
+#
+# parse() splits a compound utterance ("next song and volume up then remind
+# me to call mom") into steps. The transcript is cut into clauses at
+# connecting words and punctuation, each clause is matched on its own, and a
+# clause that is several phrases back to back ("next song volume up") is
+# split along them. Clauses that are not commands are kept, in their
+# original words, as dictation.
+
+import re
+from collections import Counter, namedtuple
+
+CommandMatch = namedtuple("CommandMatch", ["handler", "phrase", "confidence"])
+# One part of an utterance: a command (match set) or dictation (match None)
+Step = namedtuple("Step", ["match", "text"])
+
+# Words that may surround a command without making it dictation
+FILLER_WORDS = {
+    "please", "hey", "ok", "okay", "can", "could", "would", "you", "now",
+    "the", "a", "um", "uh", "just", "go", "ahead", "and", "thanks", "thank",
+}
+
+# Words that join the commands of a compound utterance
+CONNECTORS = {"and", "then", "also", "plus", "afterwards"}
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+_CLAUSE_END = re.compile(r"[,;.!?]$")
+
+
+def normalize(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, or limit + 1 once it is known to exceed limit
+
+    Only the diagonal band of width 2 * limit + 1 is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        char_a = a[i - 1]
+        low = max(1, i - limit)
+        high = min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        best = current[0]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+
+class CommandMatcher:
+    def __init__(self, phrase_map, min_confidence=0.8, fuzzy_candidates=5):
+        """phrase_map maps each spoken phrase to its handler name"""
+        self.min_confidence = min_confidence
+        self.fuzzy_candidates = fuzzy_candidates
+
+        self.phrases = {}
+        self.trie = {}
+        # phrase length -> trigram -> phrases of that length
+        self.trigram_index = {}
+        self.phrase_grams = {}
+
+        for phrase, handler in phrase_map.items():
+            self.add_phrase(phrase, handler)
+
+    def add_phrase(self, phrase, handler):
+        phrase = normalize(phrase)
+        if not phrase:
+            return
+        self.phrases[phrase] = handler
+
+        node = self.trie
+        for token in phrase.split():
+            node = node.setdefault(token, {})
+        node[None] = phrase
+
+        self.phrase_grams[phrase] = set(trigrams(phrase))
+        by_gram = self.trigram_index.setdefault(len(phrase), {})
+        for gram in self.phrase_grams[phrase]:
+            by_gram.setdefault(gram, []).append(phrase)
+
+    def find_spans(self, tokens, start=0):
+        """Yield (start, end, phrase) for every phrase found in tokens"""
+        for i in range(start, len(tokens)):
+            node = self.trie
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if None in node:
+                    yield i, j + 1, node[None]
+
+    def match(self, text):
+        """Return the best CommandMatch for text, or None"""
+        text = normalize(text)
+        if not text:
+            return None
+
+        # Exact phrase
+        handler = self.phrases.get(text)
+        if handler is not None:
+            return CommandMatch(handler, text, 1.0)
+
+        best = self._match_contained(text)
+        fuzzy = self._match_fuzzy(text)
+        if fuzzy and (best is None or fuzzy.confidence > best.confidence):
+            best = fuzzy
+
+        if best and best.confidence >= self.min_confidence:
+            return best
+        return None
+
+    def _match_contained(self, text):
+        """A known phrase inside the transcript, surrounded only by fillers"""
+        tokens = text.split()
+        best = None
+        for start, end, phrase in self.find_spans(tokens):
+            extra = [t for t in tokens[:start] + tokens[end:] if t not in FILLER_WORDS]
+            matched = end - start
+            confidence = 0.95 * matched / (matched + len(extra))
+            if best is None or confidence > best.confidence:
+                best = CommandMatch(self.phrases[phrase], phrase, confidence)
+        return best
+
+    def _match_fuzzy(self, text):
+        """Closest phrase by edit distance among trigram-sharing candidates"""
+        # Largest distance that can still reach min_confidence; phrases whose
+        # length differs by more than that can never match
+        ratio = self.min_confidence / 0.9
+        max_limit = int(len(text) * (1 - ratio) / ratio)
+        grams = set(trigrams(text))
+
+        # Each edit removes at most three trigrams, so a phrase within
+        # max_limit edits shares at least one of any 3 * max_limit + 1 of our
+        # trigrams. Probing only the rarest ones keeps the candidate set small.
+        per_gram = {}
+        for length in range(len(text) - max_limit, len(text) + max_limit + 1):
+            by_gram = self.trigram_index.get(length)
+            if not by_gram:
+                continue
+            for gram in grams:
+                phrases = by_gram.get(gram)
+                if phrases:
+                    per_gram.setdefault(gram, []).append(phrases)
+        if not per_gram:
+            return None
+
+        rarest = sorted(per_gram.values(), key=lambda lists: sum(map(len, lists)))
+        candidates = set()
+        for lists in rarest[:3 * max_limit + 1]:
+            for phrases in lists:
+                candidates.update(phrases)
+
+        shared = Counter()
+        for phrase in candidates:
+            count = len(grams & self.phrase_grams[phrase])
+            if count >= len(grams) - 3 * max_limit:
+                shared[phrase] = count
+
+        best = None
+        for phrase, _ in shared.most_common(self.fuzzy_candidates):
+            longest = max(len(text), len(phrase))
+            limit = int(longest * (1 - ratio))
+            distance = edit_distance(text, phrase, limit)
+            if distance > limit:
+                continue
+            confidence = 0.9 * (1 - distance / longest)
+            if best is None or confidence > best.confidence:
+                best = CommandMatch(self.phrases[phrase], phrase, confidence)
+        return best
+
+    def parse(self, text):
+        """Split text into Steps: commands in spoken order, and dictation
+
+        A transcript that matches a single command as a whole is that
+        command, as with match(). Otherwise each clause must match by itself,
+        so a phrase in the middle of a longer sentence stays dictation.
+        """
+        match = self.match(text)
+        if match is not None:
+            return [Step(match, text.strip())]
+
+        steps = []
+        dictation = []
+        joiner = []
+        for clause, after in self._clauses(text.split()):
+            commands = self._clause_commands(clause)
+            if commands:
+                self._add_dictation(steps, dictation)
+                dictation = []
+                steps.extend(commands)
+            else:
+                # Consecutive dictation clauses are kept as one, words and all
+                if dictation or not steps:
+                    dictation.extend(joiner)
+                dictation.extend(clause)
+            joiner = after
+        self._add_dictation(steps, dictation)
+        return steps
+
+    @staticmethod
+    def _add_dictation(steps, words):
+        # Nothing but fillers ("thanks") is not worth a step
+        text = " ".join(words)
+        if any(token not in FILLER_WORDS and token not in CONNECTORS for token in normalize(text).split()):
+            steps.append(Step(None, text))
+
+    @staticmethod
+    def _clauses(words):
+        """Yield (clause words, connecting words after it)"""
+        clause, joiner = [], []
+        for word in words:
+            if normalize(word) in CONNECTORS:
+                joiner.append(word)
+                continue
+            if joiner:
+                yield clause, joiner
+                clause, joiner = [], []
+            clause.append(word)
+            if _CLAUSE_END.search(word):
+                yield clause, []
+                clause = []
+        if clause or joiner:
+            yield clause, joiner
+
+    def _clause_commands(self, clause):
+        text = " ".join(clause)
+        if not normalize(text):
+            return []
+        match = self.match(text)
+        if match is not None:
+            return [Step(match, text.rstrip(",;.!?"))]
+
+        # Several phrases back to back, with nothing but fillers around them
+        tokens = normalize(text).split()
+        spans = self._cover(tokens)
+        if spans is None or len(spans) < 2:
+            return []
+        return [Step(CommandMatch(self.phrases[phrase], phrase, 1.0), phrase) for phrase in spans]
+
+    def _cover(self, tokens):
+        """Phrases that cover tokens end to end apart from fillers, or None"""
+        # best[i]: fewest phrases covering tokens[:i], as (count, phrases)
+        best = [None] * (len(tokens) + 1)
+        best[0] = (0, [])
+        for i in range(len(tokens)):
+            if best[i] is None:
+                continue
+            count, phrases = best[i]
+            if tokens[i] in FILLER_WORDS and (best[i + 1] is None or best[i + 1][0] > count):
+                best[i + 1] = (count, phrases)
+            for start, end, phrase in self.find_spans(tokens, i):
+                if start != i:
+                    break
+                if best[end] is None or best[end][0] > count + 1:
+                    best[end] = (count + 1, phrases + [phrase])
+        return best[-1][1] if best[-1] is not None else None
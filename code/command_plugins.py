@@ -0,0 +1,176 @@
+# Command plugins
+# Extra voice command modules can be dropped into the plugin directory
+# (plugins/ by default), one Python file per module:
+#
+#   # plugins/weather.py
+#   COMMAND_MODULE = {
+#       "description": "Weather reports",
+#       "commands": {
+#           "today": {"phrases": ["weather today"], "description": "Opens today's forecast"},
+#       },
+#   }
+#
+#   def today():
+#       ...
+#       return True
+#
+# Each command is handled by the module-level function of the same name.
+# Plugins are not imported at startup. Their COMMAND_MODULE literal and
+# function names are read from the source with ast, and the result is cached
+# in .manifest_cache.json by file size and modification time. Startup then
+# reads one cache file and stats each plugin, however many plugins there
+# are. A plugin module is imported the first time one of its commands runs.
+
+import ast
+import importlib.util
+import json
+import os
+import threading
+
+CACHE_NAME = ".manifest_cache.json"
+MANIFEST_NAME = "COMMAND_MODULE"
+
+
+class PluginError(Exception):
+    pass
+
+
+def read_manifest(path):
+    """COMMAND_MODULE and the top-level function names of a plugin, without importing it"""
+    with open(path, 'rb') as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    info = None
+    functions = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            functions.append(node.name)
+        elif isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == MANIFEST_NAME for target in node.targets):
+            try:
+                info = ast.literal_eval(node.value)
+            except ValueError:
+                raise PluginError(f"{MANIFEST_NAME} must be a literal dict")
+    if info is None:
+        raise PluginError(f"no {MANIFEST_NAME} defined")
+    return {"info": info, "functions": functions}
+
+
+def validate_module(info, functions):
+    """Check a plugin's COMMAND_MODULE; returns the commands that have a handler"""
+    if not isinstance(info, dict) or not isinstance(info.get("commands"), dict):
+        raise PluginError(f"{MANIFEST_NAME} needs a \"commands\" dict")
+
+    commands = {}
+    for name, command in info["commands"].items():
+        phrases = command.get("phrases") if isinstance(command, dict) else None
+        # A bare string would be taken one character at a time
+        if (not isinstance(phrases, (list, tuple)) or not phrases
+                or not all(isinstance(phrase, str) and phrase.strip() for phrase in phrases)):
+            print(f"Command plugin: {name} needs a list of phrases, skipped")
+        elif name not in functions:
+            print(f"Command plugin: no function {name}() for command {name}, skipped")
+        else:
+            commands[name] = command
+    return dict(info, commands=commands)
+
+
+class Plugin:
+    """A plugin module, imported on first use"""
+
+    def __init__(self, name, path, info):
+        self.name = name
+        self.path = path
+        self.info = info
+        self._module = None
+        self._error = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._module is None and self._error is None:
+                try:
+                    spec = importlib.util.spec_from_file_location(f"command_plugins.{self.name}", self.path)
+                    module = importlib.util.module_from_spec(spec)
+                    spec.loader.exec_module(module)
+                except Exception as e:
+                    self._error = PluginError(f"plugin {self.name} failed to load: {e}")
+                else:
+                    self._module = module
+                    print(f"Loaded command plugin {self.name}")
+            if self._error is not None:
+                raise self._error
+            return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def handler(self, command):
+        handler = getattr(self.load(), command, None)
+        if not callable(handler):
+            raise PluginError(f"plugin {self.name} has no function {command}()")
+        return handler
+
+
+class PluginCommand:
+    """Dispatch table entry that imports its plugin when first called"""
+    __slots__ = ("plugin", "command", "_handler")
+
+    def __init__(self, plugin, command):
+        self.plugin = plugin
+        self.command = command
+        self._handler = None
+
+    def __call__(self):
+        if self._handler is None:
+            self._handler = self.plugin.handler(self.command)
+        return self._handler()
+
+
+def discover_plugins(directory):
+    """Plugins in directory, from the manifest cache where files are unchanged"""
+    if not directory or not os.path.isdir(directory):
+        return []
+
+    cache_path = os.path.join(directory, CACHE_NAME)
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+
+    plugins = []
+    fresh = {}
+    with os.scandir(directory) as entries:
+        files = sorted((entry for entry in entries
+                        if entry.name.endswith(".py") and not entry.name.startswith("_") and entry.is_file()),
+                       key=lambda entry: entry.name)
+    for entry in files:
+        stat = entry.stat()
+        key = [stat.st_size, stat.st_mtime_ns]
+        cached = cache.get(entry.name)
+        if cached is not None and cached["key"] == key:
+            manifest = cached["manifest"]
+        else:
+            try:
+                manifest = read_manifest(entry.path)
+            except (OSError, SyntaxError, PluginError) as e:
+                print(f"Command plugin {entry.name} skipped: {e}")
+                continue
+        fresh[entry.name] = {"key": key, "manifest": manifest}
+
+        try:
+            info = validate_module(manifest["info"], manifest["functions"])
+        except PluginError as e:
+            print(f"Command plugin {entry.name} skipped: {e}")
+            continue
+        plugins.append(Plugin(entry.name[:-3], entry.path, info))
+
+    if fresh != cache:
+        try:
+            with open(cache_path, 'w') as f:
+                json.dump(fresh, f)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not save the command plugin cache: {e}")
+    return plugins
@@ -0,0 +1,242 @@
+# Hands-free listening
+# Instead of waiting for the hotkey, a background thread watches the
+# always-open microphone ring and cuts utterances out of it with voice
+# activity detection: a chunk is speech when its energy is above the
+# recognizer's threshold, which the noise floor tracker keeps a margin above
+# the room's noise. An utterance starts after min_speech seconds of speech,
+# keeps the preroll seconds before that, and ends after end_silence seconds
+# of silence or at max_utterance seconds. Each one is handed to the core
+# like a hotkey recording.
+#
+# Silence costs one energy estimate per chunk, taken on every fourth sample,
+# on a thread that sleeps until the next chunk arrives. Nothing is
+# recognized until someone speaks.
+#
+# Two rolling one-hour budgets keep it from running away over a long day:
+# CPU seconds used by the whole process while listening, and utterances
+# sent for recognition. When either is used up, listening pauses (without
+# reading the microphone at all) until enough of the last hour has expired.
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import speech_recognition as sr
+
+# Every SILENT_STRIDE-th sample is enough to tell silence from speech
+SILENT_STRIDE = 4
+
+
+class HourlyBudget:
+    """Allowance over a rolling window; a limit of 0 or None is unlimited"""
+
+    def __init__(self, limit, window=3600.0):
+        self.limit = limit
+        self.window = window
+        self._spent = deque()
+        self._total = 0.0
+        self._lock = threading.Lock()
+
+    def spend(self, amount, now=None):
+        if amount > 0:
+            with self._lock:
+                self._spent.append((time.monotonic() if now is None else now, amount))
+                self._total += amount
+
+    def used(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._spent and self._spent[0][0] <= now - self.window:
+                self._total -= self._spent.popleft()[1]
+            return max(0.0, self._total)
+
+    def exhausted(self, now=None):
+        return bool(self.limit) and self.used(now) >= self.limit
+
+    def resumes_in(self, now=None):
+        """Seconds until there is room in the budget again"""
+        now = time.monotonic() if now is None else now
+        total = self.used(now)
+        with self._lock:
+            for at, amount in self._spent:
+                total -= amount
+                if total < self.limit:
+                    return max(0.0, at + self.window - now)
+        return 0.0
+
+
+class HandsFreeListener:
+    def __init__(self, capture, threshold, on_utterance, busy=None, on_status=None,
+                 end_silence=0.8, min_speech=0.25, max_utterance=15.0, preroll=0.3,
+                 cpu_seconds_per_hour=None, recognitions_per_hour=None):
+        """threshold() is the current speech energy threshold.
+
+        on_utterance(audio, started_at) gets each utterance as sr.AudioData
+        with its start as a time.time() value. busy() is True while a hotkey
+        recording is running, when no utterances are cut. on_status(message)
+        reports pauses and resumes.
+        """
+        self.capture = capture
+        self.threshold = threshold
+        self.on_utterance = on_utterance
+        self.busy = busy or (lambda: False)
+        self.on_status = on_status or print
+
+        chunk_seconds = capture.chunk_seconds
+        self._end_chunks = max(1, int(round(end_silence / chunk_seconds)))
+        self._min_speech_chunks = max(1, int(round(min_speech / chunk_seconds)))
+        self._max_chunks = max(self._min_speech_chunks + 1, int(round(max_utterance / chunk_seconds)))
+        self._preroll = deque(maxlen=int(round(preroll / chunk_seconds)) + self._min_speech_chunks)
+
+        self.cpu_budget = HourlyBudget(cpu_seconds_per_hour)
+        self.recognition_budget = HourlyBudget(recognitions_per_hour)
+        self.paused = None
+
+        self.utterances = 0
+        self.chunks = 0
+        self._chunk_seconds = 0.0
+
+        self._utterance = None
+        self._started_at = None
+        self._speech_run = 0
+        self._silence_run = 0
+
+        # Each listening thread has its own stop event, so switching off and
+        # straight back on never leaves two threads reading
+        self._stopped = threading.Event()
+        self._stopped.set()
+        self._thread = None
+
+    @property
+    def running(self):
+        return not self._stopped.is_set()
+
+    def start(self):
+        if self.running:
+            return
+        self._reset()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stopped,), name="hands-free", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self, stopped):
+        ring = self.capture.ring
+        position = ring.written
+        cpu_mark = time.process_time()
+        while not stopped.is_set():
+            now = time.process_time()
+            self.cpu_budget.spend(now - cpu_mark)
+            cpu_mark = now
+
+            wait = self._budget_wait()
+            if wait:
+                # Don't touch the microphone until the budget allows it; time
+                # spent paused is not charged
+                stopped.wait(min(wait, 5.0))
+                position = ring.written
+                cpu_mark = time.process_time()
+                continue
+
+            chunk, position = ring.get(position, timeout=1.0)
+            if chunk is None:
+                # Stream stopped (device unplugged?); there is no hotkey
+                # recording to reopen it, so try every few seconds
+                if ring.closed and not stopped.wait(5.0):
+                    try:
+                        self.capture.start()
+                    except Exception as e:
+                        print(f"Hands-free: microphone still unavailable: {e}")
+                    position = ring.written
+                continue
+            if stopped.is_set():
+                break
+            if self.busy():
+                self._reset()
+                continue
+
+            started = time.perf_counter()
+            self.feed(chunk)
+            self.chunks += 1
+            self._chunk_seconds += time.perf_counter() - started
+
+    def _budget_wait(self):
+        """Seconds to stay paused for, reporting pauses and resumes"""
+        for name, budget in (("CPU", self.cpu_budget), ("recognition", self.recognition_budget)):
+            if budget.exhausted():
+                wait = budget.resumes_in()
+                if self.paused is None:
+                    self.paused = f"{name} budget used up"
+                    self._reset()
+                    self.on_status(f"Hands-free paused: {self.paused}, resuming in {wait / 60:.0f} min")
+                return max(wait, 0.1)
+        if self.paused is not None:
+            self.paused = None
+            self.on_status("Hands-free listening resumed")
+        return 0.0
+
+    @staticmethod
+    def energy(chunk, stride=1):
+        """RMS of 16-bit samples, over every stride-th sample"""
+        samples = np.frombuffer(chunk, dtype=np.int16)[::stride].astype(np.float32)
+        if not samples.size:
+            return 0.0
+        return float(np.sqrt(np.dot(samples, samples) / samples.size))
+
+    def feed(self, chunk):
+        """Run one chunk through the speech detector"""
+        if self._utterance is None:
+            speech = self.energy(chunk, SILENT_STRIDE) > self.threshold()
+            self._preroll.append(chunk)
+            # A quiet chunk between syllables sets the count back, not to zero
+            self._speech_run = self._speech_run + 1 if speech else max(0, self._speech_run - 1)
+            if self._speech_run >= self._min_speech_chunks:
+                # Chunks are immutable bytes; the utterance only holds references
+                chunk_seconds = self.capture.chunk_seconds
+                self._utterance = list(self._preroll)
+                self._started_at = time.time() - len(self._utterance) * chunk_seconds
+                self._silence_run = 0
+            return
+
+        self._utterance.append(chunk)
+        speech = self.energy(chunk) > self.threshold()
+        self._silence_run = 0 if speech else self._silence_run + 1
+        if self._silence_run >= self._end_chunks or len(self._utterance) >= self._max_chunks:
+            self._finish()
+
+    def _finish(self):
+        # Keep a little of the closing silence, not all of it
+        trailing = max(0, self._silence_run - self._preroll.maxlen)
+        chunks = self._utterance[:len(self._utterance) - trailing]
+        started_at = self._started_at
+        self._reset()
+
+        if self.recognition_budget.exhausted():
+            return
+        self.recognition_budget.spend(1)
+        self.utterances += 1
+        audio = sr.AudioData(b"".join(chunks), self.capture.SAMPLE_RATE, self.capture.SAMPLE_WIDTH)
+        try:
+            self.on_utterance(audio, started_at)
+        except Exception as e:
+            print(f"Hands-free utterance failed: {e}")
+
+    def _reset(self):
+        self._utterance = None
+        self._started_at = None
+        self._speech_run = 0
+        self._silence_run = 0
+        self._preroll.clear()
+
+    def status(self):
+        per_chunk = self._chunk_seconds / self.chunks * 1e6 if self.chunks else 0.0
+        state = f"paused ({self.paused})" if self.paused else ("listening" if self.running else "off")
+        cpu_limit = f"/{self.cpu_budget.limit:g}" if self.cpu_budget.limit else ""
+        calls_limit = f"/{self.recognition_budget.limit:g}" if self.recognition_budget.limit else ""
+        return (f"Hands-free: {state}, {self.utterances} utterances   "
+                f"Last hour: {self.cpu_budget.used():.1f}{cpu_limit} CPU s, "
+                f"{self.recognition_budget.used():.0f}{calls_limit} recognitions   "
+                f"{per_chunk:.1f} us/chunk")
@@ -1,64 +1,83 @@
+import time
+_process_start = time.perf_counter()
+
 import tkinter as tk
-from tkinter import scrolledtext, messagebox
-import speech_recognition as sr
+from tkinter import scrolledtext, messagebox, filedialog
 import threading
-import keyboard
-import json
-import os
-from datetime import datetime
-import winsound
-from voice_commands import VoiceCommandManager
+from lazy_import import lazy_import
 from command_modules import COMMAND_MODULES
+from notes_view import NotesView
+from memo_core import VoiceMemoCore
+from metrics import LatencyTracker, StartupTimer, STAGES
+import settings as app_settings
+
+# Imported in the background after the window is up
+keyboard = lazy_import("keyboard")
+winsound = lazy_import("winsound")
 
 class VoiceMemoApp:
     def __init__(self):
-        self.root = tk.Tk()
-        self.root.title("Voice Memo Transcriber")
-        self.root.geometry("900x700")
-        
-        # Dark mode color scheme
-        self.colors = {
-            'bg': '#1a1a1a',
-            'surface': '#2d2d2d',
-            'primary': '#0d7377',
-            'primary_hover': '#14a085',
-            'secondary': '#404040',
-            'success': '#4caf50',
-            'danger': '#f44336',
-            'text': '#ffffff',
-            'text_secondary': '#b0b0b0',
-            'border': '#404040'
-        }
-        
-        # Configure root window
-        self.root.configure(bg=self.colors['bg'])
-        
-        # Initialize speech recognition
-        self.recognizer = sr.Recognizer()
-        self.microphone = sr.Microphone()
-        
-        # Initialize command manager
-        self.command_manager = VoiceCommandManager()
-        
-        # State variables
-        self.is_recording = False
-        self.notes = []
-        self.notes_file = "voice_notes.json"
-        self.settings_file = "voice_memo_settings.json"
+        self.startup = StartupTimer(_process_start)
+        
+        with self.startup.phase("tk window"):
+            self.root = tk.Tk()
+            self.root.title("Voice Memo Transcriber")
+            self.root.geometry("900x700")
+            
+            # Dark mode color scheme
+            self.colors = {
+                'bg': '#1a1a1a',
+                'surface': '#2d2d2d',
+                'primary': '#0d7377',
+                'primary_hover': '#14a085',
+                'secondary': '#404040',
+                'success': '#4caf50',
+                'danger': '#f44336',
+                'text': '#ffffff',
+                'text_secondary': '#b0b0b0',
+                'border': '#404040'
+            }
+            
+            # Configure root window
+            self.root.configure(bg=self.colors['bg'])
+        
+        # Per-stage latency histograms for the Diagnostics tab
+        self.metrics = LatencyTracker()
+        
+        self.settings = {}
         self.current_hotkey = "f9"  # Default hotkey
         
-        # Load existing notes and settings
-        self.load_notes()
-        self.load_settings()
+        with self.startup.phase("settings"):
+            # Load settings first, they configure the notes store
+            self.load_settings()
+            self.search_job = None
+            
+            # Capture, recognition, commands and storage; the window only
+            # sends it requests and shows the events it publishes
+            self.core = VoiceMemoCore(self.settings, metrics=self.metrics, startup=self.startup)
+            self.core.subscribe(self.on_core_event)
         
         # Setup GUI
-        self.setup_gui()
-        
-        # Setup global hotkey (F9 by default)
-        self.setup_hotkey()
+        with self.startup.phase("gui"):
+            self.setup_gui()
         
-        # Adjust microphone for ambient noise
-        self.calibrate_microphone()
+        # Everything else loads once the window is on screen
+        self.root.bind("<Map>", self.on_window_shown)
+    
+    def on_window_shown(self, event):
+        # Child widgets' <Map> events also reach the root's bindings
+        if event.widget is not self.root:
+            return
+        self.root.unbind("<Map>")
+        self.startup.mark("window visible")
+        self.core.start_in_thread()
+        threading.Thread(target=self.initialize_hotkey, daemon=True).start()
+    
+    def initialize_hotkey(self):
+        """Import keyboard and register the global hotkey in the background"""
+        with self.startup.phase("hotkey"):
+            keyboard.load()
+            self.setup_hotkey()
     
     def create_button(self, parent, text, command, bg_color, hover_color=None, **kwargs):
         """Create a custom button with proper dark theme"""
@@ -116,6 +135,11 @@ class VoiceMemoApp:
                                                         lambda: self.switch_tab("commands"))
         self.commands_tab_btn.pack(side="left")
         
+        self.diagnostics_tab_btn = self.create_notebook_tab(self.tab_frame, "Diagnostics",
+                                                           self.colors['surface'], self.colors['primary'],
+                                                           lambda: self.switch_tab("diagnostics"))
+        self.diagnostics_tab_btn.pack(side="left")
+        
         # Create content frames
         self.content_frame = tk.Frame(self.root, bg=self.colors['bg'])
         self.content_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
@@ -126,8 +150,14 @@ class VoiceMemoApp:
         # Commands tab content
         self.commands_frame = tk.Frame(self.content_frame, bg=self.colors['surface'], relief='flat')
         
+        # Diagnostics tab content
+        self.diagnostics_frame = tk.Frame(self.content_frame, bg=self.colors['surface'], relief='flat')
+        
         self.setup_main_tab()
-        self.setup_commands_tab()
+        self.setup_diagnostics_tab()
+        
+        # Built the first time the tab is opened
+        self.commands_tab_built = False
         
         # Set initial tab
         self.current_tab = None
@@ -138,10 +168,12 @@ class VoiceMemoApp:
         # Hide all frames
         self.main_frame.pack_forget()
         self.commands_frame.pack_forget()
+        self.diagnostics_frame.pack_forget()
         
         # Reset all tab colors
         self.main_tab_btn.config(bg=self.colors['surface'])
         self.commands_tab_btn.config(bg=self.colors['surface'])
+        self.diagnostics_tab_btn.config(bg=self.colors['surface'])
         
         # Show selected tab and highlight button
         if tab_name == "main":
@@ -149,9 +181,17 @@ class VoiceMemoApp:
             self.main_tab_btn.config(bg=self.colors['primary'])
             self.current_tab = self.main_tab_btn
         elif tab_name == "commands":
+            if not self.commands_tab_built:
+                self.setup_commands_tab()
+                self.commands_tab_built = True
             self.commands_frame.pack(fill="both", expand=True)
             self.commands_tab_btn.config(bg=self.colors['primary'])
             self.current_tab = self.commands_tab_btn
+        elif tab_name == "diagnostics":
+            self.diagnostics_frame.pack(fill="both", expand=True)
+            self.diagnostics_tab_btn.config(bg=self.colors['primary'])
+            self.current_tab = self.diagnostics_tab_btn
+            self.refresh_diagnostics()
     
     def setup_main_tab(self):
         # Configure main frame
@@ -173,8 +213,14 @@ class VoiceMemoApp:
                                                self.colors['primary_hover'], padx=20, pady=10)
         self.record_button.pack(side="left", padx=(0, 15))
         
+        # Hands-free listening toggle
+        self.hands_free_button = self.create_button(control_frame, "🎧 Hands-free: Off",
+                                                   self.toggle_hands_free, self.colors['secondary'],
+                                                   '#5a6268', padx=15, pady=10)
+        self.hands_free_button.pack(side="left")
+        
         # Status label
-        self.status_label = tk.Label(control_frame, text=f"Press {self.current_hotkey.upper()} to start recording",
+        self.status_label = tk.Label(control_frame, text="Starting up...",
                                     bg=self.colors['surface'], fg=self.colors['primary'],
                                     font=('Segoe UI', 10, 'bold'))
         self.status_label.pack(side="left", padx=(15, 0))
@@ -218,6 +264,25 @@ class VoiceMemoApp:
                                    font=('Segoe UI', 11, 'bold'), bd=1, relief='solid')
         notes_frame.pack(fill='both', expand=True, padx=20, pady=(0, 20))
         
+        # Search bar
+        search_frame = tk.Frame(notes_frame, bg=self.colors['surface'])
+        search_frame.pack(fill='x', padx=15, pady=(15, 0))
+        
+        tk.Label(search_frame, text="Search:", bg=self.colors['surface'], 
+                fg=self.colors['text'], font=('Segoe UI', 10)).pack(side=tk.LEFT)
+        
+        self.search_var = tk.StringVar()
+        self.search_entry = tk.Entry(search_frame, textvariable=self.search_var, 
+                                    width=40, bg=self.colors['surface'], fg=self.colors['text'],
+                                    insertbackground=self.colors['text'], bd=1, relief='solid')
+        self.search_entry.pack(side=tk.LEFT, padx=(10, 10))
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
+        
+        self.search_label = tk.Label(search_frame, text='words, "a phrase", after:2024-01-31, before:, on:', 
+                                    bg=self.colors['surface'], fg=self.colors['text_secondary'],
+                                    font=('Segoe UI', 9))
+        self.search_label.pack(side=tk.LEFT)
+        
         # Notes text area
         self.notes_text = scrolledtext.ScrolledText(notes_frame, height=15, width=80,
                                                    bg=self.colors['surface'],
@@ -235,8 +300,11 @@ class VoiceMemoApp:
         self.notes_text.vbar.config(bg=self.colors['surface'], troughcolor=self.colors['bg'],
                                    highlightthickness=0, bd=0)
         
-        # Display existing notes
-        self.display_notes()
+        # Existing notes are displayed once they have loaded
+        self.notes_view = NotesView(self.notes_text)
+        
+        # Double-click a note to hear its archived audio
+        self.notes_text.bind("<Double-Button-1>", self.play_note_audio)
     
     def setup_commands_tab(self):
         # Configure commands frame
@@ -273,8 +341,9 @@ class VoiceMemoApp:
         
         canvas.bind_all("<MouseWheel>", _on_mousewheel)
         
-        # Display command modules
-        for module_name, module_info in COMMAND_MODULES.items():
+        # Display command modules, with plugins once the command manager is up
+        modules = getattr(self.core.command_manager, "modules", COMMAND_MODULES)
+        for module_name, module_info in modules.items():
             # Module frame
             module_frame = tk.LabelFrame(scrollable_frame, 
                                         text=f"📋 {module_name.title()} Commands", 
@@ -318,6 +387,80 @@ class VoiceMemoApp:
         canvas.pack(side="left", fill="both", expand=True, padx=(20, 0), pady=(0, 20))
         scrollbar.pack(side="right", fill="y", pady=(0, 20), padx=(0, 20))
     
+    def setup_diagnostics_tab(self):
+        # Configure diagnostics frame
+        self.diagnostics_frame.configure(bg=self.colors['surface'])
+        
+        # Title
+        title_label = tk.Label(self.diagnostics_frame, text="Pipeline Latency", 
+                              bg=self.colors['surface'], fg=self.colors['text'],
+                              font=('Segoe UI', 20, 'bold'))
+        title_label.pack(pady=(20, 30))
+        
+        # Export buttons
+        export_frame = tk.Frame(self.diagnostics_frame, bg=self.colors['surface'])
+        export_frame.pack(pady=(0, 20), padx=20, fill='x')
+        
+        export_json_button = self.create_button(export_frame, "Export JSON", 
+                                               lambda: self.export_metrics("json"), self.colors['secondary'],
+                                               '#5a6268', padx=15, pady=8)
+        export_json_button.pack(side="left", padx=(0, 15))
+        
+        export_csv_button = self.create_button(export_frame, "Export CSV", 
+                                              lambda: self.export_metrics("csv"), self.colors['secondary'],
+                                              '#5a6268', padx=15, pady=8)
+        export_csv_button.pack(side="left")
+        
+        tk.Label(export_frame, text="Rolling window of the last 1000 samples per stage", 
+                bg=self.colors['surface'], fg=self.colors['text_secondary'],
+                font=('Segoe UI', 9)).pack(side="right")
+        
+        # Stage table
+        self.diagnostics_text = tk.Text(self.diagnostics_frame, height=12,
+                                        bg=self.colors['surface'], fg=self.colors['text'],
+                                        font=('Consolas', 10), borderwidth=0,
+                                        relief='flat', highlightthickness=0)
+        self.diagnostics_text.pack(fill='both', expand=True, padx=20, pady=(0, 20))
+    
+    def refresh_diagnostics(self):
+        """Redraw the stage table, once a second while the tab is visible"""
+        if self.current_tab != self.diagnostics_tab_btn:
+            return
+        
+        summary = self.metrics.summary()
+        lines = [f"{'Stage':<20}{'Count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'Max ms':>12}"]
+        for stage in list(STAGES) + [stage for stage in summary if stage not in STAGES]:
+            stats = summary[stage]
+            lines.append(f"{stage:<20}{stats['count']:>8}{stats['p50_ms']:>12.1f}"
+                         f"{stats['p95_ms']:>12.1f}{stats['p99_ms']:>12.1f}{stats['max_ms']:>12.1f}")
+        
+        status_lines = self.core.status_lines()
+        if status_lines:
+            lines += [""] + status_lines
+        
+        self.diagnostics_text.config(state='normal')
+        self.diagnostics_text.delete(1.0, tk.END)
+        self.diagnostics_text.insert(tk.END, "\n".join(lines) + "\n\n" + self.startup.report())
+        self.diagnostics_text.config(state='disabled')
+        
+        self.root.after(1000, self.refresh_diagnostics)
+    
+    def export_metrics(self, fmt):
+        path = filedialog.asksaveasfilename(defaultextension=f".{fmt}",
+                                            initialfile=f"voice_memo_latency.{fmt}",
+                                            filetypes=[(fmt.upper(), f"*.{fmt}")])
+        if not path:
+            return
+        
+        try:
+            if fmt == "json":
+                self.metrics.export_json(path)
+            else:
+                self.metrics.export_csv(path)
+            messagebox.showinfo("Exported", f"Latency data saved to:\n{path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not export latency data: {e}")
+    
     def setup_hotkey(self):
         # Register hotkey
         try:
@@ -327,8 +470,8 @@ class VoiceMemoApp:
             print(f"Failed to register hotkey: {e}")
     
     def hotkey_pressed(self):
-        """Handle hotkey press by dispatching to main thread"""
-        self.root.after(0, self.toggle_recording)
+        """Handle hotkey press; the core is safe to call from the hook thread"""
+        self.core.toggle_recording(time.perf_counter())
     
     def change_hotkey(self):
         new_hotkey = self.hotkey_var.get().strip().lower()
@@ -363,48 +506,46 @@ class VoiceMemoApp:
             messagebox.showerror("Error", f"Invalid hotkey: {new_hotkey}\n\nError: {e}")
             self.hotkey_var.set(self.current_hotkey)
     
-    def calibrate_microphone(self):
-        # Calibrate microphone for ambient noise in a separate thread
-        def calibrate():
-            try:
-                with self.microphone as source:
-                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                    self.recognizer.energy_threshold = 300
-                    self.recognizer.pause_threshold = 1.5
-                print("Microphone calibrated for ambient noise")
-            except Exception as e:
-                print(f"Microphone calibration failed: {e}")
-        
-        threading.Thread(target=calibrate, daemon=True).start()
-    
     def toggle_recording(self):
-        if self.is_recording:
-            self.stop_recording()
-        else:
-            self.start_recording()
+        self.core.toggle_recording()
     
-    def start_recording(self):
-        if self.is_recording:
-            return
-        
-        self.is_recording = True
-        self.record_button.config(text="⏹️ Stop Recording")
-        self.status_label.config(text="Recording... Press {} to stop".format(self.current_hotkey.upper()))
-        
-        # Play start beep
-        self.play_beep("start")
-        
-        # Start recording in separate thread
-        recording_thread = threading.Thread(target=self.record_audio, daemon=True)
-        recording_thread.start()
+    def toggle_hands_free(self):
+        self.core.set_hands_free(not self.settings['hands_free'])
     
-    def stop_recording(self):
-        self.is_recording = False
-        self.record_button.config(text="🎤 Start Recording")
-        self.status_label.config(text="Processing...")
-        
-        # Play stop beep
-        self.play_beep("stop")
+    def on_core_event(self, event, data):
+        """Called on the core's loop thread; handled on the Tk thread"""
+        self.root.after(0, self.handle_core_event, event, data)
+    
+    def handle_core_event(self, event, data):
+        if event == "notes_loaded":
+            self.display_notes()
+        elif event == "ready":
+            self.status_label.config(text=data["error"] or f"Press {self.current_hotkey.upper()} to start recording")
+        elif event == "recording_started":
+            self.record_button.config(text="⏹️ Stop Recording")
+            self.status_label.config(text="Recording... Press {} to stop".format(self.current_hotkey.upper()))
+            self.play_beep("start")
+        elif event == "recording_stopped":
+            self.record_button.config(text="🎤 Start Recording")
+            self.status_label.config(text="Processing...")
+            self.play_beep("stop")
+        elif event == "partial":
+            self.show_partial(data["text"])
+        elif event == "note_added":
+            self.show_note(data["note"], data["command"], data["spooled"], data["spool_pending"])
+        elif event == "command_finished":
+            result = data["result"]
+            self.status_label.config(text=f"Command {self.command_state(result)}: {result['phrase']}")
+        elif event == "hands_free":
+            self.hands_free_button.config(text=f"🎧 Hands-free: {'On' if data['enabled'] else 'Off'}")
+            if data["enabled"] != self.settings['hands_free']:
+                self.settings['hands_free'] = data["enabled"]
+                self.save_settings()
+        elif event == "notes_cleared":
+            self.search_var.set("")
+            self.display_notes()
+        elif event == "status":
+            self.status_label.config(text=data["message"])
     
     def play_beep(self, beep_type):
         """Play system beep"""
@@ -413,117 +554,93 @@ class VoiceMemoApp:
         elif beep_type == "stop":
             winsound.Beep(400, 300)
     
-    def record_audio(self):
-        try:
-            with self.microphone as source:
-                audio = self.recognizer.listen(source, timeout=2, phrase_time_limit=60)
-            
-            # Transcribe audio
-            self.transcribe_audio(audio)
-            
-        except sr.WaitTimeoutError:
-            self.root.after(0, self.stop_recording)
-        except Exception as e:
-            error_msg = f"Recording error: {e}"
-            self.root.after(0, self.stop_recording)
-            self.root.after(0, lambda msg=error_msg: self.status_label.config(text=msg))
+    def play_note_audio(self, event):
+        note = self.notes_view.note_at(f"@{event.x},{event.y}")
+        if note is None or "clip_id" not in note or self.core.archive is None:
+            return
+        
+        def play():
+            try:
+                winsound.PlaySound(self.core.archive.wav_data(note["clip_id"]), winsound.SND_MEMORY)
+            except Exception as e:
+                self.root.after(0, lambda: self.status_label.config(text=f"Could not play clip: {e}"))
+        
+        threading.Thread(target=play, daemon=True).start()
     
-    def transcribe_audio(self, audio):
-        try:
-            # Use Google Speech Recognition
-            text = self.recognizer.recognize_google(audio)
-            text_lower = text.lower().strip()
-            
-            # Try to execute command
-            command_result = self.command_manager.execute_command(text_lower)
-            
-            # Create note entry
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            if command_result["executed"]:
-                status = "EXECUTED" if command_result["success"] else "FAILED"
-                note = {
-                    "timestamp": timestamp,
-                    "text": f"[COMMAND {status}] {text}",
-                }
-                status_text = f"Command {'executed' if command_result['success'] else 'failed'}: {text}"
-            else:
-                # Regular note
-                note = {
-                    "timestamp": timestamp,
-                    "text": text
-                }
-                status_text = "Note added! Press {} to record again".format(self.current_hotkey.upper())
-            
-            self.notes.append(note)
-            
-            # Update GUI
-            self.root.after(0, lambda: self.update_after_transcription(status_text))
-            
-        except sr.UnknownValueError:
-            self.root.after(0, self.stop_recording)
-            self.root.after(0, lambda: self.status_label.config(text="Could not understand audio"))
-        except sr.RequestError as e:
-            error_msg = f"Speech recognition error: {e}"
-            self.root.after(0, self.stop_recording)
-            self.root.after(0, lambda msg=error_msg: self.status_label.config(text=msg))
-        finally:
-            self.root.after(0, self.stop_recording)
+    def show_partial(self, text):
+        """Show partial transcript text while recording continues"""
+        if len(text) > 80:
+            text = "..." + text[-77:]
+        self.status_label.config(text=f"Hearing: {text}")
     
-    def update_after_transcription(self, status_text):
-        self.display_notes()
-        self.save_notes()
+    def show_note(self, note, command_result, spooled, spool_pending=0):
+        """Show a note the core has just saved"""
+        with self.metrics.time("ui_refresh"):
+            self.notes_view.show_new()
+        
+        if spooled:
+            status_text = (f"Recognized clip from {note['timestamp']} "
+                           f"({spool_pending} still spooled)")
+        elif command_result is not None:
+            steps = command_result.get("steps")
+            label = f"{len(steps)} commands" if steps else "Command"
+            status_text = f"{label} {self.command_state(command_result)}: {command_result['text']}"
+        else:
+            status_text = "Note added! Press {} to record again".format(self.current_hotkey.upper())
         self.status_label.config(text=status_text)
     
+    def command_state(self, result):
+        if result.get("timed_out"):
+            return "timed out"
+        if result.get("cancelled"):
+            return "cancelled"
+        if result["success"] is None:
+            return "running"
+        return "executed" if result["success"] else "failed"
+    
     def display_notes(self):
-        self.notes_text.delete(1.0, tk.END)
-        for note in self.notes:
-            self.notes_text.insert(tk.END, f"[{note['timestamp']}]\n{note['text']}\n\n")
+        """Re-render the Notes pane from scratch (startup and clear)"""
+        self.notes_view.render(self.core.notes)
+    
+    def schedule_search(self, event=None):
+        """Search shortly after the user stops typing"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(200, self.run_search)
+    
+    def run_search(self):
+        self.search_job = None
+        query = self.search_var.get().strip()
+        
+        notes = self.core.notes
+        if not query or not self.core.ready:
+            if self.notes_view.notes is not notes:
+                self.display_notes()
+            self.search_label.config(text='words, "a phrase", after:2024-01-31, before:, on:')
+            return
+        
+        started = time.perf_counter()
+        numbers = self.core.search(query)
+        elapsed_ms = (time.perf_counter() - started) * 1000
         
-        # Scroll to bottom
-        self.notes_text.see(tk.END)
+        # Oldest first, like the full notes list
+        self.notes_view.render([notes[number] for number in reversed(numbers)])
+        self.search_label.config(text=f"{len(numbers)} matches in {elapsed_ms:.1f} ms")
     
     def clear_notes(self):
+        if not self.core.ready:
+            return
         if messagebox.askyesno("Clear Notes", "Are you sure you want to clear all notes?"):
-            self.notes = []
-            self.display_notes()
-            self.save_notes()
-    
-    def load_notes(self):
-        try:
-            if os.path.exists(self.notes_file):
-                with open(self.notes_file, 'r') as f:
-                    self.notes = json.load(f)
-        except Exception as e:
-            print(f"Error loading notes: {e}")
-            self.notes = []
-    
-    def save_notes(self):
-        try:
-            with open(self.notes_file, 'w') as f:
-                json.dump(self.notes, f, indent=2)
-        except Exception as e:
-            print(f"Error saving notes: {e}")
+            # The core publishes notes_cleared once the store is empty
+            self.core.clear_notes_threadsafe()
     
     def load_settings(self):
-        try:
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r') as f:
-                    settings = json.load(f)
-                    self.current_hotkey = settings.get('hotkey', 'f9')
-        except Exception as e:
-            print(f"Error loading settings: {e}")
-            self.current_hotkey = 'f9'
+        self.settings = app_settings.load_settings()
+        self.current_hotkey = self.settings['hotkey']
     
     def save_settings(self):
-        try:
-            settings = {
-                'hotkey': self.current_hotkey
-            }
-            with open(self.settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+        self.settings['hotkey'] = self.current_hotkey
+        app_settings.save_settings(self.settings)
     
     def run(self):
         try:
@@ -531,8 +648,9 @@ class VoiceMemoApp:
         except KeyboardInterrupt:
             pass
         finally:
-            # Cleanup
+            # Cleanup; the core finishes queued clips and closes the store
             keyboard.unhook_all()
+            self.core.shutdown()
 
 def main():
     app = VoiceMemoApp()
@@ -0,0 +1,839 @@
+# Voice memo core
+# Everything the app does apart from drawing the window: capture,
+# recognition, commands, storage and the subsystems behind them, driven by an
+# asyncio event loop. Each clip moves through explicit stages
+#
+#   capture -> recognize -> command -> archive -> persist -> publish
+#
+# Blocking work (microphone reads, recognition, command handlers, disk
+# writes) runs in executors so the loop never stalls, several clips can be
+# recognized at once, and notes are still committed in capture order.
+#
+# Front ends subscribe to events rather than reaching into the pipeline, so
+# the Tk window, a headless process and the benchmark all drive the same
+# core. Callbacks run on the loop thread as callback(event, data):
+#
+#   notes_loaded       {}
+#   ready              {"error": why the microphone is unavailable, or None}
+#   recording_started  {}
+#   recording_stopped  {}
+#   partial            {"text": partial transcript while recording}
+#   note_added         {"note", "command": command result or None, "spooled",
+#                       "spool_pending": clips still spooled, for spooled notes}
+#   command_finished   {"result"} for a command that outlived command_wait_seconds
+#   hands_free         {"enabled"} when hands-free listening is switched on or off
+#   notes_cleared      {}
+#   status             {"message"}
+#
+# The recording, hands-free, submit and clear methods are safe to call from
+# any thread.
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+from lazy_import import lazy_import
+from audio_archive import AudioArchive
+from command_executor import CommandExecutor
+from metrics import LatencyTracker, StartupTimer
+from notes_store import create_notes_store
+from recognition_engines import get_engine
+from recognition_spool import RecognitionSpool
+from streaming import StreamingTranscription
+from voice_commands import VoiceCommandManager
+
+sr = lazy_import("speech_recognition")
+audio_capture = lazy_import("audio_capture")
+noise_floor = lazy_import("noise_floor")
+audio_preprocess = lazy_import("audio_preprocess")
+hands_free = lazy_import("hands_free")
+
+FAST_LANE = 0
+NORMAL_LANE = 1
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Silence that ends a hotkey recording; the noise tracker may shorten it
+PAUSE_THRESHOLD = 1.5
+
+# A captured clip. recognize() returns (text, result of a command that
+# already ran or None); get_audio() returns the clip's AudioData for the
+# spool and archive, and may itself be None.
+Clip = namedtuple("Clip", "recognize get_audio timestamp duration")
+
+# What became of a clip: the saved note (None if nothing was saved), the
+# command it ran, and a status message when it did not become a note
+Outcome = namedtuple("Outcome", "note command message")
+
+
+def command_status(result):
+    if result["success"] is None:
+        return "RUNNING"
+    return "EXECUTED" if result["success"] else "FAILED"
+
+
+def command_note_text(text, result):
+    """Note text for a transcript that ran commands
+
+    "[COMMAND EXECUTED] next song" for one command; for a compound
+    utterance, each step and its outcome followed by any dictation:
+    "[COMMANDS: next song EXECUTED, volume up RUNNING] call mom".
+    """
+    if "steps" not in result:
+        return f"[COMMAND {command_status(result)}] {text}"
+    steps = ", ".join(f"{step['text']} {command_status(step)}" for step in result["steps"])
+    return f"[COMMANDS: {steps}] {result['dictation']}".rstrip()
+
+
+def now_timestamp():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+class VoiceMemoCore:
+    def __init__(self, settings, metrics=None, startup=None, notes_store=None,
+                 engine=None, command_manager=None, use_microphone=True):
+        # Stores, engines and command managers passed in are used as they
+        # are; anything else is created from settings by start()
+        self.settings = settings
+        self.metrics = metrics or LatencyTracker()
+        self.startup = startup or StartupTimer()
+        self.use_microphone = use_microphone
+
+        self.notes_store = notes_store or create_notes_store(settings)
+        self.search_index = self.notes_store.create_search_index()
+        self.notes = []
+
+        self.recognizer = None
+        self.engine = engine
+        self.keyword_spotter = None
+        self.command_manager = command_manager
+        self.command_executor = None
+        self.command_phrases = set()
+        self.microphone = None
+        self.noise_tracker = None
+        self.hands_free = None
+        self.archive = None
+        self.ready = False
+
+        # Clips the engine could not be reached for, retried in the background
+        self.spool = RecognitionSpool(lambda audio: self.engine.recognize(audio), self._commit_spooled,
+                                      directory=settings['spool_directory'],
+                                      concurrency=settings['spool_concurrency'],
+                                      max_delay=settings['spool_max_delay'])
+
+        self.is_recording = False
+        self.trigger_time = None
+        self._capture_task = None
+
+        self.loop = None
+        self._thread = None
+        self._subscribers = []
+        self._stopped = None
+        self._queue = None
+        self._workers = []
+        self._sequence = itertools.count()
+
+        # Results waiting for earlier clips before they can be committed
+        self._commit_lock = None
+        self._next_commit = 0
+        self._finished = {}
+
+        workers = max(1, settings['transcription_workers'])
+        self._capture_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="capture")
+        self._recognition_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recognize")
+        # A single writer keeps the store and the search index in step
+        self._persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persist")
+
+    # Events
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def emit(self, event, **data):
+        """Publish an event to subscribers on the loop thread"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self._publish, event, data)
+
+    def _publish(self, event, data):
+        for callback in list(self._subscribers):
+            try:
+                callback(event, data)
+            except Exception as e:
+                print(f"Error in {event} subscriber: {e}")
+
+    # Lifecycle
+    async def start(self, on_started=None):
+        """Start the pipeline and load everything; returns once ready
+
+        on_started is called once the loop is accepting calls, before the
+        slow part of startup (notes, imports, devices) has finished.
+        """
+        self.loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self._commit_lock = asyncio.Lock()
+        self._queue = asyncio.PriorityQueue(maxsize=self.settings['transcription_queue_size'])
+        self._workers = [self.loop.create_task(self._work())
+                         for _ in range(max(1, self.settings['transcription_workers']))]
+        if on_started is not None:
+            on_started()
+        await self.loop.run_in_executor(None, self._initialize)
+
+    async def serve(self, on_started=None):
+        """Run the core until stop() or shutdown()"""
+        try:
+            await self.start(on_started)
+            await self._stopped.wait()
+        finally:
+            await self.close()
+
+    async def stop(self):
+        self._stopped.set()
+
+    def start_in_thread(self):
+        """Run the core's event loop on its own thread (for the Tk window)"""
+        started = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.serve(on_started=started.set)),
+                                        name="memo-core", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def shutdown(self, timeout=15):
+        """Stop a core started with start_in_thread, finishing queued clips"""
+        if self.loop is None or self._thread is None:
+            return
+        self.loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join(timeout)
+
+    def _initialize(self):
+        """Load notes, imports and devices; runs on an executor thread"""
+        with self.startup.phase("load notes"):
+            try:
+                self.notes = self.notes_store.load()
+            except Exception as e:
+                print(f"Error loading notes: {e}")
+                self.notes = []
+        self.emit("notes_loaded")
+
+        with self.startup.phase("search index"):
+            self.search_index.load(self.notes)
+
+        if self.command_manager is None:
+            with self.startup.phase("command manager"):
+                self.command_manager = VoiceCommandManager(
+                    plugin_directory=self.settings['command_plugin_directory'])
+        self.command_phrases = set(self.command_manager.phrases)
+        # Commands run off the pipeline, each with its own timeout
+        self.command_executor = CommandExecutor(self.command_manager,
+                                                workers=self.settings['command_workers'],
+                                                timeout=self.settings['command_timeout'],
+                                                timeouts=self.settings['command_timeouts'])
+
+        if self.engine is None:
+            with self.startup.phase("import speech_recognition"):
+                sr.load()
+            with self.startup.phase("recognition engine"):
+                self._create_engines()
+
+        with self.startup.phase("offline spool"):
+            self.spool.load()
+
+        # Optional archive of the audio behind each note
+        if self.settings['audio_archive']:
+            with self.startup.phase("audio archive"):
+                try:
+                    self.archive = AudioArchive(self.settings['audio_archive_directory'],
+                                                segment_size=self.settings['audio_archive_segment_mb'] * 1024 * 1024,
+                                                sample_rate=self.settings['audio_archive_sample_rate']).open()
+                except Exception as e:
+                    print(f"Audio archive unavailable: {e}")
+
+        microphone_error = None
+        if self.use_microphone and self.recognizer is not None:
+            with self.startup.phase("microphone"):
+                try:
+                    # Kept open for the life of the app, see audio_capture
+                    self.microphone = audio_capture.MicrophoneCapture(
+                        sr.Microphone(), buffer_seconds=self.settings['capture_buffer_seconds'])
+                    self.microphone.start()
+                except Exception as e:
+                    self.microphone = None
+                    microphone_error = f"Microphone unavailable: {e}"
+                    print(microphone_error)
+
+        self.ready = True
+        self.startup.mark("ready")
+        print(self.startup.report())
+        self.emit("ready", error=microphone_error)
+
+        if self.microphone is not None:
+            self._calibrate_microphone()
+            if self.settings['hands_free']:
+                self.set_hands_free(True)
+        self._warm_up_engines()
+
+    def _create_engines(self):
+        self.recognizer = sr.Recognizer()
+
+        # Recognition engine selected in settings
+        self.engine = get_engine(self.recognizer, self.settings)
+
+        # Trim and resample clips before they reach the engine
+        if self.settings['preprocess_audio']:
+            try:
+                self.engine = audio_preprocess.PreprocessingEngine(
+                    self.engine, self.recognizer,
+                    sample_rate=self.settings['upload_sample_rate'],
+                    baseline_every=self.settings['preprocess_baseline_every'],
+                    metrics=self.metrics)
+            except ImportError as e:
+                print(f"Audio preprocessing unavailable: {e}")
+
+        # Optional local keyword spotter for early command detection
+        if self.settings['keyword_spotting']:
+            self.keyword_spotter = get_engine(self.recognizer, self.settings, name="vosk")
+
+    def _calibrate_microphone(self):
+        self.recognizer.pause_threshold = PAUSE_THRESHOLD
+
+        # Follow the noise floor for as long as the app runs
+        if self.settings['noise_tracking']:
+            try:
+                self.noise_tracker = noise_floor.NoiseFloorTracker(
+                    self.microphone, self.recognizer,
+                    ratio=self.settings['noise_threshold_ratio'],
+                    min_threshold=self.settings['min_energy_threshold'],
+                    metrics=self.metrics)
+            except ImportError as e:
+                print(f"Noise floor tracking unavailable ({e}), calibrating once instead")
+            else:
+                self.noise_tracker.start()
+                print("Tracking microphone noise floor")
+                return
+
+        # Otherwise calibrate for ambient noise once, in a separate thread
+        def calibrate():
+            try:
+                with self.microphone.source() as source:
+                    self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
+                print("Microphone calibrated for ambient noise")
+            except Exception as e:
+                print(f"Microphone calibration failed: {e}")
+
+        threading.Thread(target=calibrate, daemon=True).start()
+
+    def _warm_up_engines(self):
+        def warm_up():
+            for engine in (self.engine, self.keyword_spotter):
+                if engine is None or not hasattr(engine, "warm_up"):
+                    continue
+                try:
+                    engine.warm_up()
+                except Exception as e:
+                    print(f"Recognition engine {engine.name} warm-up failed: {e}")
+
+        threading.Thread(target=warm_up, daemon=True).start()
+
+    async def close(self):
+        """Finish queued clips, then stop devices and close the store"""
+        self.is_recording = False
+        try:
+            # Let clips that were already captured become notes
+            await asyncio.wait_for(self._queue.join(), timeout=10)
+        except asyncio.TimeoutError:
+            print(f"Shutting down with {self._queue.qsize()} clips still queued")
+        for worker in self._workers:
+            worker.cancel()
+
+        self.spool.stop()
+        if self.hands_free is not None:
+            self.hands_free.stop()
+        if self.noise_tracker is not None:
+            self.noise_tracker.stop()
+        if self.microphone is not None:
+            self.microphone.stop()
+        if self.command_executor is not None:
+            self.command_executor.shutdown()
+        for executor in (self._capture_executor, self._recognition_executor):
+            executor.shutdown(wait=False)
+
+        # Pending writes finish before the store is closed
+        await self.loop.run_in_executor(self._persist_executor, self._close_storage)
+        self._persist_executor.shutdown(wait=False)
+
+    def _close_storage(self):
+        self.notes_store.close()
+        self.search_index.save()
+        if self.archive is not None:
+            self.archive.close()
+
+    # Recording (thread-safe entry points)
+    def toggle_recording(self, trigger_time=None):
+        self.loop.call_soon_threadsafe(self._toggle_recording, trigger_time)
+
+    def start_recording(self, trigger_time=None):
+        self.loop.call_soon_threadsafe(self._start_recording, trigger_time)
+
+    def stop_recording(self):
+        self.loop.call_soon_threadsafe(self._stop_recording)
+
+    def _toggle_recording(self, trigger_time):
+        if self.is_recording:
+            self._stop_recording()
+        else:
+            self._start_recording(trigger_time)
+
+    def _start_recording(self, trigger_time=None):
+        if self.is_recording:
+            return
+
+        if not self.ready or self.microphone is None:
+            self.emit("status", message="Still starting up..." if not self.ready else "No microphone available")
+            return
+
+        # One capture at a time; wait for the last one to end
+        if self._capture_task is not None and not self._capture_task.done():
+            self.emit("status", message="Still finishing the previous capture...")
+            return
+
+        self.is_recording = True
+        self.trigger_time = trigger_time or time.perf_counter()
+        self.emit("recording_started")
+        self._capture_task = self.loop.create_task(self._record(now_timestamp()))
+
+    def _stop_recording(self):
+        if not self.is_recording:
+            return
+        self.is_recording = False
+        self.emit("recording_stopped")
+
+    # Hands-free listening (thread-safe entry point)
+    def set_hands_free(self, enabled):
+        self.loop.call_soon_threadsafe(self._set_hands_free, enabled)
+
+    def _set_hands_free(self, enabled):
+        if enabled and (not self.ready or self.microphone is None):
+            self.emit("status", message="Still starting up..." if not self.ready else "No microphone available")
+            enabled = False
+        elif enabled:
+            if self.hands_free is None:
+                try:
+                    self.hands_free = hands_free.HandsFreeListener(
+                        self.microphone, lambda: self.recognizer.energy_threshold, self._hands_free_utterance,
+                        busy=lambda: self.is_recording,
+                        on_status=lambda message: self.emit("status", message=message),
+                        end_silence=self.settings['hands_free_end_silence'],
+                        min_speech=self.settings['hands_free_min_speech'],
+                        max_utterance=self.settings['hands_free_max_utterance'],
+                        preroll=self.settings['preroll_seconds'],
+                        cpu_seconds_per_hour=self.settings['hands_free_cpu_seconds_per_hour'],
+                        recognitions_per_hour=self.settings['hands_free_recognitions_per_hour'])
+                except ImportError as e:
+                    self.emit("status", message=f"Hands-free listening unavailable: {e}")
+                    enabled = False
+            if enabled:
+                self.hands_free.start()
+                print("Hands-free listening started")
+        elif self.hands_free is not None:
+            self.hands_free.stop()
+            print("Hands-free listening stopped")
+        self.emit("hands_free", enabled=enabled)
+
+    def _hands_free_utterance(self, audio, started_at):
+        """Called on the listener thread for each utterance it cuts"""
+        timestamp = datetime.fromtimestamp(started_at).strftime(TIMESTAMP_FORMAT)
+        self.metrics.record("capture", len(audio.frame_data) / (audio.sample_rate * audio.sample_width))
+        self.submit_threadsafe(self.clip_from_audio(audio, timestamp))
+
+    # Capture stage
+    async def _record(self, timestamp):
+        """Capture one clip and queue it for recognition"""
+        try:
+            clip = await self.loop.run_in_executor(self._capture_executor, self._capture, timestamp)
+        except Exception as e:
+            self._stop_recording()
+            self.emit("status", message=f"Recording error: {e}")
+            return
+
+        self._stop_recording()
+        if clip is None:
+            return
+
+        if self._queue.full():
+            self.emit("status", message="Transcription queue full, waiting...")
+        await self.submit(clip)
+
+    def _capture(self, timestamp):
+        """Runs on the capture thread; returns a Clip or None"""
+        if self.settings['streaming']:
+            return self._capture_streaming(timestamp)
+        return self._capture_clip(timestamp)
+
+    def _set_pause(self, longest):
+        """Pause settings for the next listen(), adapted to the room if tracked"""
+        if self.noise_tracker is not None:
+            pause, non_speaking = self.noise_tracker.pause_settings(longest)
+        else:
+            pause, non_speaking = longest, min(0.5, longest)
+        self.recognizer.pause_threshold = pause
+        self.recognizer.non_speaking_duration = non_speaking
+
+    def _capture_clip(self, timestamp):
+        """Record a whole utterance"""
+        self._set_pause(PAUSE_THRESHOLD)
+        try:
+            with self.microphone.source(self.settings['preroll_seconds']) as source:
+                self._capture_started()
+                with self.metrics.time("capture"):
+                    audio = self.recognizer.listen(source, timeout=2, phrase_time_limit=60)
+        except sr.WaitTimeoutError:
+            return None
+        return self.clip_from_audio(audio, timestamp)
+
+    def _capture_streaming(self, timestamp):
+        """Record segment by segment, transcribing each one as it is captured"""
+        session = self.streaming_session(on_partial=lambda text: self.emit("partial", text=text))
+
+        # Segments end at short pauses; a longer silence ends the utterance
+        self._set_pause(self.settings['stream_segment_pause'])
+        try:
+            with self.microphone.source(self.settings['preroll_seconds']) as source:
+                self._capture_started()
+                capture_start = time.perf_counter()
+                while self.is_recording:
+                    timeout = self.settings['stream_end_silence'] if session.segment_count else 2
+                    try:
+                        audio = self.recognizer.listen(source, timeout=timeout,
+                                                       phrase_time_limit=self.settings['stream_segment_limit'])
+                    except sr.WaitTimeoutError:
+                        break
+                    session.add_segment(audio)
+        except Exception as e:
+            # Keep whatever was captured before the error
+            if not session.segment_count:
+                raise
+            print(f"Recording error, keeping {session.segment_count} segments: {e}")
+        else:
+            self.metrics.record("capture", time.perf_counter() - capture_start)
+
+        if not session.segment_count:
+            return None
+
+        return self.clip_from_session(session, timestamp)
+
+    def _capture_started(self):
+        """Record how long it took from the hotkey to the start of capture"""
+        if self.trigger_time is not None:
+            self.metrics.record("hotkey_to_capture", time.perf_counter() - self.trigger_time)
+            self.trigger_time = None
+
+    def clip_from_audio(self, audio, timestamp=None):
+        """Clip for recorded audio; a short clip may be spotted as a command"""
+        timestamp = timestamp or now_timestamp()
+        duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+
+        # A short clip may be a command we can spot without the full recognizer
+        if duration <= self.settings['fast_lane_seconds']:
+            command_result = self.detect_command_early(audio, None)
+            if command_result is not None:
+                return Clip(lambda: (command_result["text"], command_result), None, timestamp, duration)
+
+        return Clip(lambda: (self.engine.recognize(audio), None), lambda: audio, timestamp, duration)
+
+    def streaming_session(self, on_partial=None):
+        """StreamingTranscription wired to the engine and early commands"""
+        return StreamingTranscription(self.engine.recognize, on_partial=on_partial,
+                                      detect_command=self.detect_command_early)
+
+    @staticmethod
+    def clip_from_session(session, timestamp=None):
+        """Clip for a streaming session whose last segment has been added"""
+        return Clip(session.finish, session.audio, timestamp or now_timestamp(), session.duration)
+
+    def detect_command_early(self, audio, text):
+        """Run a command straight away if audio or text is clearly one
+
+        With text None, only the keyword spotter is tried. Returns the
+        command result (with the matched text) or None.
+        """
+        if text is None:
+            if self.keyword_spotter is None:
+                return None
+            try:
+                text = self.keyword_spotter.spot(audio, self.command_phrases)
+            except Exception as e:
+                print(f"Keyword spotting failed: {e}")
+                return None
+            if not text:
+                return None
+
+        match = self.command_manager.match_command(text)
+        if match is None or match.confidence < self.settings['early_command_confidence']:
+            return None
+
+        run = self._start_command(match)
+        try:
+            result = run.future.result(timeout=self.settings['command_wait_seconds'])
+        except FutureTimeout:
+            result = None
+        result = dict(self._command_result(run, result), text=text)
+        print(f"Early command: {match.phrase} ({match.confidence:.2f})")
+        return result
+
+    # Queue
+    async def submit(self, clip):
+        """Queue a clip, waiting while the queue is full (backpressure)
+
+        Returns a future for the clip's Outcome.
+        """
+        lane = FAST_LANE if clip.duration <= self.settings['fast_lane_seconds'] else NORMAL_LANE
+        done = self.loop.create_future()
+        sequence = next(self._sequence)
+        try:
+            await self._queue.put((lane, sequence, clip, done))
+        except asyncio.CancelledError:
+            # Cancelled while the queue was full (e.g. a daemon client went
+            # away): the number is taken, so commit past it or every later
+            # clip would wait for it forever
+            self.loop.create_task(self._finish(sequence, Outcome(None, None, None), done))
+            raise
+        return done
+
+    def submit_threadsafe(self, clip):
+        """submit() from another thread; returns a concurrent future for the Outcome"""
+        async def submit_and_wait():
+            return await (await self.submit(clip))
+        return asyncio.run_coroutine_threadsafe(submit_and_wait(), self.loop)
+
+    async def _work(self):
+        while True:
+            _, sequence, clip, done = await self._queue.get()
+            try:
+                result = await self._process(clip)
+            except Exception as e:
+                print(f"Error processing clip {sequence}: {e}")
+                result = Outcome(None, None, f"Error processing clip: {e}")
+            try:
+                await self._finish(sequence, result, done)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, clip):
+        """Recognize, command and archive stages; returns an Outcome"""
+        # Recognize
+        started = time.perf_counter()
+        try:
+            text, command_result = await self.loop.run_in_executor(self._recognition_executor, clip.recognize)
+        except sr.UnknownValueError:
+            return Outcome(None, None, "Could not understand audio")
+        except sr.RequestError as e:
+            message = await self.loop.run_in_executor(None, self._spool_clip, clip, e)
+            return Outcome(None, None, message)
+        finally:
+            self.metrics.record("recognition", time.perf_counter() - started)
+
+        self.spool.engine_reachable()
+
+        # Command
+        if command_result is None:
+            command_result = await self.run_command(text)
+        elif command_result.get("remainder"):
+            command_result = await self._run_remainder(command_result)
+
+        # Archive
+        clip_id = await self.loop.run_in_executor(None, self._archive_clip, clip.get_audio)
+
+        # Note, stamped with the capture time
+        if command_result["executed"]:
+            note = {"timestamp": clip.timestamp, "text": command_note_text(text, command_result)}
+            command_result = dict(command_result, text=command_result.get("text", text))
+        else:
+            note = {"timestamp": clip.timestamp, "text": text}
+            command_result = None
+        if clip_id is not None:
+            note["clip_id"] = clip_id
+        return Outcome(note, command_result, None)
+
+    async def _finish(self, sequence, result, done):
+        """Record a result and commit every result that is now in order"""
+        self._finished[sequence] = (result, done)
+        async with self._commit_lock:
+            while self._next_commit in self._finished:
+                outcome, done = self._finished.pop(self._next_commit)
+                self._next_commit += 1
+                if outcome.note is not None:
+                    if not await self._persist(outcome.note, outcome.command):
+                        outcome = Outcome(None, outcome.command, "Error saving note")
+                elif outcome.message:
+                    self.emit("status", message=outcome.message)
+                if not done.done():
+                    done.set_result(outcome)
+
+    async def run_command(self, text):
+        """Run the command or commands in text, if any; returns the command result
+
+        Waits at most command_wait_seconds. A command still running after
+        that is reported with success None and "pending", and publishes
+        command_finished when it is done. A compound utterance ("next song
+        and volume up") runs its commands in order and returns a combined
+        result with one entry per step in "steps".
+        """
+        steps = self.command_manager.parse_utterance(text.strip())
+        commands = [step for step in steps if step.match is not None]
+        if not commands:
+            return {"executed": False, "success": False}
+
+        runs = self._start_commands([step.match for step in commands])
+        await asyncio.wait([asyncio.wrap_future(run.future) for run in runs],
+                           timeout=self.settings['command_wait_seconds'])
+        results = [self._command_result(run, run.future.result() if run.future.done() else None)
+                   for run in runs]
+        if len(steps) == 1:
+            return results[0]
+        return self._combined_result([dict(result, text=step.text) for step, result in zip(commands, results)],
+                                     " ".join(step.text for step in steps if step.match is None))
+
+    async def _run_remainder(self, first):
+        """Run what followed a command that ran early from the first streamed segment"""
+        first = dict(first)
+        remainder = first.pop("remainder")
+        rest = await self.run_command(remainder)
+        if "steps" in rest:
+            results, dictation = rest["steps"], rest["dictation"]
+        elif rest["executed"]:
+            results, dictation = [dict(rest, text=rest["phrase"])], ""
+        else:
+            results, dictation = [], remainder
+        return self._combined_result([first] + results, dictation)
+
+    def _start_command(self, match):
+        return self._start_commands([match])[0]
+
+    def _start_commands(self, matches):
+        runs = self.command_executor.submit_batch(matches)
+        for run in runs:
+            run.future.add_done_callback(
+                lambda future, run=run: self.metrics.record("command", time.perf_counter() - run.started))
+        return runs
+
+    @staticmethod
+    def _combined_result(results, dictation):
+        """One result for the commands of a compound utterance and its dictation"""
+        if any(result["success"] is None for result in results):
+            success = None
+        else:
+            success = all(result["success"] for result in results)
+        combined = {"executed": True, "success": success,
+                    "phrase": ", ".join(result["phrase"] for result in results),
+                    "confidence": min(result["confidence"] for result in results),
+                    "steps": results,
+                    "dictation": dictation}
+        if success is None:
+            combined["pending"] = True
+        return combined
+
+    def _command_result(self, run, result):
+        """result, or a pending result if the command has not finished yet"""
+        if result is not None:
+            return result
+        run.future.add_done_callback(lambda future: self.emit("command_finished", result=future.result()))
+        return {"executed": True, "success": None, "pending": True,
+                "phrase": run.match.phrase, "confidence": run.match.confidence}
+
+    # Persist stage
+    async def _persist(self, note, command_result=None, spooled=False, spool_pending=0):
+        """Save a note and publish it; returns whether it was saved"""
+        try:
+            await self.loop.run_in_executor(self._persist_executor, self._save_note, note)
+        except Exception as e:
+            print(f"Error saving notes: {e}")
+            self.emit("status", message=f"Error saving note: {e}")
+            return False
+        self.emit("note_added", note=note, command=command_result, spooled=spooled,
+                  spool_pending=spool_pending)
+        return True
+
+    def _save_note(self, note):
+        # The store adds the note to self.notes as well
+        with self.metrics.time("save_notes"):
+            self.notes_store.append(note)
+        self.search_index.add(note)
+
+    def _archive_clip(self, get_audio):
+        """Add a clip to the audio archive; returns its clip ID or None"""
+        if self.archive is None or get_audio is None:
+            return None
+        try:
+            audio = get_audio()
+            return self.archive.add(audio) if audio is not None else None
+        except Exception as e:
+            print(f"Error archiving clip: {e}")
+            return None
+
+    def _spool_clip(self, clip, error):
+        """Keep a clip the engine failed on for a later retry; returns status text"""
+        audio = clip.get_audio() if clip.get_audio else None
+        if audio is None:
+            return f"Speech recognition error: {error}"
+        try:
+            self.spool.add(audio, clip.timestamp)
+        except Exception as e:
+            print(f"Error spooling clip: {e}")
+            return f"Speech recognition error: {error}"
+        return f"Speech recognition error: {error}. Clip saved, will retry ({self.spool.pending()} waiting)"
+
+    def _commit_spooled(self, note, audio, pending):
+        """Save a note recognized from the offline spool
+
+        Called on a spool thread. Waits until the note is stored, so the
+        spool only deletes the clip once it is safe. There is no timeout:
+        giving up while the save is still running would leave the clip
+        spooled after its note was written, and the retry would save it twice.
+        """
+        clip_id = self._archive_clip(lambda: audio)
+        if clip_id is not None:
+            note["clip_id"] = clip_id
+
+        persist = self._persist(note, spooled=True, spool_pending=pending)
+        if not asyncio.run_coroutine_threadsafe(persist, self.loop).result():
+            raise RuntimeError("the note could not be saved")
+
+    # Notes
+    def search(self, query, limit=500):
+        """Numbers of the notes matching query, newest first"""
+        if not self.ready:
+            return []
+        return self.search_index.search(query, self.notes, limit)
+
+    async def clear_notes(self):
+        await self.loop.run_in_executor(self._persist_executor, self._clear_notes)
+        self.emit("notes_cleared")
+
+    def clear_notes_threadsafe(self):
+        return asyncio.run_coroutine_threadsafe(self.clear_notes(), self.loop)
+
+    def _clear_notes(self):
+        # The store empties self.notes in place
+        try:
+            self.notes_store.clear()
+        except Exception as e:
+            print(f"Error clearing notes: {e}")
+        self.search_index.clear()
+
+    def status_lines(self):
+        """One line per subsystem that reports its own status"""
+        apps = getattr(self.command_manager, "apps", None)
+        parts = (self.noise_tracker, self.hands_free, self.engine, self.spool, self.command_manager, apps)
+        lines = [part.status() for part in parts
+                 if hasattr(part, "status")]
+        if self._queue is not None:
+            lines.append(f"Transcription queue: {self._queue.qsize()} clips waiting")
+        return lines
@@ -0,0 +1,488 @@
+# Headless daemon
+# Runs the voice memo core without the window, for machines with no display,
+# and serves a local API on a Unix domain socket (loopback TCP where Unix
+# sockets are not available). Requests and responses are JSON objects, one
+# per line, and every response carries the id of its request:
+#
+#   {"id": 1, "op": "submit", "audio": "<base64 WAV or FLAC>"}
+#       -> {"id": 1, "note": {...}, "command": {...} or null, "message": ...}
+#       A long recording can be sent as several parts with the same id and
+#       "more": true on all but the last. Each part is recognized as it
+#       arrives and {"id": 1, "partial": "..."} lines stream back before
+#       the final response.
+#   {"id": 2, "op": "command", "text": "volume up"}  -> {"id": 2, "result": {...}}
+#   {"id": 3, "op": "notes", "query": "dentist", "limit": 20}  -> {"id": 3, "notes": [...]}
+#       Newest first; without a query, the latest notes.
+#   {"id": 4, "op": "record", "action": "toggle"}  (start, stop; needs a microphone)
+#   {"id": 5, "op": "listen", "enabled": true}  hands-free listening on the microphone
+#   {"id": 6, "op": "subscribe"}  core events follow as {"event": "note_added", ...}
+#   {"id": 7, "op": "status"}     subsystems, clients and per-request latency
+#
+# The Unix socket is only accessible to the user running the daemon. Loopback
+# TCP is open to every local user and to web pages in a browser, so there the
+# daemon writes a fresh random token to daemon_token_file, readable only by
+# that user, and the first line of a connection must present it:
+#
+#   {"id": 0, "op": "auth", "token": "<contents of the token file>"}  -> {"id": 0, "authenticated": true}
+#
+# A client can send it over the Unix socket too, where it is not checked. The
+# connection is closed at the first line that is not a JSON object (an HTTP
+# request line, for one) or, over TCP, whose first line has the wrong token.
+#
+# Flow control is per client. Each connection has a bounded send queue and a
+# cap on requests in flight; a client that stops reading its responses stops
+# being read from, without holding up anyone else. Partials and events are
+# dropped rather than queued for a client that has fallen behind, and the
+# next event it does get says how many it missed.
+#
+#   python memo_daemon.py
+#   python memo_daemon.py --socket /tmp/voice_memo.sock --no-microphone
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import hmac
+import io
+import json
+import os
+import secrets
+import signal
+import socket
+import time
+from collections import Counter
+
+import settings as app_settings
+from audio_archive import decode_flac
+from lazy_import import lazy_import
+from memo_core import VoiceMemoCore, now_timestamp
+
+sr = lazy_import("speech_recognition")
+
+
+def decode_audio(data):
+    """WAV, AIFF or FLAC file bytes -> sr.AudioData (mixed down to mono)"""
+    if data[:4] == b"fLaC":
+        # AudioFile can't probe FLAC in memory, see audio_archive
+        data = decode_flac(data)
+    with sr.AudioFile(io.BytesIO(data)) as source:
+        return sr.Recognizer().record(source)
+
+
+class ClientConnection:
+    def __init__(self, daemon, reader, writer, name):
+        self.daemon = daemon
+        self.reader = reader
+        self.writer = writer
+        self.name = name
+
+        self._outgoing = asyncio.Queue(maxsize=daemon.send_queue_size)
+        self._inflight = asyncio.Semaphore(daemon.max_inflight)
+        self._tasks = set()
+        # Streaming submissions by request id: (StreamingTranscription, timestamp)
+        self.sessions = {}
+        # request id -> [lock, users]; parts of a streamed submission run one
+        # at a time, in the order they arrived
+        self._part_locks = {}
+        self.subscribed = False
+        self.dropped = 0
+        # Without a token (the Unix socket) there is nothing to present
+        self.authenticated = daemon.token is None
+
+    async def run(self):
+        sender = asyncio.ensure_future(self._send_loop())
+        try:
+            while True:
+                try:
+                    line = await self.reader.readline()
+                except ValueError:
+                    # Longer than daemon_max_message_mb
+                    await self.send({"error": "message too large"})
+                    break
+                if not line:
+                    break
+
+                request = self._parse(line)
+                if request is None:
+                    # Not a client of ours, e.g. a browser sending HTTP
+                    self.daemon.errors["invalid"] += 1
+                    await self.send({"error": "expected a JSON object"})
+                    break
+                if not self.authenticated:
+                    if not self.daemon.check_token(request):
+                        self.daemon.errors["unauthenticated"] += 1
+                        await self.send({"id": request.get("id"), "error": "authentication required"})
+                        break
+                    self.authenticated = True
+                    await self.send({"id": request.get("id"), "authenticated": True})
+                    continue
+
+                # With max_inflight requests running, stop reading from this client
+                await self._inflight.acquire()
+                task = asyncio.ensure_future(self._handle(request))
+                self._tasks.add(task)
+                task.add_done_callback(self._request_done)
+        except ConnectionError:
+            pass
+        finally:
+            for task in list(self._tasks):
+                task.cancel()
+            for session, _ in self.sessions.values():
+                session.executor.shutdown(wait=False, cancel_futures=True)
+            self.sessions.clear()
+            await self._outgoing.put(None)
+            await asyncio.gather(sender, return_exceptions=True)
+            self.writer.close()
+
+    @contextlib.asynccontextmanager
+    async def in_order(self, request_id):
+        """Hold the lock for request_id; waiters get it in arrival order
+
+        Must be entered before the request's first await, so that request
+        tasks, which start in the order their lines were read, queue up in
+        that order.
+        """
+        entry = self._part_locks.setdefault(request_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._part_locks[request_id]
+
+    def _request_done(self, task):
+        self._tasks.discard(task)
+        self._inflight.release()
+
+    @staticmethod
+    def _parse(line):
+        """The JSON object on line, or None"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return None
+        return request if isinstance(request, dict) else None
+
+    async def _handle(self, request):
+        started = time.perf_counter()
+        op = request.get("op")
+        handler = self.daemon.handlers.get(op)
+        if handler is None:
+            self.daemon.errors["invalid"] += 1
+            await self.send({"id": request.get("id"), "error": f"unknown op: {op}"})
+            return
+
+        try:
+            response = await handler(self, request)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.daemon.errors[op] += 1
+            response = {"error": str(e) or type(e).__name__}
+
+        self.daemon.record_request(op, time.perf_counter() - started)
+        if response is not None:
+            response["id"] = request.get("id")
+            await self.send(response)
+
+    # Sending
+    async def send(self, message):
+        """Queue a response, waiting while this client is behind"""
+        await self._outgoing.put(message)
+
+    def send_nowait(self, message):
+        """Queue a partial or event; dropped if this client is behind"""
+        if self.dropped:
+            message = dict(message, dropped=self.dropped)
+        try:
+            self._outgoing.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.daemon.dropped += 1
+        else:
+            self.dropped = 0
+
+    async def _send_loop(self):
+        while True:
+            message = await self._outgoing.get()
+            if message is None:
+                return
+            self.writer.write(json.dumps(message).encode() + b"\n")
+            # Waits while the socket buffer is full
+            await self.writer.drain()
+
+
+class MemoDaemon:
+    def __init__(self, settings, socket_path=None, use_microphone=True):
+        self.settings = settings
+        self.socket_path = socket_path or settings['daemon_socket']
+        self.port = settings['daemon_port']
+        self.token_path = os.path.expanduser(settings['daemon_token_file'])
+        self.token = None
+        self.max_clients = settings['daemon_max_clients']
+        self.send_queue_size = settings['daemon_send_queue']
+        self.max_inflight = settings['daemon_max_inflight']
+        self.message_limit = int(settings['daemon_max_message_mb'] * 1024 * 1024)
+
+        self.core = VoiceMemoCore(settings, use_microphone=use_microphone)
+        self.core.subscribe(self.on_core_event)
+
+        self.handlers = {
+            "auth": self.op_auth,
+            "submit": self.op_submit,
+            "command": self.op_command,
+            "notes": self.op_notes,
+            "record": self.op_record,
+            "listen": self.op_listen,
+            "subscribe": self.op_subscribe,
+            "status": self.op_status,
+        }
+        self.clients = set()
+        self._client_numbers = 0
+        self.requests = Counter()
+        self.errors = Counter()
+        self.dropped = 0
+        self.server = None
+        self._unix_socket = False
+
+    # Serving
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        core = asyncio.ensure_future(self.core.serve())
+        # Let the core set up its loop and queue before clients arrive
+        await asyncio.sleep(0)
+
+        try:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, lambda: asyncio.ensure_future(self.core.stop()))
+        except (NotImplementedError, AttributeError):
+            # Windows: Ctrl+C raises KeyboardInterrupt instead
+            pass
+
+        try:
+            await self._listen()
+            await core
+        finally:
+            await self._close()
+
+    async def _listen(self):
+        self._unix_socket = hasattr(socket, "AF_UNIX") and hasattr(asyncio, "start_unix_server")
+        if self._unix_socket:
+            self._remove_stale_socket()
+            # Local tools of the same user only. The umask makes the socket
+            # private from the moment it is bound, not just after the chmod
+            previous_umask = os.umask(0o077)
+            try:
+                self.server = await asyncio.start_unix_server(self._accept, path=self.socket_path,
+                                                              limit=self.message_limit)
+            finally:
+                os.umask(previous_umask)
+            os.chmod(self.socket_path, 0o600)
+            print(f"Listening on {self.socket_path}")
+        else:
+            self.token = self._write_token()
+            self.server = await asyncio.start_server(self._accept, "127.0.0.1", self.port,
+                                                     limit=self.message_limit)
+            self.port = self.server.sockets[0].getsockname()[1]
+            print(f"Unix sockets unavailable, listening on 127.0.0.1:{self.port} "
+                  f"(token in {self.token_path})")
+
+    def _write_token(self):
+        """A fresh token, in a file only this user can read
+
+        Created rather than overwritten, so an existing file's permissions
+        are not inherited. On Windows the mode bits do little, but the
+        default daemon_token_file is in the user's profile, which other users can't
+        read.
+        """
+        token = secrets.token_hex(32)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.token_path)
+        previous_umask = os.umask(0o077)
+        try:
+            fd = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        finally:
+            os.umask(previous_umask)
+        with os.fdopen(fd, "w") as f:
+            f.write(token)
+        return token
+
+    def check_token(self, request):
+        """Whether request is an auth request with the right token"""
+        token = request.get("token")
+        return (request.get("op") == "auth" and isinstance(token, str)
+                and hmac.compare_digest(token.encode(), self.token.encode()))
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except OSError:
+            # Left behind by a daemon that did not shut down cleanly
+            os.remove(self.socket_path)
+        else:
+            raise SystemExit(f"Another daemon is already listening on {self.socket_path}")
+        finally:
+            probe.close()
+
+    async def _close(self):
+        if self.server is None:
+            return
+        self.server.close()
+        for client in list(self.clients):
+            client.writer.close()
+        await self.server.wait_closed()
+        if self._unix_socket and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        if self.token is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.token_path)
+
+    async def _accept(self, reader, writer):
+        self._client_numbers += 1
+        client = ClientConnection(self, reader, writer, f"client-{self._client_numbers}")
+        if len(self.clients) >= self.max_clients:
+            writer.write(json.dumps({"error": "too many clients"}).encode() + b"\n")
+            await writer.drain()
+            writer.close()
+            return
+
+        self.clients.add(client)
+        try:
+            await client.run()
+        finally:
+            self.clients.discard(client)
+
+    def record_request(self, op, seconds):
+        self.requests[op] += 1
+        self.core.metrics.record(f"ipc_{op}", seconds)
+
+    def on_core_event(self, event, data):
+        """Forward core events to subscribed clients (on the loop thread)"""
+        message = dict(data, event=event)
+        for client in self.clients:
+            if client.subscribed:
+                client.send_nowait(message)
+
+    # Requests
+    def _require_ready(self):
+        if not self.core.ready:
+            raise RuntimeError("still starting up")
+
+    async def op_auth(self, client, request):
+        # Only reached once authenticated: by the token over TCP, or by the
+        # socket's permissions over the Unix socket
+        return {"authenticated": True}
+
+    async def op_submit(self, client, request):
+        self._require_ready()
+        request_id = request.get("id")
+        async with client.in_order(request_id):
+            return await self._submit_part(client, request, request_id)
+
+    async def _submit_part(self, client, request, request_id):
+        loop = asyncio.get_running_loop()
+        audio = await loop.run_in_executor(None, decode_audio, base64.b64decode(request["audio"]))
+        more = request.get("more", False)
+
+        if request_id not in client.sessions:
+            if not more:
+                # A whole clip; short ones may be spotted as commands first
+                clip = await loop.run_in_executor(None, self.core.clip_from_audio, audio)
+                return await self._submit(clip)
+
+            def on_partial(text):
+                loop.call_soon_threadsafe(client.send_nowait, {"id": request_id, "partial": text})
+
+            client.sessions[request_id] = (self.core.streaming_session(on_partial), now_timestamp())
+
+        session, timestamp = client.sessions[request_id]
+        session.add_segment(audio)
+        if more:
+            return None
+
+        del client.sessions[request_id]
+        return await self._submit(self.core.clip_from_session(session, timestamp))
+
+    async def _submit(self, clip):
+        outcome = await (await self.core.submit(clip))
+        return {"note": outcome.note, "command": outcome.command, "message": outcome.message}
+
+    async def op_command(self, client, request):
+        self._require_ready()
+        return {"result": await self.core.run_command(request["text"])}
+
+    async def op_notes(self, client, request):
+        self._require_ready()
+        limit = max(1, min(int(request.get("limit", 50)), 500))
+        query = (request.get("query") or "").strip()
+        notes = self.core.notes
+
+        def fetch():
+            if not query:
+                return list(reversed(notes[-limit:]))
+            return [notes[number] for number in self.core.search(query, limit)]
+
+        return {"notes": await asyncio.get_running_loop().run_in_executor(None, fetch)}
+
+    async def op_record(self, client, request):
+        self._require_ready()
+        if self.core.microphone is None:
+            raise RuntimeError("no microphone available")
+        action = request.get("action", "toggle")
+        if action == "start":
+            self.core.start_recording()
+        elif action == "stop":
+            self.core.stop_recording()
+        elif action == "toggle":
+            self.core.toggle_recording()
+        else:
+            raise ValueError(f"unknown record action: {action}")
+        return {"accepted": True}
+
+    async def op_listen(self, client, request):
+        self._require_ready()
+        if self.core.microphone is None:
+            raise RuntimeError("no microphone available")
+        self.core.set_hands_free(bool(request.get("enabled", True)))
+        return {"accepted": True}
+
+    async def op_subscribe(self, client, request):
+        client.subscribed = request.get("events", True)
+        return {"subscribed": bool(client.subscribed)}
+
+    async def op_status(self, client, request):
+        latency = {stage[len("ipc_"):]: summary for stage, summary in self.core.metrics.summary().items()
+                   if stage.startswith("ipc_")}
+        return {
+            "ready": self.core.ready,
+            "status": self.core.status_lines(),
+            "clients": len(self.clients),
+            "requests": dict(self.requests),
+            "errors": dict(self.errors),
+            "dropped_messages": self.dropped,
+            "request_latency": latency,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the transcriber headless with a local socket API")
+    parser.add_argument("--socket", help="Unix socket path (default: daemon_socket in voice_memo_settings.json)")
+    parser.add_argument("--no-microphone", action="store_true", help="only transcribe audio sent by clients")
+    args = parser.parse_args(argv)
+
+    daemon = MemoDaemon(app_settings.load_settings(), socket_path=args.socket,
+                        use_microphone=not args.no_microphone)
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,141 @@
+# Latency instrumentation
+# Each pipeline stage keeps a rolling window of recent timings so the
+# diagnostics view can show p50/p95/p99 and the numbers can be exported to
+# compare machines.
+
+import csv
+import json
+import math
+import platform
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Stages in pipeline order, as shown in the diagnostics view
+STAGES = (
+    "hotkey_to_capture",
+    "capture",
+    "recognition",
+    "command",
+    "save_notes",
+    "ui_refresh",
+)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+class LatencyHistogram:
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, milliseconds):
+        self.samples.append(milliseconds)
+        self.count += 1
+
+    def summary(self):
+        values = sorted(self.samples)
+        return {
+            "count": self.count,
+            "window": len(values),
+            "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+            "p50_ms": round(percentile(values, 0.50), 3),
+            "p95_ms": round(percentile(values, 0.95), 3),
+            "p99_ms": round(percentile(values, 0.99), 3),
+            "max_ms": round(values[-1], 3) if values else 0.0,
+        }
+
+
+class LatencyTracker:
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms = {stage: LatencyHistogram(window) for stage in STAGES}
+
+    def record(self, stage, seconds):
+        """Add one timing, in seconds, to a stage"""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram(self.window)
+            histogram.add(seconds * 1000.0)
+
+    @contextmanager
+    def time(self, stage):
+        """Time the body of a with-block as one sample of stage"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def summary(self):
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in self._histograms.items()}
+
+    def samples(self):
+        with self._lock:
+            return {stage: list(histogram.samples) for stage, histogram in self._histograms.items()}
+
+    def export_json(self, path):
+        """Write summaries and raw samples, tagged with the machine they came from"""
+        report = {
+            "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "stages": self.summary(),
+            "samples_ms": self.samples(),
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    def export_csv(self, path):
+        """Write one summary row per stage"""
+        fields = ["count", "window", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["host", "stage"] + fields)
+            for stage, summary in self.summary().items():
+                writer.writerow([platform.node(), stage] + [summary[field] for field in fields])
+
+
+class StartupTimer:
+    """Records how long each startup phase took and when it finished"""
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self._lock = threading.Lock()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - began)
+
+    def mark(self, name):
+        """Record a point in time, such as the window becoming visible"""
+        self._add(name, None)
+
+    def _add(self, name, seconds):
+        at = time.perf_counter() - self.started
+        with self._lock:
+            self.phases.append((name, None if seconds is None else seconds * 1000.0, at * 1000.0))
+
+    def report(self):
+        lines = [f"{'Startup phase':<28}{'Took ms':>10}{'At ms':>10}"]
+        with self._lock:
+            for name, took, at in self.phases:
+                took_text = "" if took is None else f"{took:.1f}"
+                lines.append(f"{name:<28}{took_text:>10}{at:>10.1f}")
+        return "\n".join(lines)
@@ -0,0 +1,142 @@
+# Adaptive noise floor
+# A background thread reads every chunk from the always-open microphone ring,
+# computes its RMS energy with NumPy and tracks the noise floor, then keeps
+# the recognizer's energy_threshold a margin above it. Recognizer.listen uses
+# that threshold both to detect the start of speech and to detect the pause
+# that ends it, so a louder room raises it and a quieter one lowers it.
+#
+# The floor is the quietest chunk of the last few seconds (minimum
+# statistics). Speech always has short gaps between words, so it does not
+# raise the floor, while a fan switching on raises it once the window has
+# filled with the new noise.
+#
+# The pause that ends a recording adapts too. The tracker times the silent
+# gaps between stretches of sound (words, or noise louder than the
+# threshold) and pause_settings() suggests a pause_threshold just above most
+# of them, never longer than the caller's own. Noise that comes and goes (a
+# conversation nearby, music) fills the silence with short bursts, so the
+# gaps it leaves are short too, and the first real lull after the speaker
+# stops ends the recording instead of the phrase time limit.
+# non_speaking_duration, the silence kept around the speech, shrinks with it.
+
+import threading
+import time
+
+import numpy as np
+
+
+class NoiseFloorTracker:
+    def __init__(self, capture, recognizer, ratio=2.0, min_threshold=100.0,
+                 max_threshold=4000.0, window=3.0, metrics=None,
+                 pause_margin=0.25, min_pause=0.6, max_gap=2.0, gaps=64, min_gaps=8):
+        self.capture = capture
+        self.recognizer = recognizer
+        self.ratio = ratio
+        self.min_threshold = min_threshold
+        self.max_threshold = max_threshold
+        self.metrics = metrics
+
+        # Recent chunk energies, oldest overwritten first
+        self._chunk_seconds = capture.chunk_seconds
+        size = max(1, int(round(window / self._chunk_seconds)))
+        self._energies = np.full(size, np.inf, dtype=np.float32)
+        self._next = 0
+
+        # Silent gaps between sounds; silence longer than max_gap is between
+        # utterances and not counted
+        self.pause_margin = pause_margin
+        self.min_pause = min_pause
+        self.min_gaps = min_gaps
+        self._max_gap_chunks = int(round(max_gap / self._chunk_seconds))
+        self._gaps = np.zeros(gaps, dtype=np.float32)
+        self._gap_count = 0
+        self._quiet_chunks = None
+
+        self.floor = None
+        self.threshold = recognizer.energy_threshold
+        self.frames = 0
+        self._frame_seconds = 0.0
+
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        # The tracker owns the threshold; listen() would otherwise adjust it too
+        self.recognizer.dynamic_energy_threshold = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+
+    def _run(self):
+        ring = self.capture.ring
+        position = ring.written
+        while not self._stopping:
+            chunk, position = ring.get(position, timeout=1.0)
+            if chunk is None:
+                # Stream stopped; it is reopened by the next recording
+                if ring.closed:
+                    time.sleep(0.5)
+                    position = ring.written
+                continue
+
+            started = time.perf_counter()
+            self.update(self.energy(chunk))
+            took = time.perf_counter() - started
+
+            self.frames += 1
+            self._frame_seconds += took
+            if self.metrics is not None:
+                self.metrics.record("noise_floor_frame", took)
+
+    @staticmethod
+    def energy(chunk):
+        """RMS of a chunk of 16-bit samples, the same measure listen() uses"""
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        if not samples.size:
+            return 0.0
+        return float(np.sqrt(np.dot(samples, samples) / samples.size))
+
+    def update(self, energy):
+        self._energies[self._next] = energy
+        self._next = (self._next + 1) % len(self._energies)
+        self.floor = float(self._energies.min())
+
+        self.threshold = min(self.max_threshold, max(self.min_threshold, self.floor * self.ratio))
+        self.recognizer.energy_threshold = self.threshold
+        self._time_gap(energy > self.threshold)
+
+    def _time_gap(self, sound):
+        # _quiet_chunks counts silence since the last sound, None before any
+        if sound:
+            if self._quiet_chunks:
+                self._gaps[self._gap_count % len(self._gaps)] = self._quiet_chunks * self._chunk_seconds
+                self._gap_count += 1
+            self._quiet_chunks = 0
+        elif self._quiet_chunks is not None:
+            self._quiet_chunks += 1
+            if self._quiet_chunks > self._max_gap_chunks:
+                self._quiet_chunks = None
+
+    def pause_settings(self, longest, non_speaking=0.5):
+        """(pause_threshold, non_speaking_duration) for the next recording
+
+        The pause is a margin above 90% of recent gaps, between min_pause
+        and longest; with too few gaps measured yet it is longest.
+        """
+        pause = longest
+        if self._gap_count >= self.min_gaps:
+            gaps = self._gaps[:min(self._gap_count, len(self._gaps))]
+            typical = float(np.percentile(gaps, 90)) + self.pause_margin
+            pause = min(longest, max(min(self.min_pause, longest), typical))
+        return pause, min(non_speaking, pause / 2)
+
+    def status(self):
+        if self.floor is None:
+            return "Noise floor: waiting for audio"
+        per_frame = self._frame_seconds / self.frames * 1e6 if self.frames else 0.0
+        pause = self.pause_settings(float("inf"))[0]
+        pause = f"{pause:.2f}s" if pause != float("inf") else "learning"
+        return (f"Noise floor: {self.floor:.0f}   Threshold: {self.threshold:.0f}   Pause: {pause}   "
+                f"{per_frame:.1f} us/frame over {self.frames} frames")
@@ -0,0 +1,268 @@
+# SQLite notes backend
+# Notes live in voice_notes.db (WAL mode) with an index on timestamp and an
+# FTS5 table kept in sync by triggers. The app reads them through
+# SQLiteNotesView, a list-like cursor view, instead of loading every note
+# into memory. Existing voice_notes.jsonl / voice_notes.json notes are
+# imported the first time the database is opened.
+#
+# Note N is the Nth row by id. Other processes may write the same database
+# (batch_transcribe.py, memo_daemon.py), so every numbered access first
+# checks PRAGMA data_version, which changes when another connection has
+# committed, and re-reads the row count then. Ids are normally contiguous
+# and note N is row base + N; if rows were deleted from outside, the ids are
+# kept in memory and looked up instead.
+
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+
+from search_index import parse_query
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    text TEXT NOT NULL,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS notes_timestamp ON notes(timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(text, content='notes', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+    INSERT INTO notes_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+    INSERT INTO notes_fts(notes_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+IMPORT_BATCH = 5000
+
+
+def _row(note):
+    extra = {key: value for key, value in note.items() if key not in ("timestamp", "text")}
+    return note.get("timestamp", ""), note.get("text", ""), json.dumps(extra) if extra else None
+
+
+def _note(timestamp, text, extra):
+    note = {"timestamp": timestamp, "text": text}
+    if extra:
+        note.update(json.loads(extra))
+    return note
+
+
+def _day_bound(day, end=False):
+    text = f"{day // 10000:04d}-{day // 100 % 100:02d}-{day % 100:02d}"
+    return text + " 99" if end else text
+
+
+class SQLiteNotesStore:
+    def __init__(self, path="voice_notes.db", journal_path="voice_notes.jsonl",
+                 legacy_path="voice_notes.json"):
+        self.path = path
+        self.journal_path = journal_path
+        self.legacy_path = legacy_path
+
+        # Note N is row base + N, or row _ids[N] when the ids have gaps
+        self.base = None
+        self.count = 0
+        self._ids = None
+        self._data_version = None
+
+        self._lock = threading.Lock()
+        self._conn = None
+        self._view = None
+
+    def load(self):
+        """Open the database and return a list-like view of the notes"""
+        with self._lock:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._sync()
+
+        if self.count == 0:
+            self._import_legacy()
+
+        self._view = SQLiteNotesView(self)
+        return self._view
+
+    def _sync(self):
+        """Pick up rows other processes committed; call with the lock held"""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        self._refresh_bounds()
+        return True
+
+    def _refresh_bounds(self):
+        first, last, count = self._conn.execute("SELECT MIN(id), MAX(id), COUNT(*) FROM notes").fetchone()
+        self.base = first
+        self.count = count
+        if count and last - first + 1 != count:
+            self._ids = array('q', (row[0] for row in self._conn.execute("SELECT id FROM notes ORDER BY id")))
+        else:
+            self._ids = None
+
+    def _number(self, row_id):
+        return row_id - self.base if self._ids is None else bisect_left(self._ids, row_id)
+
+    def _import_legacy(self):
+        """One-time import of the JSON journal (or the older JSON file)"""
+        from notes_store import NotesJournal
+
+        if not os.path.exists(self.journal_path) and not os.path.exists(self.legacy_path):
+            return
+
+        journal = NotesJournal(path=self.journal_path, legacy_path=self.legacy_path)
+        notes = journal.load()
+        journal.close()
+        if not os.path.exists(self.journal_path):
+            # The legacy file could not be migrated; try again next start
+            return
+
+        self.import_notes(notes)
+        os.replace(self.journal_path, self.journal_path + ".imported")
+        print(f"Imported {len(notes)} notes into {self.path}")
+
+    # Writing
+    def import_notes(self, notes):
+        """Insert many notes in large transactions"""
+        with self._lock:
+            for start in range(0, len(notes), IMPORT_BATCH):
+                rows = [_row(note) for note in notes[start:start + IMPORT_BATCH]]
+                with self._conn:
+                    self._conn.executemany("INSERT INTO notes (timestamp, text, extra) VALUES (?, ?, ?)", rows)
+            self._refresh_bounds()
+
+    def append(self, note):
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute("INSERT INTO notes (timestamp, text, extra) VALUES (?, ?, ?)",
+                                            _row(note))
+            # A full re-read if anyone else wrote meanwhile; it includes this row
+            if self._sync():
+                return
+            if self.base is None:
+                self.base = cursor.lastrowid
+            if self._ids is not None:
+                self._ids.append(cursor.lastrowid)
+            self.count += 1
+
+    def clear(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM notes")
+            self._sync()
+            self._refresh_bounds()
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    # Reading
+    def size(self):
+        with self._lock:
+            self._sync()
+            return self.count
+
+    def fetch(self, start, stop):
+        """Notes start..stop-1 in order"""
+        with self._lock:
+            self._sync()
+            stop = min(stop, self.count)
+            if start >= stop:
+                return []
+            if self._ids is None:
+                first, last = self.base + start, self.base + stop - 1
+            else:
+                first, last = self._ids[start], self._ids[stop - 1]
+            rows = self._conn.execute(
+                "SELECT timestamp, text, extra FROM notes WHERE id >= ? AND id <= ? ORDER BY id",
+                (first, last)).fetchall()
+        return [_note(*row) for row in rows]
+
+    def search(self, query, limit=500):
+        """Note numbers matching query (same syntax as SearchIndex), newest first"""
+        words, phrases, first_day, last_day = parse_query(query)
+
+        terms = [f'"{word}"' for word in words]
+        terms += ['"' + " ".join(phrase) + '"' for phrase in phrases]
+
+        conditions, params = [], []
+        if terms:
+            conditions.append("notes_fts MATCH ?")
+            params.append(" AND ".join(terms))
+        if first_day > 0:
+            conditions.append("notes.timestamp >= ?")
+            params.append(_day_bound(first_day))
+        if last_day < 99999999:
+            conditions.append("notes.timestamp <= ?")
+            params.append(_day_bound(last_day, end=True))
+        if not conditions:
+            return []
+
+        source = "notes_fts JOIN notes ON notes.id = notes_fts.rowid" if terms else "notes"
+        with self._lock:
+            self._sync()
+            rows = self._conn.execute(
+                f"SELECT notes.id FROM {source} WHERE {' AND '.join(conditions)} "
+                "ORDER BY notes.id DESC LIMIT ?", params + [limit]).fetchall()
+            return [self._number(row[0]) for row in rows]
+
+    def create_search_index(self):
+        return FTSSearchIndex(self)
+
+
+class SQLiteNotesView:
+    """Read-only sequence over the notes table, fetched on demand"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.size()
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            notes = self.store.fetch(start, stop)
+            return notes[::step] if step != 1 else notes
+
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("note index out of range")
+        return self.store.fetch(item, item + 1)[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), IMPORT_BATCH):
+            yield from self.store.fetch(start, min(len(self), start + IMPORT_BATCH))
+
+
+class FTSSearchIndex:
+    """SearchIndex interface backed by the FTS5 table, which triggers keep current"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def load(self, notes):
+        pass
+
+    def add(self, note):
+        pass
+
+    def clear(self):
+        pass
+
+    def save(self):
+        pass
+
+    def search(self, query, notes, limit=500):
+        return self.store.search(query, limit)
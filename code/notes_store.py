@@ -0,0 +1,355 @@
+# Append-only notes journal
+# Each line of voice_notes.jsonl is one record: {"op": "add", "note": {...}}
+# or {"op": "clear"}. Adding a note appends a single line instead of
+# rewriting the whole archive.
+#
+# Several processes may have the journal open (the app, memo_daemon.py,
+# batch_transcribe.py). Each holds a lock on its own byte of
+# voice_notes.jsonl.lock for as long as it is open. Anything that replaces
+# the journal file (compaction, migration, torn-tail repair) only runs when
+# no other process holds one, under a lock on byte 0 that opening the
+# journal takes too. Appends need no lock: the file is never replaced under
+# another writer, and each record is a single write to a file opened for
+# appending.
+#
+# create_notes_store() picks this journal or the SQLite backend
+# (notes_sqlite.py) from the notes_backend setting.
+
+import json
+import os
+import threading
+import time
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Byte 0 of the lock file guards replacing the journal; bytes 1 to
+# WRITER_SLOTS mark the processes that have it open
+WRITER_SLOTS = 64
+
+
+def _encode(record):
+    return (json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+def _lock_byte(f, offset, blocking=True):
+    """Lock one byte of f for this process; False if another process holds it"""
+    try:
+        if os.name == "nt":
+            f.seek(offset)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.lockf(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+    except OSError:
+        if blocking:
+            raise
+        return False
+    return True
+
+
+def _unlock_byte(f, offset):
+    if os.name == "nt":
+        f.seek(offset)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.lockf(f, fcntl.LOCK_UN, 1, offset)
+
+
+class NotesJournal:
+    def __init__(self, path="voice_notes.jsonl", legacy_path="voice_notes.json",
+                 fsync="always", fsync_interval=5.0, compact_min_dead=1000):
+        if fsync not in FSYNC_POLICIES:
+            print(f"Unknown fsync policy {fsync!r}, using 'always'")
+            fsync = "always"
+
+        self.path = path
+        self.legacy_path = legacy_path
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compact_min_dead = compact_min_dead
+
+        self._lock = threading.Lock()
+        self._file = None
+        # Lock file shared with other processes, and our byte in it
+        self._lock_file = None
+        self._slot = None
+        self._last_fsync = 0.0
+        self._live_records = 0
+        self._dead_records = 0
+        self._compacting = False
+
+        # The list returned by load(), kept current by append() and clear()
+        self.notes = []
+
+    # Loading and recovery
+    def load(self):
+        """Read all live notes, migrating and repairing the journal first"""
+        with self._lock:
+            self._lock_file = open(self.path + ".lock", 'a+b')
+            _lock_byte(self._lock_file, 0)
+            try:
+                self._take_slot()
+                sole_writer = self._sole_writer()
+                migrated = sole_writer and self._migrate_legacy()
+                notes = self._replay(repair=sole_writer)
+                # After a failed migration the journal is only created by the
+                # first write, so an unreadable legacy file is retried next start
+                if migrated:
+                    self._file = open(self.path, 'ab')
+            finally:
+                _unlock_byte(self._lock_file, 0)
+        self._maybe_compact()
+        self.notes = notes
+        return notes
+
+    def _take_slot(self):
+        for slot in range(1, WRITER_SLOTS + 1):
+            if _lock_byte(self._lock_file, slot, blocking=False):
+                self._slot = slot
+                return
+        print(f"More than {WRITER_SLOTS} processes have {self.path} open; it will not be compacted")
+        self._slot = None
+
+    def _sole_writer(self):
+        """True if no other process has the journal open
+
+        Called with byte 0 locked, so no other process can open it meanwhile.
+        """
+        if self._slot is None:
+            return False
+        for slot in range(1, WRITER_SLOTS + 1):
+            if slot == self._slot:
+                continue
+            if not _lock_byte(self._lock_file, slot, blocking=False):
+                return False
+            _unlock_byte(self._lock_file, slot)
+        return True
+
+    def _migrate_legacy(self):
+        """One-time conversion of voice_notes.json into the journal
+
+        Returns False if the legacy file is still waiting to be migrated.
+        Its notes go in front of anything already in the journal, which
+        holds notes saved while an earlier migration kept failing.
+        """
+        if not os.path.exists(self.legacy_path):
+            return True
+
+        try:
+            with open(self.legacy_path, 'r') as f:
+                notes = json.load(f)
+        except Exception as e:
+            print(f"Error reading legacy notes for migration, will retry next start: {e}")
+            return False
+
+        journal = b""
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                journal = f.read()
+        self._write_snapshot(self.path, notes, tail=journal)
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        print(f"Migrated {len(notes)} notes from {self.legacy_path} to {self.path}")
+        return True
+
+    def _replay(self, repair=True):
+        """Rebuild the notes list from the journal, truncating a torn tail
+
+        With repair False (another process has the journal open, and the
+        tail may be its write in progress) the tail is left alone.
+        """
+        notes = []
+        self._live_records = 0
+        self._dead_records = 0
+
+        if not os.path.exists(self.path):
+            return notes
+
+        good_offset = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Last write was interrupted before the newline landed
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    print(f"Skipping corrupt journal record at byte {good_offset}")
+                    good_offset += len(line)
+                    self._dead_records += 1
+                    continue
+
+                self._apply(record, notes)
+                good_offset += len(line)
+
+        if repair and good_offset < os.path.getsize(self.path):
+            print(f"Recovering notes journal: dropping torn record at byte {good_offset}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_offset)
+
+        return notes
+
+    def _apply(self, record, notes):
+        op = record.get("op")
+        if op == "add":
+            notes.append(record["note"])
+            self._live_records += 1
+        elif op == "clear":
+            notes.clear()
+            self._dead_records += self._live_records + 1
+            self._live_records = 0
+
+    # Writing
+    def append(self, note):
+        """Append a single note to the journal"""
+        line = _encode({"op": "add", "note": note})
+        # The list, the counters and the journal change together, so
+        # concurrent writers keep the list in journal order
+        with self._lock:
+            self._write_line(line)
+            self.notes.append(note)
+            self._live_records += 1
+
+    def clear(self):
+        """Record that all notes were cleared"""
+        line = _encode({"op": "clear"})
+        with self._lock:
+            self._write_line(line)
+            self.notes.clear()
+            self._dead_records += self._live_records + 1
+            self._live_records = 0
+        self._maybe_compact()
+
+    def _write_line(self, line):
+        """Write one encoded record; the caller holds the lock"""
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        self._file.write(line)
+        self._file.flush()
+        self._sync()
+
+    def _sync(self):
+        if self.fsync == "always":
+            os.fsync(self._file.fileno())
+        elif self.fsync == "interval":
+            now = time.monotonic()
+            if now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+
+    def _write_snapshot(self, path, notes, tail=b""):
+        """Write notes, then raw journal records, to a fresh journal atomically"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            for note in notes:
+                f.write(_encode({"op": "add", "note": note}))
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # Compaction
+    def _maybe_compact(self):
+        if self._compacting:
+            return
+        if self._dead_records < self.compact_min_dead or self._dead_records < self._live_records:
+            return
+
+        self._compacting = True
+        threading.Thread(target=self._compact, daemon=True).start()
+
+    def _compact(self):
+        """Rewrite the journal without cleared notes, in the background"""
+        try:
+            if not self._while_sole_writer(lambda: True):
+                print("Notes journal is open in another process, not compacting")
+                return
+
+            # Snapshot everything written so far without blocking appends
+            with self._lock:
+                self._file.flush()
+                offset = os.fstat(self._file.fileno()).st_size
+
+            notes = []
+            with open(self.path, 'rb') as f:
+                for line in f.read(offset).splitlines():
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("op") == "add":
+                        notes.append(record["note"])
+                    elif record.get("op") == "clear":
+                        notes.clear()
+
+            tmp_path = self.path + ".compact"
+            with open(tmp_path, 'wb') as out:
+                for note in notes:
+                    out.write(_encode({"op": "add", "note": note}))
+
+            def swap():
+                # Copy whatever was appended while we were rewriting, then swap
+                self._file.flush()
+                with open(self.path, 'rb') as f:
+                    f.seek(offset)
+                    tail = f.read()
+                with open(tmp_path, 'ab') as out:
+                    out.write(tail)
+                    out.flush()
+                    os.fsync(out.fileno())
+                self._file.close()
+                try:
+                    os.replace(tmp_path, self.path)
+                finally:
+                    self._file = open(self.path, 'ab')
+                self._dead_records = 0
+                return True
+
+            if not self._while_sole_writer(swap):
+                os.remove(tmp_path)
+                print("Notes journal was opened by another process, not compacting")
+                return
+            print(f"Compacted notes journal to {len(notes)} notes")
+        except Exception as e:
+            print(f"Error compacting notes journal: {e}")
+        finally:
+            self._compacting = False
+
+    def _while_sole_writer(self, action):
+        """action() if no other process has the journal open, else False"""
+        with self._lock:
+            _lock_byte(self._lock_file, 0)
+            try:
+                return self._sole_writer() and action()
+            finally:
+                _unlock_byte(self._lock_file, 0)
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+            if self._lock_file:
+                # Closing it releases our writer slot
+                self._lock_file.close()
+                self._lock_file = None
+                self._slot = None
+
+    def create_search_index(self):
+        from search_index import SearchIndex
+        return SearchIndex(path=os.path.splitext(self.path)[0] + ".idx")
+
+
+def create_notes_store(settings):
+    """Notes store for the notes_backend setting ("journal" or "sqlite")"""
+    if settings.get('notes_backend') == "sqlite":
+        from notes_sqlite import SQLiteNotesStore
+        return SQLiteNotesStore()
+
+    return NotesJournal(fsync=settings['notes_fsync'],
+                        fsync_interval=settings['notes_fsync_interval'])
@@ -0,0 +1,135 @@
+# Notes pane renderer
+# Keeps only a window of notes in the Text widget. New notes are appended
+# without touching the rest of the pane, and older or newer pages are
+# loaded on demand as the user scrolls to either edge.
+
+import tkinter as tk
+from collections import deque
+
+
+def format_note(note):
+    return f"[{note['timestamp']}]\n{note['text']}\n\n"
+
+
+class NotesView:
+    def __init__(self, text_widget, page_size=200, max_pages=3):
+        self.text = text_widget
+        self.page_size = page_size
+        self.max_rendered = page_size * max_pages
+        self.notes = []
+
+        # Notes currently in the widget are self.notes[self.first:self.last]
+        self.first = 0
+        self.last = 0
+        self._line_counts = deque()
+        self._load_pending = False
+
+        # Watch the scroll position so we know when an edge is reached
+        self._scrollbar = getattr(text_widget, 'vbar', None)
+        self.text.configure(yscrollcommand=self._on_yscroll)
+
+    def render(self, notes):
+        """Show the newest page of notes, replacing whatever was displayed"""
+        self.notes = notes
+        self.text.delete(1.0, tk.END)
+        self._line_counts.clear()
+
+        self.last = len(notes)
+        self.first = max(0, self.last - self.page_size)
+        for note in notes[self.first:self.last]:
+            self._insert_bottom(note)
+
+        self.text.see(tk.END)
+
+    def show_new(self):
+        """Render notes added since the last call (the common, per-memo case)"""
+        if self.last < len(self.notes) - self.page_size:
+            # Fell far behind, e.g. after a batch import
+            self.render(self.notes)
+            return
+
+        at_tail = self.text.yview()[1] >= 1.0
+        if not at_tail and len(self._line_counts) >= self.max_rendered:
+            # User is reading history; the page loader picks these up later
+            return
+
+        for note in self.notes[self.last:]:
+            self._insert_bottom(note)
+            self.last += 1
+        self._trim_top()
+
+        if at_tail:
+            self.text.see(tk.END)
+
+    def note_at(self, index):
+        """The note displayed at a Text index such as '12.4', or None"""
+        line = int(self.text.index(index).split(".")[0])
+        for offset, lines in enumerate(self._line_counts):
+            if line <= lines:
+                return self.notes[self.first + offset]
+            line -= lines
+        return None
+
+    # Rendering helpers
+    def _insert_bottom(self, note):
+        chunk = format_note(note)
+        self.text.insert(tk.END, chunk)
+        self._line_counts.append(chunk.count("\n"))
+
+    def _insert_top(self, notes):
+        chunk = "".join(format_note(note) for note in notes)
+        self.text.insert("1.0", chunk)
+        for note in reversed(notes):
+            self._line_counts.appendleft(format_note(note).count("\n"))
+        return chunk.count("\n")
+
+    def _trim_top(self):
+        while len(self._line_counts) > self.max_rendered:
+            self._trim_top_one()
+
+    def _trim_top_one(self):
+        lines = self._line_counts.popleft()
+        self.text.delete("1.0", f"{lines + 1}.0")
+        self.first += 1
+        return lines
+
+    def _trim_bottom(self):
+        while len(self._line_counts) > self.max_rendered:
+            lines = self._line_counts.pop()
+            self.text.delete(f"end-{lines + 1}l linestart", "end-1c")
+            self.last -= 1
+
+    # Paging
+    def _on_yscroll(self, top, bottom):
+        if self._scrollbar is not None:
+            self._scrollbar.set(top, bottom)
+
+        at_top = float(top) <= 0.0 and self.first > 0
+        at_bottom = float(bottom) >= 1.0 and self.last < len(self.notes)
+        if (at_top or at_bottom) and not self._load_pending:
+            self._load_pending = True
+            self.text.after_idle(self._load_page)
+
+    def _load_page(self):
+        self._load_pending = False
+        top, bottom = self.text.yview()
+
+        if top <= 0.0 and self.first > 0:
+            start = max(0, self.first - self.page_size)
+            inserted = self._insert_top(self.notes[start:self.first])
+            self.first = start
+            self._trim_bottom()
+            # Keep the note that was at the top of the view in place
+            self.text.yview(f"{inserted + 1}.0")
+        elif bottom >= 1.0 and self.last < len(self.notes):
+            end = min(len(self.notes), self.last + self.page_size)
+            anchor = self.text.index("@0,0")
+            for note in self.notes[self.last:end]:
+                self._insert_bottom(note)
+            self.last = end
+            removed_lines = 0
+            while len(self._line_counts) > self.max_rendered:
+                removed_lines += self._trim_top_one()
+            line = max(1, int(anchor.split(".")[0]) - removed_lines)
+            self.text.yview(f"{line}.0")
+
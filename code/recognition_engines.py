@@ -0,0 +1,182 @@
+# Speech recognition engines
+# Every engine takes an sr.AudioData and returns the recognized text, raising
+# sr.UnknownValueError when nothing was understood and sr.RequestError when
+# the engine is unavailable, the same contract as the recognize_* methods of
+# speech_recognition. Offline engines load their model once per process.
+
+import json
+import threading
+from lazy_import import lazy_import
+
+sr = lazy_import("speech_recognition")
+
+
+class RecognitionEngine:
+    name = None
+    offline = False
+    # Sample rate the engine wants, or None if it accepts any rate
+    sample_rate = None
+    # Settings the engine reads; a change to any of them needs a new engine
+    setting_keys = ('recognition_language',)
+
+    def __init__(self, recognizer, settings):
+        self.recognizer = recognizer
+        self.language = settings.get('recognition_language', 'en-US')
+
+    def warm_up(self):
+        """Load models ahead of the first clip"""
+        pass
+
+    def recognize(self, audio):
+        raise NotImplementedError
+
+    def spot(self, audio, phrases, min_confidence=0.9):
+        """Keyword spotting: return the phrase heard in audio, or None"""
+        raise NotImplementedError(f"{self.name} does not support keyword spotting")
+
+
+class GoogleEngine(RecognitionEngine):
+    name = "google"
+
+    def recognize(self, audio):
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class SphinxEngine(RecognitionEngine):
+    """CMU PocketSphinx, fully offline (pip install pocketsphinx)"""
+    name = "sphinx"
+    offline = True
+    sample_rate = 16000
+
+    def __init__(self, recognizer, settings):
+        super().__init__(recognizer, settings)
+        self._decoder = None
+        # A decoder handles one utterance at a time
+        self._lock = threading.Lock()
+
+    def warm_up(self):
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        if self._decoder is None:
+            try:
+                from pocketsphinx import Decoder
+            except ImportError:
+                raise sr.RequestError("missing PocketSphinx module: ensure that PocketSphinx is set up correctly.")
+            self._decoder = Decoder(samprate=self.sample_rate)
+            print("PocketSphinx model loaded")
+        return self._decoder
+
+    def recognize(self, audio):
+        raw = audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2)
+        with self._lock:
+            decoder = self._load()
+            decoder.start_utt()
+            decoder.process_raw(raw, full_utt=True)
+            decoder.end_utt()
+            hypothesis = decoder.hyp()
+
+        if hypothesis is None or not hypothesis.hypstr:
+            raise sr.UnknownValueError()
+        return hypothesis.hypstr
+
+
+class VoskEngine(RecognitionEngine):
+    """Kaldi-based Vosk models, fully offline (pip install vosk)"""
+    name = "vosk"
+    offline = True
+    sample_rate = 16000
+    setting_keys = RecognitionEngine.setting_keys + ('vosk_model_path',)
+
+    # Models are large; share one per path across engine instances
+    _models = {}
+    _models_lock = threading.Lock()
+
+    def __init__(self, recognizer, settings):
+        super().__init__(recognizer, settings)
+        self.model_path = settings.get('vosk_model_path', 'model')
+
+    def warm_up(self):
+        self._load()
+
+    def _load(self):
+        """The shared model and vosk's KaldiRecognizer class"""
+        try:
+            from vosk import KaldiRecognizer, Model
+        except ImportError:
+            raise sr.RequestError("missing vosk module: ensure that vosk is installed")
+
+        with VoskEngine._models_lock:
+            model = VoskEngine._models.get(self.model_path)
+            if model is None:
+                try:
+                    model = Model(self.model_path)
+                except Exception as e:
+                    raise sr.RequestError(f"could not load Vosk model from {self.model_path}: {e}")
+                VoskEngine._models[self.model_path] = model
+                print(f"Vosk model loaded from {self.model_path}")
+        return model, KaldiRecognizer
+
+    def recognize(self, audio):
+        # The model is shared; recognizers are cheap and per clip
+        model, KaldiRecognizer = self._load()
+        recognizer = KaldiRecognizer(model, self.sample_rate)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2))
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+    def spot(self, audio, phrases, min_confidence=0.9):
+        """Decode against a grammar of just the given phrases
+
+        Much faster than open dictation on a short clip. Anything outside
+        the grammar comes back as [unk] and is rejected.
+        """
+        model, KaldiRecognizer = self._load()
+        grammar = json.dumps(list(phrases) + ["[unk]"])
+        recognizer = KaldiRecognizer(model, self.sample_rate, grammar)
+        recognizer.SetWords(True)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2))
+        result = json.loads(recognizer.FinalResult())
+
+        text = result.get("text", "")
+        words = result.get("result", [])
+        if not text or "[unk]" in text or text not in phrases or not words:
+            return None
+        if min(word.get("conf", 0.0) for word in words) < min_confidence:
+            return None
+        return text
+
+
+ENGINES = {
+    GoogleEngine.name: GoogleEngine,
+    SphinxEngine.name: SphinxEngine,
+    VoskEngine.name: VoskEngine,
+}
+
+_engine_cache = {}
+_engine_cache_lock = threading.Lock()
+
+
+def get_engine(recognizer, settings, name=None):
+    """Return the engine selected in settings
+
+    Engines are shared per recognizer and engine settings, so a changed
+    model path or language gets a new engine instead of the old one.
+    """
+    name = name or settings.get('recognition_engine', 'google')
+    if name not in ENGINES:
+        print(f"Unknown recognition engine {name!r}, using google")
+        name = GoogleEngine.name
+
+    engine_class = ENGINES[name]
+    key = (name, recognizer, tuple(settings.get(setting) for setting in engine_class.setting_keys))
+    with _engine_cache_lock:
+        engine = _engine_cache.get(key)
+        if engine is None:
+            engine = engine_class(recognizer, settings)
+            _engine_cache[key] = engine
+    return engine
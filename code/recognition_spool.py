@@ -0,0 +1,221 @@
+# Offline spool for clips that could not be recognized
+# When the engine raises sr.RequestError (no network, service down) the clip
+# is written to the spool directory as a WAV file named after its capture
+# time instead of being thrown away. A background drainer retries spooled
+# clips oldest first, a few at a time, and commits each recognized clip as a
+# note with its original capture timestamp.
+#
+# While the engine keeps failing, the drainer backs off exponentially and
+# retries a single clip at a time; a successful live recognition resets the
+# backoff so the spool drains as soon as the engine is reachable again.
+# Spooled clips only ever become notes: a voice command recognized an hour
+# late is not run.
+#
+# Only an unreachable engine (sr.RequestError, connection errors) is worth
+# retrying. A clip that cannot be read back, or that the engine rejects for
+# any other reason, is moved to spool/bad/ so it does not hold up the clips
+# behind it.
+
+import os
+import random
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from lazy_import import lazy_import
+
+sr = lazy_import("speech_recognition")
+
+NAME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _write_wav(path, audio):
+    """Write audio to path atomically and durably"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(audio.get_wav_data())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_wav(path):
+    with wave.open(path, 'rb') as f:
+        frames = f.readframes(f.getnframes())
+        return sr.AudioData(frames, f.getframerate(), f.getsampwidth())
+
+
+class RecognitionSpool:
+    def __init__(self, recognize, commit, directory="spool", concurrency=2,
+                 base_delay=5.0, max_delay=300.0):
+        # recognize(audio) -> text. commit(note, audio, pending) is called on a
+        # spool thread, with the number of other clips still spooled
+        self.recognize = recognize
+        self.commit = commit
+        self.directory = directory
+        self.concurrency = max(1, concurrency)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._cond = threading.Condition()
+        # Paths of spooled clips, oldest first
+        self._entries = []
+        # Clips of the current batch that are done with but still in _entries
+        self._settled = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stopping = False
+        self._thread = None
+        self._executor = None
+
+    def load(self):
+        """Pick up clips spooled by earlier runs and start the drainer"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                # Interrupted while spooling; the clip was never acknowledged
+                os.remove(path)
+            elif name.endswith(".wav"):
+                entries.append(path)
+
+        with self._cond:
+            self._entries = sorted(entries)
+        if entries:
+            print(f"{len(entries)} spooled clips waiting for recognition")
+
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="spool")
+        self._thread = threading.Thread(target=self._run, name="spool-drainer", daemon=True)
+        self._thread.start()
+
+    def add(self, audio, timestamp):
+        """Spool a clip captured at timestamp ('YYYY-mm-dd HH:MM:SS')"""
+        captured = datetime.strptime(timestamp, TIMESTAMP_FORMAT).strftime(NAME_FORMAT)
+        path = os.path.join(self.directory, f"{captured}_{uuid.uuid4().hex[:8]}.wav")
+        _write_wav(path, audio)
+
+        with self._cond:
+            self._entries.append(path)
+            self._cond.notify_all()
+        return path
+
+    def pending(self):
+        with self._cond:
+            return len(self._entries) - self._settled
+
+    def engine_reachable(self):
+        """Called after a live recognition succeeds: retry right away"""
+        with self._cond:
+            if not self._failures:
+                return
+            self._failures = 0
+            self._retry_at = 0.0
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    # Draining
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and (not self._entries or time.time() < self._retry_at):
+                    timeout = self._retry_at - time.time() if self._entries else None
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    return
+                # Probe with one clip until the engine answers again
+                batch = self._entries[:1 if self._failures else self.concurrency]
+
+            results = list(self._executor.map(self._drain, batch))
+
+            with self._cond:
+                for path, done in zip(batch, results):
+                    if done:
+                        self._entries.remove(path)
+                self._settled = 0
+                if all(results):
+                    self._failures = 0
+                else:
+                    self._failures += 1
+                    delay = min(self.max_delay, self.base_delay * 2 ** (self._failures - 1))
+                    self._retry_at = time.time() + delay * random.uniform(0.8, 1.2)
+                    print(f"Spooled clips still failing, retrying in {delay:.0f}s")
+
+    def _drain(self, path):
+        """Try one spooled clip; True once it is done with"""
+        name = os.path.basename(path)
+        try:
+            captured = datetime.strptime(name.rsplit("_", 1)[0], NAME_FORMAT)
+        except ValueError:
+            # Not named by add(); fall back to when the file was written
+            captured = datetime.fromtimestamp(os.path.getmtime(path))
+        timestamp = captured.strftime(TIMESTAMP_FORMAT)
+
+        try:
+            audio = _read_wav(path)
+        except (wave.Error, EOFError, OSError) as e:
+            self._set_aside(path, f"could not be read: {e}")
+            return True
+
+        try:
+            text = self.recognize(audio)
+        except sr.UnknownValueError:
+            print(f"Spooled clip {name} had no recognizable speech, dropping it")
+            self._settle(1)
+            os.remove(path)
+            return True
+        except (sr.RequestError, OSError) as e:
+            # OSError covers connection errors and socket timeouts
+            print(f"Spooled clip {name} not recognized yet: {e}")
+            return False
+        except Exception as e:
+            self._set_aside(path, f"failed recognition: {e}")
+            return True
+
+        # Settled before the commit, so the count excludes this clip
+        pending = self._settle(1)
+        try:
+            self.commit({"timestamp": timestamp, "text": text}, audio, pending)
+        except Exception as e:
+            print(f"Error committing spooled clip {name}: {e}")
+            self._settle(-1)
+            return False
+        os.remove(path)
+        return True
+
+    def _settle(self, count):
+        """Mark clips of the batch done (or not); returns pending()"""
+        with self._cond:
+            self._settled += count
+            return len(self._entries) - self._settled
+
+    def _set_aside(self, path, reason):
+        """Move a clip that will never succeed out of the spool"""
+        self._settle(1)
+        bad_directory = os.path.join(self.directory, "bad")
+        print(f"Spooled clip {os.path.basename(path)} {reason}; moving it to {bad_directory}")
+        try:
+            os.makedirs(bad_directory, exist_ok=True)
+            os.replace(path, os.path.join(bad_directory, os.path.basename(path)))
+        except OSError as e:
+            print(f"Could not move spooled clip, deleting it: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def status(self):
+        pending = self.pending()
+        if not pending:
+            return "Offline spool: empty"
+        line = f"Offline spool: {pending} clips waiting"
+        if self._failures:
+            line += f", retrying in {max(0.0, self._retry_at - time.time()):.0f}s"
+        return line
@@ -0,0 +1,222 @@
+# Full-text search over notes
+# An inverted index maps each word to the sorted note numbers that contain
+# it, and each day to the notes recorded on it. Notes are added as they are
+# committed and the index is saved next to the notes journal, so startup only
+# has to index notes added since the last save.
+#
+# Query syntax: plain words (all must match), "quoted phrases", and the
+# date filters after:YYYY-MM-DD, before:YYYY-MM-DD and on:YYYY-MM-DD.
+# Words and dates are answered from the index alone; the notes themselves
+# are only read to check quoted phrases.
+
+import os
+import pickle
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import chain
+
+INDEX_VERSION = 1
+
+_WORD = re.compile(r"[\w']+")
+_QUERY = re.compile(r'"([^"]*)"|(after|before|on):(\d{4}-\d{2}-\d{2})|(\S+)')
+
+
+def tokenize(text):
+    return _WORD.findall(text.lower())
+
+
+def day_number(timestamp):
+    """'2024-03-05 10:00:00' -> 20240305"""
+    try:
+        return int(timestamp[:10].replace("-", ""))
+    except (TypeError, ValueError):
+        return 0
+
+
+def parse_query(query):
+    """Split a query into (words, phrases, first_day, last_day)"""
+    words, phrases = [], []
+    first_day, last_day = 0, 99999999
+    for phrase, field, date, word in _QUERY.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) > 1:
+                phrases.append(tokens)
+            words.extend(tokens)
+        elif field:
+            day = day_number(date)
+            if field == "after":
+                first_day = max(first_day, day)
+            elif field == "before":
+                last_day = min(last_day, day)
+            else:
+                first_day, last_day = max(first_day, day), min(last_day, day)
+        else:
+            words.extend(tokenize(word))
+    return words, phrases, first_day, last_day
+
+
+def _contains_phrase(tokens, phrase):
+    size = len(phrase)
+    return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1))
+
+
+class SearchIndex:
+    def __init__(self, path="voice_notes.idx", save_every=500):
+        self.path = path
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}
+        self.days = {}
+        self.count = 0
+        self.fingerprint = None
+        self._unsaved = 0
+
+    @staticmethod
+    def _fingerprint(note):
+        return (note.get("timestamp"), note.get("text"))
+
+    # Building
+    def load(self, notes):
+        """Load the saved index and index any notes added since it was saved"""
+        with self._lock:
+            self._read()
+            # The journal was cleared or rewritten since the index was saved
+            if self.count > len(notes) or (self.count and self.fingerprint != self._fingerprint(notes[self.count - 1])):
+                print("Search index is out of date, rebuilding")
+                self._reset()
+
+            stale = len(notes) - self.count
+            for note in notes[self.count:]:
+                self._add(note)
+
+        if stale:
+            print(f"Indexed {stale} notes for search")
+            self.save()
+
+    def _read(self):
+        self._reset()
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get("version") != INDEX_VERSION:
+                return
+            self.postings = data["postings"]
+            self.days = data["days"]
+            self.count = data["count"]
+            self.fingerprint = data["fingerprint"]
+        except Exception as e:
+            print(f"Error loading search index: {e}")
+            self._reset()
+
+    def add(self, note):
+        """Index one newly committed note"""
+        with self._lock:
+            self._add(note)
+            self._unsaved += 1
+            due = self._unsaved >= self.save_every
+        if due:
+            threading.Thread(target=self.save, daemon=True).start()
+
+    def _add(self, note):
+        number = self.count
+        for token in set(tokenize(note.get("text", ""))):
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = array('I')
+            postings.append(number)
+
+        day = day_number(note.get("timestamp", ""))
+        self.days.setdefault(day, array('I')).append(number)
+
+        self.count += 1
+        self.fingerprint = self._fingerprint(note)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+        self.save()
+
+    def save(self):
+        """Write the index atomically next to the notes journal"""
+        with self._lock:
+            data = pickle.dumps({
+                "version": INDEX_VERSION,
+                "postings": self.postings,
+                "days": self.days,
+                "count": self.count,
+                "fingerprint": self.fingerprint,
+            }, protocol=pickle.HIGHEST_PROTOCOL)
+            self._unsaved = 0
+
+        try:
+            with self._save_lock:
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error saving search index: {e}")
+
+    # Querying
+    def search(self, query, notes, limit=500):
+        """Return note numbers matching query, newest first"""
+        words, phrases, first_day, last_day = parse_query(query)
+        dated = first_day > 0 or last_day < 99999999
+
+        with self._lock:
+            if not words:
+                return self._search_days(first_day, last_day, limit) if dated else []
+
+            lists = []
+            for word in set(words):
+                postings = self.postings.get(word)
+                if postings is None:
+                    return []
+                lists.append(postings)
+            if dated:
+                # The date range is one more sorted list to intersect with
+                lists.append(self._day_postings(first_day, last_day))
+
+            lists.sort(key=len)
+            candidates, others = lists[0], lists[1:]
+
+        results = []
+        for number in reversed(candidates):
+            if not all(self._has(postings, number) for postings in others):
+                continue
+            if phrases:
+                tokens = tokenize(notes[number].get("text", ""))
+                if not all(_contains_phrase(tokens, phrase) for phrase in phrases):
+                    continue
+            results.append(number)
+            if len(results) >= limit:
+                break
+        return results
+
+    def _day_postings(self, first_day, last_day):
+        """Sorted numbers of the notes recorded between the two days"""
+        in_range = (self.days[day] for day in self.days if first_day <= day <= last_day)
+        return array('I', sorted(chain.from_iterable(in_range)))
+
+    def _search_days(self, first_day, last_day, limit):
+        """Date filter only: newest days first"""
+        results = []
+        for day in sorted((day for day in self.days if first_day <= day <= last_day), reverse=True):
+            results.extend(reversed(self.days[day]))
+            if len(results) >= limit:
+                break
+        return sorted(results, reverse=True)[:limit]
+
+    @staticmethod
+    def _has(postings, number):
+        i = bisect_left(postings, number)
+        return i < len(postings) and postings[i] == number
@@ -0,0 +1,123 @@
+# Application settings
+# Defaults for everything stored in voice_memo_settings.json
+
+import copy
+import json
+import os
+
+SETTINGS_FILE = "voice_memo_settings.json"
+
+DEFAULT_SETTINGS = {
+    "hotkey": "f9",
+    # Recognition engine: "google" (online), "sphinx" or "vosk" (offline)
+    "recognition_engine": "google",
+    "recognition_language": "en-US",
+    "vosk_model_path": "model",
+    # Notes storage: "journal" (voice_notes.jsonl) or "sqlite" (voice_notes.db,
+    # imports the journal on first use)
+    "notes_backend": "journal",
+    # Notes journal durability: "always" fsyncs every note, "interval" at most
+    # once per notes_fsync_interval seconds, "never" leaves it to the OS
+    "notes_fsync": "always",
+    "notes_fsync_interval": 5.0,
+    # The microphone stays open and keeps the last capture_buffer_seconds of
+    # audio; each recording starts preroll_seconds before the hotkey
+    "preroll_seconds": 0.5,
+    "capture_buffer_seconds": 10.0,
+    # Track the noise floor continuously (needs numpy) and keep the speech
+    # energy threshold noise_threshold_ratio times above it
+    "noise_tracking": True,
+    "noise_threshold_ratio": 2.0,
+    "min_energy_threshold": 100,
+    # Trim silence and resample clips before recognition (needs numpy).
+    # Engines without a fixed rate get upload_sample_rate; every
+    # preprocess_baseline_every-th clip is sent unprocessed for comparison
+    "preprocess_audio": True,
+    "upload_sample_rate": 16000,
+    "preprocess_baseline_every": 20,
+    # Streaming transcription: split speech at short pauses and recognize
+    # each segment while still recording
+    "streaming": True,
+    "stream_segment_pause": 0.5,
+    "stream_end_silence": 1.5,
+    "stream_segment_limit": 10,
+    # Transcription queue: worker threads, queued clip limit, and the clip
+    # length (seconds) at or below which a clip takes the command fast lane
+    "transcription_workers": 2,
+    "transcription_queue_size": 8,
+    "fast_lane_seconds": 3.0,
+    # Clips that fail with a recognition service error are kept in
+    # spool_directory and retried in the background, spool_concurrency at a
+    # time, backing off up to spool_max_delay seconds while still failing
+    "spool_directory": "spool",
+    "spool_concurrency": 2,
+    "spool_max_delay": 300.0,
+    # Keep each note's audio (FLAC, at most audio_archive_sample_rate) in
+    # large segment files in audio_archive_directory; notes get a clip_id
+    "audio_archive": False,
+    "audio_archive_directory": "audio_archive",
+    "audio_archive_sample_rate": 16000,
+    "audio_archive_segment_mb": 256,
+    # Early commands: run a command as soon as the first segment matches with
+    # at least this confidence, optionally spotting it with a local Vosk
+    # model before the full recognizer is called
+    "early_command_confidence": 0.9,
+    "keyword_spotting": False,
+    # Commands run on command_workers threads and give up after
+    # command_timeout seconds (command_timeouts overrides it per handler).
+    # A note waits command_wait_seconds for its command; slower ones are
+    # saved as [COMMAND RUNNING] and report their result when done
+    "command_workers": 2,
+    "command_timeout": 5.0,
+    "command_timeouts": {"spotify_open": 15.0, "browser_open_browser": 15.0},
+    "command_wait_seconds": 0.25,
+    # Extra command modules, one .py file each (see command_plugins.py);
+    # imported the first time one of their commands runs
+    "command_plugin_directory": "plugins",
+    # Hands-free listening: utterances are cut from the live microphone by
+    # voice activity detection instead of the hotkey. One starts after
+    # hands_free_min_speech seconds of speech and ends after
+    # hands_free_end_silence seconds of silence. Listening pauses while the
+    # process has used hands_free_cpu_seconds_per_hour CPU seconds, or sent
+    # hands_free_recognitions_per_hour utterances for recognition, in the
+    # last hour (0 for no limit)
+    "hands_free": False,
+    "hands_free_min_speech": 0.25,
+    "hands_free_end_silence": 0.8,
+    "hands_free_max_utterance": 15.0,
+    "hands_free_cpu_seconds_per_hour": 180,
+    "hands_free_recognitions_per_hour": 300,
+    # Headless daemon (memo_daemon.py): Unix socket path, or the loopback TCP
+    # port where Unix sockets are unavailable and the file holding the token
+    # TCP clients must present; connected client limit, and per-client send
+    # queue length and requests in flight
+    "daemon_socket": "voice_memo.sock",
+    "daemon_port": 47615,
+    "daemon_token_file": "~/.voice_memo_token",
+    "daemon_max_clients": 64,
+    "daemon_send_queue": 256,
+    "daemon_max_inflight": 8,
+    "daemon_max_message_mb": 16,
+}
+
+
+def load_settings(path=SETTINGS_FILE):
+    """Load settings from disk, filling in defaults for missing keys"""
+    # Deep copy: nested defaults like command_timeouts must not be shared
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                settings.update(json.load(f))
+    except Exception as e:
+        print(f"Error loading settings: {e}")
+    return settings
+
+
+def save_settings(settings, path=SETTINGS_FILE):
+    """Write settings to disk"""
+    try:
+        with open(path, 'w') as f:
+            json.dump(settings, f, indent=2)
+    except Exception as e:
+        print(f"Error saving settings: {e}")
@@ -0,0 +1,148 @@
+# Streaming transcription
+# Audio is captured as a series of segments split at short pauses. Each
+# segment is recognized while recording continues and partial text is
+# reported as soon as every earlier segment has come back.
+#
+# The first segment can also be checked for a voice command. When one is
+# detected it runs right away, and recording carries on: whatever is said
+# after it comes back from finish() as the command result's "remainder", for
+# the core to run as the rest of a compound utterance ("next song" [pause]
+# "and volume up").
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from lazy_import import lazy_import
+
+sr = lazy_import("speech_recognition")
+
+
+class StreamingTranscription:
+    def __init__(self, recognize, on_partial=None, detect_command=None, max_workers=2):
+        self.recognize = recognize
+        self.on_partial = on_partial
+        # detect_command(audio, text) returns a command result or None; it is
+        # called for the first segment before recognition (text is None) and
+        # again with the recognized text
+        self.detect_command = detect_command
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="segment")
+
+        self._lock = threading.Lock()
+        self._futures = []
+        self._segments = []
+        self._results = {}
+        self._reported = 0
+        self.duration = 0.0
+
+        # Set once a command was detected in the first segment
+        self.command_text = None
+        self.command_result = None
+
+    @property
+    def segment_count(self):
+        return len(self._futures)
+
+    def add_segment(self, audio):
+        """Queue a captured segment for recognition"""
+        index = len(self._futures)
+        self._segments.append(audio)
+        self.duration += len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        future = self.executor.submit(self._recognize_segment, index, audio)
+        self._futures.append(future)
+
+    def _recognize_segment(self, index, audio):
+        if index == 0 and self.detect_command:
+            spotted = self.detect_command(audio, None)
+            if spotted is not None:
+                return self._command_detected(spotted["text"], spotted)
+
+        try:
+            text = self.recognize(audio)
+        except sr.UnknownValueError:
+            text = ""
+        except sr.RequestError:
+            with self._lock:
+                self._results[index] = ""
+            self._report_partial()
+            raise
+
+        if index == 0 and self.detect_command and text:
+            result = self.detect_command(audio, text)
+            if result is not None:
+                return self._command_detected(text, result)
+
+        with self._lock:
+            self._results[index] = text
+        self._report_partial()
+        return text
+
+    def _command_detected(self, text, result):
+        """Keep the result of the command that already ran from the first segment"""
+        self.command_text = text
+        self.command_result = result
+        with self._lock:
+            self._results[0] = text
+        self._report_partial()
+        return text
+
+    def _report_partial(self):
+        """Report text for the longest run of finished segments"""
+        if not self.on_partial:
+            return
+
+        with self._lock:
+            ready = self._reported
+            while ready in self._results:
+                ready += 1
+            if ready == self._reported:
+                return
+            self._reported = ready
+            partial = self._join(self._results[i] for i in range(ready))
+            # Report under the lock so partials never arrive out of order
+            self.on_partial(partial)
+
+    def _join(self, texts):
+        return " ".join(text for text in texts if text)
+
+    def finish(self):
+        """Wait for every segment and return (transcript, command_result)
+
+        command_result is set when a command already ran from the first
+        segment; the text of the segments after it is in its "remainder",
+        if there was any. Raises sr.RequestError if the service failed for
+        any segment, so the whole clip can be kept for a retry, or
+        sr.UnknownValueError if no segment had speech.
+        """
+        texts = []
+        request_error = None
+        for future in self._futures:
+            try:
+                texts.append(future.result())
+            except sr.RequestError as e:
+                texts.append("")
+                request_error = e
+        self.executor.shutdown(wait=False)
+
+        if self.command_result is not None:
+            # The command has run, so a retry from the spool would lose it;
+            # keep what was recognized of the rest
+            if request_error:
+                print(f"Dropping segments after a command that could not be recognized: {request_error}")
+            remainder = self._join(texts[1:])
+            result = dict(self.command_result, remainder=remainder) if remainder else self.command_result
+            return self._join(texts), result
+
+        if request_error:
+            raise request_error
+        text = self._join(texts)
+        if not text:
+            raise sr.UnknownValueError()
+        return text, None
+
+    def audio(self):
+        """All captured segments joined into one AudioData"""
+        if not self._segments:
+            return None
+        first = self._segments[0]
+        return sr.AudioData(b"".join(segment.frame_data for segment in self._segments),
+                            first.sample_rate, first.sample_width)
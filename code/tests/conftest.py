@@ -0,0 +1,34 @@
+# Test setup
+# The modules live flat in code/ and import each other by name, so put that
+# directory on the path. Helpers shared by several test modules are here.
+
+import copy
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from settings import DEFAULT_SETTINGS
+
+
+class NoCommands:
+    """Command manager that never matches, so every clip is dictation"""
+    phrases = []
+
+    def match_command(self, text):
+        return None
+
+    def parse_utterance(self, text):
+        return []
+
+
+@pytest.fixture
+def settings(tmp_path):
+    """Default settings with every file kept under tmp_path"""
+    settings = copy.deepcopy(DEFAULT_SETTINGS)
+    settings.update(spool_directory=str(tmp_path / "spool"), audio_archive=False,
+                    daemon_socket=str(tmp_path / "memo.sock"),
+                    daemon_token_file=str(tmp_path / "memo.token"))
+    return settings
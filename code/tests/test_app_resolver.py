@@ -0,0 +1,39 @@
+# App resolver: process scans
+
+import pytest
+
+psutil = pytest.importorskip("psutil")
+
+from app_resolver import AppResolver
+
+APPS = {"player": {"process_names": ["player.exe"]}}
+
+
+@pytest.fixture
+def process_list(monkeypatch):
+    """Fake psutil.process_iter over the processes in the returned list"""
+    running = []
+
+    class Process:
+        def __init__(self, pid, name):
+            self.pid = pid
+            self.info = {"name": name, "create_time": 1.0}
+
+    def process_iter(attrs):
+        return [Process(pid, name) for pid, name in running]
+
+    monkeypatch.setattr(psutil, "process_iter", process_iter)
+    return running
+
+
+def test_missing_app_is_not_rescanned_within_scan_ttl(process_list, monkeypatch):
+    resolver = AppResolver(APPS, scan_ttl=60.0)
+    assert resolver.processes("player") == []
+    assert resolver.processes("player") == []
+    assert resolver.scans == 1
+
+    # Once the scan_ttl has passed the process list is walked again
+    resolver._not_running["player"] -= 61.0
+    process_list.append((42, "Player.exe"))
+    assert [proc.pid for proc in resolver.processes("player")] == [42]
+    assert resolver.scans == 2
@@ -0,0 +1,115 @@
+# Command matching: single phrases, compound utterances and _cover
+
+import pytest
+
+from command_matcher import CommandMatcher, edit_distance, normalize
+
+PHRASES = {
+    "next song": "next_track",
+    "skip song": "next_track",
+    "volume up": "volume_up",
+    "volume down": "volume_down",
+    "open spotify": "open_spotify",
+    "pause": "play_pause",
+}
+
+
+@pytest.fixture
+def matcher():
+    return CommandMatcher(PHRASES)
+
+
+def describe(steps):
+    """Steps as (handler or None, text) pairs"""
+    return [(step.match.handler if step.match else None, step.text) for step in steps]
+
+
+def test_normalize():
+    assert normalize("  Next, SONG!! ") == "next song"
+
+
+@pytest.mark.parametrize("a, b, limit, expected", [
+    ("next song", "next song", 2, 0),
+    ("next songs", "next song", 2, 1),
+    ("nxt sng", "next song", 2, 2),
+    ("volume up", "next song", 2, 3),
+])
+def test_edit_distance(a, b, limit, expected):
+    assert edit_distance(a, b, limit) == expected
+
+
+def test_match_exact(matcher):
+    match = matcher.match("Next song.")
+    assert (match.handler, match.phrase, match.confidence) == ("next_track", "next song", 1.0)
+
+
+def test_match_with_fillers(matcher):
+    assert matcher.match("please skip song").handler == "next_track"
+
+
+def test_match_fuzzy(matcher):
+    match = matcher.match("next songs")
+    assert match.phrase == "next song"
+    assert match.confidence < 1.0
+
+
+def test_dictation_is_not_a_command(matcher):
+    assert matcher.match("remind me to buy milk") is None
+    assert matcher.match("the next song on the album was great") is None
+
+
+def test_parse_single_command(matcher):
+    assert describe(matcher.parse("volume up")) == [("volume_up", "volume up")]
+
+
+def test_parse_dictation_only(matcher):
+    assert describe(matcher.parse("remind me to call mom")) == [(None, "remind me to call mom")]
+
+
+def test_parse_compound_with_connectors(matcher):
+    steps = matcher.parse("next song and volume up then remind me to call mom")
+    assert describe(steps) == [("next_track", "next song"),
+                               ("volume_up", "volume up"),
+                               (None, "remind me to call mom")]
+
+
+def test_parse_splits_at_punctuation(matcher):
+    steps = matcher.parse("Open Spotify, volume down.")
+    assert describe(steps) == [("open_spotify", "Open Spotify"), ("volume_down", "volume down")]
+
+
+def test_parse_back_to_back_phrases(matcher):
+    steps = matcher.parse("next song volume up")
+    assert describe(steps) == [("next_track", "next song"), ("volume_up", "volume up")]
+
+
+def test_parse_keeps_phrase_inside_sentence_as_dictation(matcher):
+    text = "tell Sam the next song was great and volume up"
+    steps = matcher.parse(text)
+    assert describe(steps) == [(None, "tell Sam the next song was great"), ("volume_up", "volume up")]
+
+
+def test_parse_drops_filler_only_clauses(matcher):
+    steps = matcher.parse("volume up and next song, thanks")
+    assert describe(steps) == [("volume_up", "volume up"), ("next_track", "next song")]
+
+
+def test_cover_back_to_back(matcher):
+    assert matcher._cover("next song volume up".split()) == ["next song", "volume up"]
+
+
+def test_cover_skips_fillers(matcher):
+    assert matcher._cover("please next song now pause".split()) == ["next song", "pause"]
+
+
+def test_cover_needs_every_word(matcher):
+    assert matcher._cover("next song loudly".split()) is None
+
+
+def test_cover_prefers_fewest_phrases():
+    matcher = CommandMatcher({"volume": "a", "up": "b", "volume up": "c"})
+    assert matcher._cover("volume up".split()) == ["volume up"]
+
+
+def test_cover_empty(matcher):
+    assert matcher._cover([]) == []
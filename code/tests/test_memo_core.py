@@ -0,0 +1,164 @@
+# Core pipeline: notes are committed in capture order
+
+import asyncio
+import time
+
+import pytest
+import speech_recognition as sr
+
+from conftest import NoCommands
+from command_matcher import CommandMatcher
+from memo_core import Clip, VoiceMemoCore
+from notes_store import NotesJournal
+
+
+class NoEngine:
+    name = "none"
+
+    def recognize(self, audio):
+        raise AssertionError("clips in these tests recognize themselves")
+
+
+class SegmentEngine:
+    """Recognizes each segment as the text its audio bytes spell"""
+    name = "segments"
+
+    def recognize(self, audio):
+        return audio.frame_data.decode()
+
+
+class MatcherCommands:
+    """Command manager backed by a real matcher that records what it runs"""
+
+    def __init__(self, phrase_map):
+        self.matcher = CommandMatcher(phrase_map)
+        self.phrases = list(phrase_map)
+        self.ran = []
+
+    def match_command(self, text):
+        return self.matcher.match(text)
+
+    def parse_utterance(self, text):
+        return self.matcher.parse(text)
+
+    def run_command(self, match):
+        self.ran.append(match.handler)
+        return {"success": True}
+
+
+def segment(text):
+    return sr.AudioData(text.encode(), 16000, 2)
+
+
+def clip(text, delay=0.0, duration=5.0):
+    def recognize():
+        time.sleep(delay)
+        return text, None
+    return Clip(recognize, None, "2024-03-05 10:00:00", duration)
+
+
+@pytest.fixture
+def make_core(tmp_path, settings):
+    cores = []
+
+    def make(engine=None, command_manager=None, **overrides):
+        store = NotesJournal(path=str(tmp_path / "notes.jsonl"), legacy_path=str(tmp_path / "notes.json"),
+                             fsync="never")
+        core = VoiceMemoCore(dict(settings, **overrides), notes_store=store, engine=engine or NoEngine(),
+                             command_manager=command_manager or NoCommands(), use_microphone=False)
+        cores.append(core)
+        return core
+
+    yield make
+    for core in cores:
+        core.spool.stop()
+
+
+def run(core, scenario):
+    async def main():
+        await core.start()
+        try:
+            return await asyncio.wait_for(scenario(), 10)
+        finally:
+            await core.close()
+    return asyncio.run(main())
+
+
+def test_notes_commit_in_submission_order(make_core):
+    core = make_core(transcription_workers=3)
+    added = []
+    core.subscribe(lambda event, data: added.append(data["note"]["text"]) if event == "note_added" else None)
+
+    async def scenario():
+        done = [await core.submit(clip(text, delay))
+                for text, delay in (("first", 0.4), ("second", 0.2), ("third", 0.0))]
+        return await asyncio.gather(*done)
+
+    outcomes = run(core, scenario)
+    assert [outcome.note["text"] for outcome in outcomes] == ["first", "second", "third"]
+    assert [note["text"] for note in core.notes] == ["first", "second", "third"]
+    assert added == ["first", "second", "third"]
+
+
+def test_fast_lane_clip_still_commits_in_order(make_core):
+    core = make_core(transcription_workers=1)
+
+    async def scenario():
+        first = await core.submit(clip("long", 0.2))
+        second = await core.submit(clip("short", duration=0.5))
+        return await asyncio.gather(first, second)
+
+    run(core, scenario)
+    assert [note["text"] for note in core.notes] == ["long", "short"]
+
+
+def test_failed_clip_does_not_hold_up_later_ones(make_core):
+    core = make_core(transcription_workers=2)
+
+    def broken():
+        raise ValueError("bad clip")
+
+    async def scenario():
+        first = await core.submit(Clip(broken, None, "2024-03-05 10:00:00", 5.0))
+        second = await core.submit(clip("after"))
+        return await asyncio.gather(first, second)
+
+    failed, saved = run(core, scenario)
+    assert failed.note is None and "bad clip" in failed.message
+    assert saved.note["text"] == "after"
+
+
+def test_cancelled_submit_does_not_block_later_clips(make_core):
+    core = make_core(transcription_workers=1, transcription_queue_size=1)
+
+    async def scenario():
+        first = await core.submit(clip("a", 0.2))
+        second = await core.submit(clip("b", 0.2))
+        # The queue is full, so this submit waits and is cancelled there
+        waiting = asyncio.ensure_future(core.submit(clip("c")))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        last = await core.submit(clip("d"))
+        return await asyncio.gather(first, second, last)
+
+    outcomes = run(core, scenario)
+    assert [outcome.note["text"] for outcome in outcomes] == ["a", "b", "d"]
+
+
+def test_command_split_across_streamed_segments_runs_every_part(make_core):
+    commands = MatcherCommands({"next song": "next_track", "volume up": "volume_up"})
+    core = make_core(engine=SegmentEngine(), command_manager=commands, preprocess_audio=False)
+
+    async def scenario():
+        session = await core.loop.run_in_executor(None, core.streaming_session)
+        # "next song" [pause] "and volume up": the first segment runs early,
+        # and recording carries on
+        for text in ["next song", "and volume up"]:
+            session.add_segment(segment(text))
+        return await (await core.submit(core.clip_from_session(session)))
+
+    outcome = run(core, scenario)
+    assert commands.ran == ["next_track", "volume_up"]
+    assert [step["text"] for step in outcome.command["steps"]] == ["next song", "volume up"]
+    assert outcome.command["success"] is True
+    assert outcome.note["text"] == "[COMMANDS: next song EXECUTED, volume up EXECUTED]"
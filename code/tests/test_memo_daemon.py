@@ -0,0 +1,200 @@
+# Daemon protocol over the Unix socket and the token-checked TCP fallback
+
+import asyncio
+import base64
+import io
+import json
+import os
+import socket
+import wave
+
+import pytest
+
+pytest.importorskip("speech_recognition")
+unix_only = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix sockets")
+
+from conftest import NoCommands
+from memo_daemon import MemoDaemon
+
+
+class LengthEngine:
+    """Names each clip after its length in seconds"""
+    name = "length"
+
+    def recognize(self, audio):
+        seconds = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        return f"clip of {seconds:g} seconds"
+
+
+def wav(seconds):
+    data = io.BytesIO()
+    with wave.open(data, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(b"\1\0" * int(16000 * seconds))
+    return base64.b64encode(data.getvalue()).decode()
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, message):
+        line = message if isinstance(message, bytes) else json.dumps(message).encode()
+        self.writer.write(line + b"\n")
+        await self.writer.drain()
+
+    async def receive(self):
+        return json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+
+    async def request(self, message):
+        await self.send(message)
+        return await self.receive()
+
+    async def closed(self):
+        return await asyncio.wait_for(self.reader.readline(), 5) == b""
+
+
+@pytest.fixture
+def daemon(tmp_path, settings, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    daemon = MemoDaemon(settings, use_microphone=False)
+    daemon.core.engine = LengthEngine()
+    daemon.core.command_manager = NoCommands()
+    return daemon
+
+
+@pytest.fixture
+def tcp_daemon(tmp_path, settings, monkeypatch):
+    """A daemon on the loopback TCP fallback, on a free port"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delattr(asyncio, "start_unix_server", raising=False)
+    daemon = MemoDaemon(dict(settings, daemon_port=0), use_microphone=False)
+    daemon.core.engine = LengthEngine()
+    daemon.core.command_manager = NoCommands()
+    return daemon
+
+
+async def connect(daemon):
+    if daemon._unix_socket:
+        reader, writer = await asyncio.open_unix_connection(daemon.socket_path, limit=2 ** 24)
+    else:
+        reader, writer = await asyncio.open_connection("127.0.0.1", daemon.port, limit=2 ** 24)
+    return Client(reader, writer)
+
+
+def serve(daemon, scenario):
+    """Run the daemon, connect a client and run scenario(client)"""
+    async def main():
+        task = asyncio.ensure_future(daemon.run())
+        try:
+            while not daemon.core.ready or daemon.server is None:
+                assert not task.done()
+                await asyncio.sleep(0.01)
+            client = await connect(daemon)
+            try:
+                return await asyncio.wait_for(scenario(client), 10)
+            finally:
+                client.writer.close()
+        finally:
+            await daemon.core.stop()
+            await task
+    return asyncio.run(main())
+
+
+@unix_only
+def test_submit_saves_a_note(daemon):
+    async def scenario(client):
+        response = await client.request({"id": 1, "op": "submit", "audio": wav(2)})
+        notes = await client.request({"id": 2, "op": "notes", "query": "clip"})
+        return response, notes
+
+    response, notes = serve(daemon, scenario)
+    assert response["id"] == 1
+    assert response["note"]["text"] == "clip of 2 seconds"
+    assert response["command"] is None
+    assert notes == {"id": 2, "notes": [response["note"]]}
+
+
+@unix_only
+def test_parts_are_joined_in_order(daemon):
+    async def scenario(client):
+        for seconds, more in ((3, True), (2, True), (1, False)):
+            await client.send({"id": 7, "op": "submit", "audio": wav(seconds), "more": more})
+        lines = [await client.receive()]
+        while "partial" in lines[-1]:
+            lines.append(await client.receive())
+        return lines
+
+    lines = serve(daemon, scenario)
+    final = lines[-1]
+    assert all(line["id"] == 7 for line in lines)
+    assert final["note"]["text"] == "clip of 3 seconds clip of 2 seconds clip of 1 seconds"
+    assert not any(client.sessions for client in daemon.clients)
+
+
+@unix_only
+def test_bad_requests_get_errors(daemon):
+    async def scenario(client):
+        return [await client.request({"id": 3, "op": "bogus"}),
+                await client.request({"id": 4, "op": "submit"})]
+
+    unknown, missing = serve(daemon, scenario)
+    assert unknown == {"id": 3, "error": "unknown op: bogus"}
+    assert missing["id"] == 4 and "error" in missing
+
+
+@unix_only
+@pytest.mark.parametrize("line", [b"not json", b"[1, 2]", b"GET / HTTP/1.1"])
+def test_invalid_line_closes_the_connection(daemon, line):
+    async def scenario(client):
+        return await client.request(line), await client.closed()
+
+    error, closed = serve(daemon, scenario)
+    assert error == {"error": "expected a JSON object"}
+    assert closed
+
+
+def test_tcp_needs_the_token_from_the_token_file(tcp_daemon):
+    async def scenario(client):
+        with open(tcp_daemon.token_path) as f:
+            token = f.read()
+        if os.name != "nt":
+            assert os.stat(tcp_daemon.token_path).st_mode & 0o777 == 0o600
+        return (await client.request({"id": 0, "op": "auth", "token": token}),
+                await client.request({"id": 1, "op": "status"}))
+
+    auth, status = serve(tcp_daemon, scenario)
+    assert not tcp_daemon._unix_socket
+    assert auth == {"id": 0, "authenticated": True}
+    assert status["id"] == 1 and status["ready"]
+    # A new token is written at each start
+    assert not os.path.exists(tcp_daemon.token_path)
+
+
+@pytest.mark.parametrize("first", [
+    {"id": 1, "op": "status"},
+    {"id": 1, "op": "auth", "token": "guess"},
+    b"GET / HTTP/1.1",
+    b"POST /voice HTTP/1.1",
+])
+def test_tcp_closes_without_the_token(tcp_daemon, first):
+    async def scenario(client):
+        return await client.request(first), await client.closed()
+
+    error, closed = serve(tcp_daemon, scenario)
+    assert "authenticated" not in error and "error" in error
+    assert closed
+
+
+@unix_only
+def test_status_and_command(daemon):
+    async def scenario(client):
+        return (await client.request({"id": 1, "op": "status"}),
+                await client.request({"id": 2, "op": "command", "text": "hello"}))
+
+    status, command = serve(daemon, scenario)
+    assert status["id"] == 1 and "error" not in status
+    assert command == {"id": 2, "result": {"executed": False, "success": False}}
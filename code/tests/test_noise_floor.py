@@ -0,0 +1,95 @@
+# Noise floor tracker: threshold and pause adaptation
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from noise_floor import NoiseFloorTracker
+
+CHUNK_SECONDS = 0.05
+
+
+class Capture:
+    chunk_seconds = CHUNK_SECONDS
+
+
+class Recognizer:
+    energy_threshold = 300.0
+
+
+def make_tracker():
+    return NoiseFloorTracker(Capture(), Recognizer(), ratio=2.0, min_threshold=100.0)
+
+
+def feed(tracker, energy, seconds):
+    for _ in range(int(round(seconds / CHUNK_SECONDS))):
+        tracker.update(energy)
+
+
+def test_threshold_follows_the_floor():
+    tracker = make_tracker()
+    feed(tracker, 200.0, 3.0)
+    assert tracker.threshold == pytest.approx(400.0)
+    assert tracker.recognizer.energy_threshold == tracker.threshold
+
+    feed(tracker, 600.0, 3.0)
+    assert tracker.threshold == pytest.approx(1200.0)
+
+
+def test_pause_is_the_callers_until_enough_gaps_are_measured():
+    tracker = make_tracker()
+    feed(tracker, 200.0, 3.0)
+    assert tracker.pause_settings(1.5) == (1.5, 0.5)
+
+
+def test_pause_follows_the_gaps_between_sounds():
+    tracker = make_tracker()
+    feed(tracker, 200.0, 3.0)
+    # Words with 0.4 s between them
+    for _ in range(20):
+        feed(tracker, 3000.0, 0.3)
+        feed(tracker, 200.0, 0.4)
+
+    pause, non_speaking = tracker.pause_settings(1.5)
+    assert pause == pytest.approx(0.4 + tracker.pause_margin, abs=CHUNK_SECONDS)
+    assert non_speaking == pytest.approx(pause / 2)
+
+
+def test_bursty_noise_shortens_the_pause():
+    tracker = make_tracker()
+    feed(tracker, 200.0, 3.0)
+    for _ in range(20):
+        feed(tracker, 3000.0, 0.3)
+        feed(tracker, 200.0, 0.9)
+    calm = tracker.pause_settings(1.5)[0]
+
+    # Chatter in the room: short bursts with short gaps between them
+    for _ in range(80):
+        feed(tracker, 2500.0, 0.1)
+        feed(tracker, 200.0, 0.15)
+    assert tracker.pause_settings(1.5)[0] < calm
+
+
+def test_pause_stays_within_bounds():
+    tracker = make_tracker()
+    feed(tracker, 200.0, 3.0)
+    for _ in range(20):
+        feed(tracker, 3000.0, 0.3)
+        feed(tracker, 200.0, 1.8)
+    assert tracker.pause_settings(1.5)[0] == 1.5
+
+    for _ in range(80):
+        feed(tracker, 3000.0, 0.1)
+        feed(tracker, 200.0, 0.05)
+    assert tracker.pause_settings(1.5)[0] == tracker.min_pause
+    # A caller's shorter pause is never lengthened
+    assert tracker.pause_settings(0.5)[0] == 0.5
+
+
+def test_long_silence_is_not_a_gap():
+    tracker = make_tracker()
+    feed(tracker, 200.0, 3.0)
+    for _ in range(20):
+        feed(tracker, 3000.0, 0.3)
+        feed(tracker, 200.0, 5.0)
+    assert tracker.pause_settings(1.5) == (1.5, 0.5)
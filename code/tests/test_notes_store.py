@@ -0,0 +1,190 @@
+# Notes journal: replay, torn-tail recovery and compaction
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from notes_store import NotesJournal
+
+
+def make_journal(tmp_path, **kwargs):
+    return NotesJournal(path=str(tmp_path / "notes.jsonl"), legacy_path=str(tmp_path / "notes.json"),
+                        fsync="never", **kwargs)
+
+
+def journal_lines(tmp_path):
+    return [json.loads(line) for line in (tmp_path / "notes.jsonl").read_bytes().splitlines()]
+
+
+def note(text):
+    return {"timestamp": "2024-03-05 10:00:00", "text": text}
+
+
+def test_notes_survive_reopen(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append(note("one"))
+    journal.append(note("two"))
+    journal.close()
+
+    assert [n["text"] for n in make_journal(tmp_path).load()] == ["one", "two"]
+
+
+def test_clear_is_replayed(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append(note("old"))
+    journal.clear()
+    journal.append(note("new"))
+    journal.close()
+
+    assert [n["text"] for n in make_journal(tmp_path).load()] == ["new"]
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = tmp_path / "notes.jsonl"
+    good = b'{"op":"add","note":{"text":"one"}}\n'
+    path.write_bytes(good + b'{"op":"add","note":{"te')
+
+    journal = make_journal(tmp_path)
+    assert journal.load() == [{"text": "one"}]
+    assert path.read_bytes() == good
+
+    # Appends after recovery start on a clean line
+    journal.append(note("two"))
+    journal.close()
+    assert [n["text"] for n in make_journal(tmp_path).load()] == ["one", "two"]
+
+
+def test_corrupt_record_is_skipped(tmp_path):
+    (tmp_path / "notes.jsonl").write_bytes(b'{"op":"add","note":{"text":"one"}}\n'
+                                           b'not json\n'
+                                           b'{"op":"add","note":{"text":"two"}}\n')
+    assert [n["text"] for n in make_journal(tmp_path).load()] == ["one", "two"]
+
+
+def test_legacy_notes_are_migrated(tmp_path):
+    (tmp_path / "notes.json").write_text(json.dumps([note("legacy")]))
+
+    assert make_journal(tmp_path).load() == [note("legacy")]
+    assert (tmp_path / "notes.json.migrated").exists()
+    assert journal_lines(tmp_path) == [{"op": "add", "note": note("legacy")}]
+
+
+def test_failed_migration_is_retried(tmp_path):
+    legacy = tmp_path / "notes.json"
+    legacy.write_text('[{"text": "legacy"')
+
+    journal = make_journal(tmp_path)
+    assert journal.load() == []
+    journal.close()
+    assert not (tmp_path / "notes.jsonl").exists()
+    assert legacy.exists()
+
+    # A note saved meanwhile is kept after the legacy notes
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append(note("meanwhile"))
+    journal.close()
+
+    legacy.write_text(json.dumps([note("legacy")]))
+    assert make_journal(tmp_path).load() == [note("legacy"), note("meanwhile")]
+    assert not legacy.exists()
+
+
+def wait_for_compaction(journal, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while journal._compacting and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not journal._compacting
+
+
+def test_compaction_drops_cleared_notes(tmp_path):
+    journal = make_journal(tmp_path, compact_min_dead=3)
+    journal.load()
+    for text in ("a", "b", "c"):
+        journal.append(note(text))
+    journal.clear()
+    wait_for_compaction(journal)
+    journal.append(note("d"))
+    journal.close()
+
+    assert journal_lines(tmp_path) == [{"op": "add", "note": note("d")}]
+    assert make_journal(tmp_path).load() == [note("d")]
+
+
+def test_compaction_keeps_notes_appended_meanwhile(tmp_path):
+    journal = make_journal(tmp_path, compact_min_dead=1)
+    journal.load()
+    journal.append(note("old"))
+    journal.clear()
+    for i in range(200):
+        journal.append(note(str(i)))
+    wait_for_compaction(journal)
+    journal.close()
+
+    assert [n["text"] for n in make_journal(tmp_path).load()] == [str(i) for i in range(200)]
+
+
+def test_concurrent_appends_match_the_journal(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+
+    def write(prefix):
+        for i in range(200):
+            journal.append(note(f"{prefix}{i}"))
+
+    threads = [threading.Thread(target=write, args=(prefix,)) for prefix in "abcd"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    journal.close()
+
+    assert len(journal.notes) == 800
+    assert make_journal(tmp_path).load() == journal.notes
+
+
+# Opens the journal like a second app process, appends when told to and exits
+WRITER = """
+import sys
+from notes_store import NotesJournal
+journal = NotesJournal(path=sys.argv[1], legacy_path=sys.argv[1] + ".none", fsync="never")
+journal.load()
+print("open", flush=True)
+sys.stdin.readline()
+journal.append({"text": "from the other process"})
+journal.close()
+"""
+
+
+def test_no_compaction_while_another_process_has_the_journal_open(tmp_path):
+    code_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    other = subprocess.Popen([sys.executable, "-c", WRITER, str(tmp_path / "notes.jsonl")], cwd=code_directory,
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    try:
+        assert other.stdout.readline() == "open\n"
+        journal = make_journal(tmp_path, compact_min_dead=1)
+        journal.load()
+        journal.append(note("old"))
+        journal.clear()
+        wait_for_compaction(journal)
+        # Still the file the other process is appending to
+        assert len(journal_lines(tmp_path)) == 2
+
+        other.communicate("go\n", timeout=10)
+        assert other.returncode == 0
+        assert journal_lines(tmp_path)[-1] == {"op": "add", "note": {"text": "from the other process"}}
+    finally:
+        if other.poll() is None:
+            other.kill()
+
+    # Alone now, so the next clear compacts
+    journal.clear()
+    wait_for_compaction(journal)
+    journal.append(note("new"))
+    journal.close()
+    assert journal_lines(tmp_path) == [{"op": "add", "note": note("new")}]
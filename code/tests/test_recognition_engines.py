@@ -0,0 +1,38 @@
+# Recognition engines: missing backends and the engine cache
+
+import sys
+
+import pytest
+
+sr = pytest.importorskip("speech_recognition")
+
+from recognition_engines import SphinxEngine, VoskEngine, get_engine
+
+
+def audio():
+    return sr.AudioData(b"\0\0" * 1600, 16000, 2)
+
+
+@pytest.mark.parametrize("engine_class, module", [(SphinxEngine, "pocketsphinx"), (VoskEngine, "vosk")])
+def test_missing_backend_is_a_request_error(monkeypatch, engine_class, module):
+    # None in sys.modules makes the import fail even where it is installed
+    monkeypatch.setitem(sys.modules, module, None)
+    engine = engine_class(sr.Recognizer(), {"vosk_model_path": "no-such-model"})
+    with pytest.raises(sr.RequestError):
+        engine.recognize(audio())
+
+
+def test_missing_vosk_spot_is_a_request_error(monkeypatch):
+    monkeypatch.setitem(sys.modules, "vosk", None)
+    with pytest.raises(sr.RequestError):
+        VoskEngine(sr.Recognizer(), {}).spot(audio(), {"next song"})
+
+
+def test_engines_are_shared_per_recognizer_and_settings():
+    recognizer = sr.Recognizer()
+    settings = {"recognition_engine": "vosk", "vosk_model_path": "model-a"}
+
+    engine = get_engine(recognizer, settings)
+    assert get_engine(recognizer, dict(settings)) is engine
+    assert get_engine(recognizer, dict(settings, vosk_model_path="model-b")) is not engine
+    assert get_engine(sr.Recognizer(), settings) is not engine
@@ -0,0 +1,118 @@
+# Offline spool: oldest clips first, unusable clips set aside
+
+import os
+import threading
+
+import pytest
+
+sr = pytest.importorskip("speech_recognition")
+
+from recognition_spool import RecognitionSpool
+
+
+def audio():
+    return sr.AudioData(b"\0\0" * 1600, 16000, 2)
+
+
+class Recorder:
+    """commit() target that signals once it has seen enough notes"""
+
+    def __init__(self, expected):
+        self.notes = []
+        self.pending = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, note, audio, pending):
+        self.notes.append(note)
+        self.pending.append(pending)
+        if len(self.notes) >= self.expected:
+            self.done.set()
+
+
+def stop(spool):
+    """Stop the drainer once the batch it is on has been accounted for"""
+    spool.stop()
+    spool._thread.join(5)
+
+
+def test_clips_drain_oldest_first(tmp_path):
+    recorder = Recorder(3)
+    spool = RecognitionSpool(lambda audio: "text", recorder, directory=str(tmp_path), concurrency=1)
+    for timestamp in ("2024-03-05 10:00:02", "2024-03-05 10:00:00", "2024-03-05 10:00:01"):
+        spool.add(audio(), timestamp)
+
+    spool.load()
+    try:
+        assert recorder.done.wait(5)
+    finally:
+        stop(spool)
+
+    assert [note["timestamp"] for note in recorder.notes] == [
+        "2024-03-05 10:00:00", "2024-03-05 10:00:01", "2024-03-05 10:00:02"]
+    assert recorder.pending == [2, 1, 0]
+    assert spool.pending() == 0
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".wav")]
+
+
+def test_unreadable_clip_is_set_aside(tmp_path):
+    recorder = Recorder(1)
+    (tmp_path / "2024-03-05_09-00-00_broken.wav").write_bytes(b"RIFF\x10\x00\x00\x00WAVE")
+    spool = RecognitionSpool(lambda audio: "text", recorder, directory=str(tmp_path), concurrency=1)
+    spool.load()
+    spool.add(audio(), "2024-03-05 10:00:00")
+    try:
+        assert recorder.done.wait(5)
+    finally:
+        stop(spool)
+
+    assert [note["timestamp"] for note in recorder.notes] == ["2024-03-05 10:00:00"]
+    assert os.listdir(tmp_path / "bad") == ["2024-03-05_09-00-00_broken.wav"]
+
+
+def test_unreachable_engine_keeps_the_clip(tmp_path):
+    def offline(audio):
+        raise sr.RequestError("offline")
+
+    spool = RecognitionSpool(offline, Recorder(1), directory=str(tmp_path))
+    path = spool.add(audio(), "2024-03-05 10:00:00")
+
+    assert spool._drain(path) is False
+    assert os.path.exists(path)
+
+
+def test_rejected_clip_is_set_aside(tmp_path):
+    def rejects(audio):
+        raise ValueError("unsupported audio")
+
+    spool = RecognitionSpool(rejects, Recorder(1), directory=str(tmp_path))
+    path = spool.add(audio(), "2024-03-05 10:00:00")
+
+    assert spool._drain(path) is True
+    assert os.listdir(tmp_path / "bad") == [os.path.basename(path)]
+
+
+def test_unrecognizable_clip_is_dropped(tmp_path):
+    def silence(audio):
+        raise sr.UnknownValueError()
+
+    spool = RecognitionSpool(silence, Recorder(1), directory=str(tmp_path))
+    path = spool.add(audio(), "2024-03-05 10:00:00")
+
+    assert spool._drain(path) is True
+    assert not os.path.exists(path)
+
+
+def test_pending_counts_each_clip_once_while_draining_in_parallel(tmp_path):
+    recorder = Recorder(4)
+    spool = RecognitionSpool(lambda audio: "text", recorder, directory=str(tmp_path), concurrency=2)
+    for second in range(4):
+        spool.add(audio(), f"2024-03-05 10:00:0{second}")
+
+    spool.load()
+    try:
+        assert recorder.done.wait(5)
+    finally:
+        stop(spool)
+
+    assert sorted(recorder.pending, reverse=True) == [3, 2, 1, 0]
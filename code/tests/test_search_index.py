@@ -0,0 +1,109 @@
+# Search index: query parsing, words, phrases and date filters
+
+import pytest
+
+from search_index import SearchIndex, day_number, parse_query
+
+NOTES = [
+    {"timestamp": "2024-03-01 09:00:00", "text": "Call the dentist about Tuesday"},
+    {"timestamp": "2024-03-05 10:00:00", "text": "Dentist moved to Friday"},
+    {"timestamp": "2024-03-05 18:30:00", "text": "Buy milk and bread"},
+    {"timestamp": "2024-03-09 08:15:00", "text": "the dentist called back, all good"},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(path=str(tmp_path / "notes.idx"))
+    index.load(NOTES)
+    return index
+
+
+def test_day_number():
+    assert day_number("2024-03-05 10:00:00") == 20240305
+    assert day_number("") == 0
+    assert day_number(None) == 0
+
+
+def test_parse_query_words_and_phrases():
+    words, phrases, first_day, last_day = parse_query('Dentist "called back"')
+    assert words == ["dentist", "called", "back"]
+    assert phrases == [["called", "back"]]
+    assert (first_day, last_day) == (0, 99999999)
+
+
+def test_parse_query_dates():
+    words, _, first_day, last_day = parse_query("milk after:2024-03-02 before:2024-03-06")
+    assert words == ["milk"]
+    assert (first_day, last_day) == (20240302, 20240306)
+
+
+def test_parse_query_on_narrows_both_ends():
+    _, _, first_day, last_day = parse_query("on:2024-03-05")
+    assert first_day == last_day == 20240305
+
+
+def test_parse_query_keeps_the_tightest_bounds():
+    _, _, first_day, last_day = parse_query("after:2024-01-01 after:2024-02-01 before:2024-05-01 before:2024-04-01")
+    assert (first_day, last_day) == (20240201, 20240401)
+
+
+def test_search_words_newest_first(index):
+    assert index.search("dentist", NOTES) == [3, 1, 0]
+    assert index.search("dentist friday", NOTES) == [1]
+    assert index.search("unknownword", NOTES) == []
+
+
+def test_search_phrase(index):
+    assert index.search('"called back"', NOTES) == [3]
+    assert index.search('"back called"', NOTES) == []
+
+
+def test_search_after_and_before_are_inclusive(index):
+    assert index.search("dentist after:2024-03-05", NOTES) == [3, 1]
+    assert index.search("dentist before:2024-03-05", NOTES) == [1, 0]
+    assert index.search("dentist after:2024-03-02 before:2024-03-08", NOTES) == [1]
+
+
+def test_search_dates_only(index):
+    assert index.search("on:2024-03-05", NOTES) == [2, 1]
+    assert index.search("after:2024-03-06", NOTES) == [3]
+    assert index.search("", NOTES) == []
+
+
+def test_search_limit(index):
+    assert index.search("dentist", NOTES, limit=2) == [3, 1]
+
+
+def test_saved_index_is_reused(tmp_path, index):
+    index.save()
+    notes = NOTES + [{"timestamp": "2024-03-10 12:00:00", "text": "dentist invoice"}]
+
+    reloaded = SearchIndex(path=str(tmp_path / "notes.idx"))
+    reloaded.load(notes)
+    assert reloaded.search("dentist", notes) == [4, 3, 1, 0]
+
+
+def test_clear(index):
+    index.clear()
+    assert index.search("dentist", NOTES) == []
+
+
+class CountingNotes(list):
+    """Notes list that counts how many notes are read"""
+    reads = 0
+
+    def __getitem__(self, number):
+        self.reads += 1
+        return super().__getitem__(number)
+
+
+def test_dated_word_search_reads_no_notes(index):
+    notes = CountingNotes(NOTES)
+    assert index.search("dentist after:2024-03-02", notes) == [3, 1]
+    assert index.search("dentist on:2024-03-07", notes) == []
+    assert notes.reads == 0
+
+    # Only phrases need the note text
+    assert index.search('"called back" after:2024-03-02', notes) == [3]
+    assert notes.reads == 1
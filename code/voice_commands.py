@@ -1,123 +1,170 @@
-import subprocess
-import time
-import psutil
-import keyboard
-import os
+import command_executor
+from app_resolver import AppResolver
+from command_executor import (LaunchStrategy, launch_first, spawn, shell_start,
+                              protocol_registered, app_registered)
 from command_modules import COMMAND_MODULES
+from command_plugins import PluginCommand, discover_plugins
+from command_matcher import CommandMatcher
+from lazy_import import lazy_import
+
+# Only needed once a command actually runs
+keyboard = lazy_import("keyboard")
 
 class VoiceCommandManager:
-    def __init__(self):
+    def __init__(self, min_confidence=0.8, plugin_directory=None):
+        # Built-in modules first; plugins can add modules but not replace them
+        self.modules = dict(COMMAND_MODULES)
+        self.plugins = {}
+        for plugin in discover_plugins(plugin_directory):
+            if plugin.name in self.modules:
+                print(f"Command plugin {plugin.name} skipped: a command module of that name already exists")
+                continue
+            self.modules[plugin.name] = plugin.info
+            self.plugins[plugin.name] = plugin
+        
+        self.dispatch = self._compile_dispatch()
         self.command_map = self._build_command_map()
+        self.matcher = CommandMatcher(self.command_map, min_confidence=min_confidence)
+        # Executables and PIDs of the apps commands control
+        self.apps = AppResolver()
+    
+    def _compile_dispatch(self):
+        """Resolve every command to its callable once, at startup
+        
+        Built-in commands bind to methods of this class and plugin commands
+        to a PluginCommand that imports the plugin on first call. A built-in
+        command without a method is reported here and left out, instead of
+        silently doing nothing when it is spoken.
+        """
+        dispatch = {}
+        
+        for module_name, module_info in self.modules.items():
+            plugin = self.plugins.get(module_name)
+            for command_name in module_info["commands"]:
+                handler_name = f"{module_name}_{command_name}"
+                if plugin is not None:
+                    dispatch[handler_name] = PluginCommand(plugin, command_name)
+                    continue
+                
+                handler = getattr(self, handler_name, None)
+                if callable(handler):
+                    dispatch[handler_name] = handler
+                else:
+                    print(f"Command {handler_name} has no handler, its phrases are disabled")
+        
+        return dispatch
     
     def _build_command_map(self):
         """Build a flat dictionary mapping phrases to their command handlers"""
         command_map = {}
         
-        for module_name, module_info in COMMAND_MODULES.items():
+        for module_name, module_info in self.modules.items():
             for command_name, command_info in module_info["commands"].items():
                 handler_name = f"{module_name}_{command_name}"
+                if handler_name not in self.dispatch:
+                    continue
                 
-                # Map each phrase to the handler
+                # Map each phrase to the handler; the first module to claim a phrase keeps it
                 for phrase in command_info["phrases"]:
-                    command_map[phrase.lower()] = handler_name
+                    phrase = phrase.lower()
+                    owner = command_map.setdefault(phrase, handler_name)
+                    if owner != handler_name:
+                        print(f"Phrase \"{phrase}\" of {handler_name} already belongs to {owner}, ignored")
         
         return command_map
     
+    @property
+    def phrases(self):
+        return list(self.command_map)
+    
+    def match_command(self, text):
+        """Return the best CommandMatch for text, or None"""
+        return self.matcher.match(text)
+    
+    def parse_utterance(self, text):
+        """Split text into command and dictation Steps, in spoken order"""
+        return self.matcher.parse(text)
+    
     def execute_command(self, text):
-        """Execute a voice command if it matches any known phrase"""
-        text_lower = text.lower().strip()
-        
-        if text_lower in self.command_map:
-            handler_name = self.command_map[text_lower]
-            handler = getattr(self, handler_name, None)
+        """Execute the voice command that best matches text, if any"""
+        return self.run_command(self.match_command(text))
+    
+    def run_command(self, match):
+        """Execute the handler for a CommandMatch"""
+        if match:
+            handler = self.dispatch.get(match.handler)
             
-            if handler:
+            if handler is None:
+                print(f"No handler for command {match.handler}")
+            else:
                 try:
                     success = handler()
-                    return {"executed": True, "success": success}
+                    # A handler that returns nothing but did not raise has run
+                    success = True if success is None else bool(success)
+                    return {"executed": True, "success": success,
+                            "phrase": match.phrase, "confidence": match.confidence}
                 except Exception as e:
-                    print(f"Error executing command {handler_name}: {e}")
-                    return {"executed": True, "success": False}
+                    print(f"Error executing command {match.handler}: {e}")
+                    return {"executed": True, "success": False,
+                            "phrase": match.phrase, "confidence": match.confidence}
         
         return {"executed": False, "success": False}
     
+    def status(self):
+        loaded = sum(1 for plugin in self.plugins.values() if plugin.loaded)
+        return (f"Commands: {len(self.dispatch)} handlers, {len(self.plugins)} plugins "
+                f"({loaded} loaded)")
+    
     # Spotify Commands
     def spotify_open(self):
         """Open Spotify application"""
         try:
-            # Method 1: Try to open via Windows Start menu
-            try:
-                subprocess.run(["start", "spotify:"], shell=True, check=True)
-                print("Opened Spotify via protocol")
+            if self.apps.is_running("spotify"):
+                if not self.apps.focus("spotify"):
+                    shell_start("spotify:")
+                print("Spotify is already running")
                 return True
-            except:
-                pass
-            
-            # Method 2: Try direct executable
-            try:
-                subprocess.run(["spotify"], check=True)
-                print("Opened Spotify via executable")
-                return True
-            except:
-                pass
-            
-            # Method 3: Try common installation paths
-            common_paths = [
-                os.path.expanduser("~\\AppData\\Roaming\\Spotify\\Spotify.exe"),
-                "C:\\Users\\%USERNAME%\\AppData\\Roaming\\Spotify\\Spotify.exe",
-                "C:\\Program Files\\Spotify\\Spotify.exe",
-                "C:\\Program Files (x86)\\Spotify\\Spotify.exe"
-            ]
-            
-            for path in common_paths:
-                expanded_path = os.path.expandvars(path)
-                if os.path.exists(expanded_path):
-                    subprocess.run([expanded_path])
-                    print(f"Opened Spotify from {expanded_path}")
-                    return True
-            
-            print("Could not find Spotify installation")
-            return False
             
+            # Windows Start menu protocol, then the executable
+            method = launch_first([
+                LaunchStrategy("protocol", lambda: protocol_registered("spotify"),
+                               lambda: shell_start("spotify:")),
+                LaunchStrategy("executable", lambda: self.apps.executable("spotify"),
+                               lambda: self._launch("spotify")),
+            ])
         except Exception as e:
             print(f"Failed to open Spotify: {e}")
             return False
+        
+        if method is None:
+            print("Could not find Spotify installation")
+            return False
+        print(f"Opened Spotify via {method}")
+        return True
     
     def spotify_close(self):
         """Close Spotify application"""
         try:
-            # Method 1: Use taskkill command (most reliable)
-            try:
-                result = subprocess.run(['taskkill', '/f', '/im', 'Spotify.exe'], 
-                                    capture_output=True, text=True)
-                if result.returncode == 0:
-                    print("Spotify closed via taskkill")
-                    return True
-            except:
-                pass
-            
-            # Method 2: Kill Spotify process using psutil
-            spotify_found = False
-            for proc in psutil.process_iter():
-                try:
-                    proc_name = proc.name().lower()
-                    if 'spotify' in proc_name:
-                        proc.terminate()
-                        spotify_found = True
-                        print(f"Terminated process: {proc.name()}")
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-            
-            if spotify_found:
-                print("Spotify closed via process termination")
-                return True
-            
-            print("Spotify process not found")
-            return False
-            
+            closed = self.apps.close("spotify")
         except Exception as e:
             print(f"Failed to close Spotify: {e}")
             return False
+        
+        if not closed:
+            print("Spotify process not found")
+            return False
+        print(f"Spotify closed ({closed} processes)")
+        return True
+    
+    def _launch(self, app):
+        """Start an app's executable and track its process"""
+        try:
+            process = spawn(self.apps.executable(app))
+        except OSError:
+            # Moved or uninstalled since it was cached
+            self.apps.invalidate(app)
+            raise
+        self.apps.track(app, process.pid)
     
     def spotify_play_pause(self):
         """Toggle play/pause using media keys"""
@@ -152,8 +199,12 @@ class VoiceCommandManager:
     def spotify_like(self):
         """Like/unlike current song in Spotify"""
         try:
-            subprocess.run(["start", "spotify:"], shell=True, check=True)
-            time.sleep(0.3)  # Give it a moment to focus
+            # Focus a window of the Spotify process we know about, or let
+            # the protocol handler find it and give it a moment
+            if not self.apps.focus("spotify"):
+                shell_start("spotify:")
+                if not command_executor.sleep(0.3):
+                    return False
             
             # Send Alt+Shift+B (Spotify's like/unlike shortcut)
             keyboard.send('alt+shift+b')
@@ -207,45 +258,33 @@ class VoiceCommandManager:
     # Browser Commands
     def browser_open_browser(self):
         """Open Brave browser"""
+        strategies = [
+            # Brave's executable, Brave via the start command, the default
+            # browser, then the webbrowser module as a fallback
+            LaunchStrategy("executable", lambda: self.apps.executable("brave"),
+                           lambda: self._launch("brave")),
+            LaunchStrategy("start command", lambda: app_registered("brave.exe"),
+                           lambda: shell_start("brave")),
+            LaunchStrategy("default browser", lambda: protocol_registered("http"),
+                           lambda: shell_start("http://")),
+            LaunchStrategy("webbrowser module", lambda: True, self._open_with_webbrowser),
+        ]
         try:
-            # Method 1: Try common Brave installation paths (most reliable)
-            brave_paths = [
-                "C:\\Program Files\\BraveSoftware\\Brave-Browser\\Application\\brave.exe",
-                os.path.expanduser("~\\AppData\\Local\\BraveSoftware\\Brave-Browser\\Application\\brave.exe"),
-                "C:\\Program Files (x86)\\BraveSoftware\\Brave-Browser\\Application\\brave.exe"
-            ]
-            
-            for path in brave_paths:
-                if os.path.exists(path):
-                    subprocess.run([path])
-                    print(f"Opened Brave from {path}")
-                    return True
-            
-            # Method 2: Try to open Brave via command
-            try:
-                subprocess.run(["start", "brave"], shell=True, check=True)
-                print("Opened Brave browser via command")
-                return True
-            except:
-                pass
-            
-            # Method 3: Try opening with default browser using a URL
-            try:
-                subprocess.run(["start", "http://"], shell=True, check=True)
-                print("Opened default browser")
-                return True
-            except:
-                pass
-            
-            # Method 4: Use webbrowser module as fallback
-            import webbrowser
-            webbrowser.open("http://")
-            print("Opened browser via webbrowser module")
-            return True
-            
+            method = launch_first(strategies)
         except Exception as e:
             print(f"Failed to open browser: {e}")
             return False
+        
+        if method is None:
+            print("Could not open a browser")
+            return False
+        print(f"Opened browser via {method}")
+        return True
+    
+    def _open_with_webbrowser(self):
+        import webbrowser
+        if not webbrowser.open("http://"):
+            raise RuntimeError("no browser available")
     
     def browser_refresh(self):
         """Refresh current page"""